@@ -0,0 +1,108 @@
+"""
+Benchmark: carga de 100 mil linhas no catálogo produtos_segem, linha a linha
+(como era) e em lotes (carga_produtos_segem.carregar, como é agora).
+
+Cenários, cada um lendo o mesmo CSV sintético (carga_produtos_segem.gerar_exemplo):
+- antes: para cada linha um SELECT pelo código e um add/atualização pela
+  sessão, com um commit no fim (o script original);
+- depois: carregar() com lotes de TAMANHO_LOTE (uma consulta dos códigos e
+  INSERT/UPDATE em lote por lote, commit por lote);
+- recarga: o mesmo arquivo de novo sobre o catálogo já carregado, com e sem
+  --somente-alterados (que não regrava descrições iguais).
+
+As consultas são os comandos enviados ao driver (um executemany conta como
+um). Usa SQLite em memória (o PostgreSQL usa INSERT ... ON CONFLICT no lugar
+da consulta dos códigos). Execute: python bench_carga_produtos_segem.py
+"""
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import Session
+
+from carga_produtos_segem import carregar, gerar_exemplo, ler_linhas
+from models import CatalogoVersao, ProdutoSegem
+
+LINHAS = 100_000
+TAMANHO_LOTE = 5000
+
+
+def _criar_banco():
+    engine = create_engine("sqlite://")
+    ProdutoSegem.metadata.create_all(engine, tables=[ProdutoSegem.__table__, CatalogoVersao.__table__])
+    return engine
+
+
+def _carga_linha_a_linha(db: Session, linhas) -> dict:
+    totais = {"inseridos": 0, "atualizados": 0}
+    for codigo, descricao in linhas:
+        existente = db.query(ProdutoSegem).filter(ProdutoSegem.codigo == codigo).first()
+        if existente:
+            existente.descricao = descricao
+            totais["atualizados"] += 1
+        else:
+            db.add(ProdutoSegem(codigo=codigo, descricao=descricao))
+            totais["inseridos"] += 1
+    db.commit()
+    return totais
+
+
+def _carga_em_lotes(somente_alterados: bool = False):
+    def carga(db: Session, linhas) -> dict:
+        return carregar(db, linhas, TAMANHO_LOTE, somente_alterados, progresso=False)
+    return carga
+
+
+def _medir(engine, arquivo: str, carga) -> dict:
+    comandos = []
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        with Session(engine) as db, open(arquivo, encoding="utf-8", newline="") as f:
+            inicio = time.perf_counter()
+            totais = carga(db, ler_linhas(f))
+            segundos = time.perf_counter() - inicio
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
+
+    with Session(engine) as db:
+        assert db.query(func.count(ProdutoSegem.codigo)).scalar() == LINHAS
+    return {**totais, "segundos": segundos, "consultas": len(comandos)}
+
+
+def _imprimir(rotulo: str, r: dict) -> None:
+    print(
+        f"  {rotulo:34}: {r['segundos']:7.2f}s ({LINHAS / r['segundos']:8.0f} linhas/s), "
+        f"{r['consultas']:6d} consultas - {r['inseridos']} inseridos, {r['atualizados']} atualizados"
+    )
+
+
+def main():
+    fd, arquivo = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        gerar_exemplo(arquivo, LINHAS)
+
+        antes = _medir(_criar_banco(), arquivo, _carga_linha_a_linha)
+
+        engine = _criar_banco()
+        depois = _medir(engine, arquivo, _carga_em_lotes())
+        recarga = _medir(engine, arquivo, _carga_em_lotes())
+        recarga_alterados = _medir(engine, arquivo, _carga_em_lotes(somente_alterados=True))
+    finally:
+        os.remove(arquivo)
+
+    print(f"Carga de {LINHAS} linhas em produtos_segem (lotes de {TAMANHO_LOTE})")
+    _imprimir("antes (linha a linha)", antes)
+    _imprimir("depois (em lotes)", depois)
+    _imprimir("recarga (em lotes)", recarga)
+    _imprimir("recarga (--somente-alterados)", recarga_alterados)
+    print(f"  carga inicial {antes['segundos'] / depois['segundos']:.0f}x mais rápida")
+
+
+if __name__ == "__main__":
+    main()
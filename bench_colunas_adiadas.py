@@ -0,0 +1,230 @@
+"""
+Benchmark: bytes lidos do banco e memória das consultas de lista com as
+colunas Text grandes carregadas (como era) e adiadas (deferred, como é agora).
+
+Consultas medidas (as mesmas opções de carregamento das rotas):
+- caixa do e-Protocolo: 50 processos com conteúdo HTML de ~20 KB;
+- lista de produtos: produtos com descrição e itens com observação;
+- lista de movimentações: movimentações com observação e item.
+
+"Antes" = a mesma consulta com undefer() nas colunas adiadas. Os bytes são a
+soma do tamanho dos valores de todas as linhas devolvidas pelo banco (todas
+as consultas da lista, inclusive selectinload); a memória é o pico do
+tracemalloc durante a consulta, numa sessão nova.
+
+Usa um SQLite em memória com dados sintéticos (colunas Computed do PostgreSQL
+viram colunas comuns). Execute: python bench_colunas_adiadas.py
+"""
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import Session, defaultload, joinedload, selectinload, undefer
+
+from database import Base
+from models import (
+    Brand, Category, EquipmentType, Estado, Item, Movement, Municipio, Orgao,
+    Processo, ProcessoAssinante, Product, Stock, Unidade, User,
+)
+
+PROCESSOS = 500
+PAGINA_CAIXA = 50
+PRODUTOS = 300
+ITENS_POR_PRODUTO = 5
+MOVIMENTACOES = 2000
+
+
+def _criar_banco():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    for tabela in Base.metadata.sorted_tables:
+        copia = tabela.to_metadata(metadata)
+        for coluna in copia.columns:
+            if coluna.computed is not None:
+                coluna.computed = coluna.server_default = None
+    metadata.create_all(engine)
+    return engine
+
+
+def _popular(db: Session) -> None:
+    estado = Estado(nome="Amapá", uf="AP")
+    municipio = Municipio(nome="Macapá", estado=estado)
+    orgao = Orgao(nome="Secretaria de Administração", sigla="SEAD", municipio=municipio)
+    unidade = Unidade(nome="Protocolo", sigla="PROT", orgao=orgao)
+    db.add_all([estado, municipio, orgao, unidade])
+    db.flush()
+    user = User(
+        nome="Maria da Silva", cpf="00000000000", email="maria@exemplo.gov.br", password="x",
+        municipio_id=municipio.id, orgao_id=orgao.id, unidade_id=unidade.id,
+    )
+    categoria = Category(nome="Informática")
+    db.add_all([user, categoria])
+    db.flush()
+    tipo = EquipmentType(nome="Computador", category_id=categoria.id)
+    marca = Brand(nome="Marca")
+    db.add_all([tipo, marca])
+    db.flush()
+
+    inicio = datetime(2024, 1, 1)
+    conteudo = "<p>" + "Texto do documento do processo. " * 600 + "</p>"  # ~20 KB
+    local = dict(
+        municipio_origem_id=municipio.id, orgao_origem_id=orgao.id, unidade_origem_id=unidade.id,
+        municipio_atual_id=municipio.id, orgao_atual_id=orgao.id, unidade_atual_id=unidade.id,
+    )
+    db.add_all([
+        Processo(
+            numero=f"{i:06d}/2024", ano=2024, assunto="Solicitação de material",
+            requerente="Secretaria de Saúde", conteudo=conteudo, status="Recebido",
+            created_by=user.id, created_at=inicio + timedelta(minutes=i), arquivado=False, **local,
+        )
+        for i in range(PROCESSOS)
+    ])
+
+    escopo = dict(municipio_id=municipio.id, orgao_id=orgao.id)
+    produtos = [
+        Product(
+            name=f"Produto {i}", description="Descrição detalhada do produto. " * 60,
+            type_id=tipo.id, brand_id=marca.id, category_id=categoria.id, **escopo,
+        )
+        for i in range(PRODUTOS)
+    ]
+    db.add_all(produtos)
+    db.flush()
+    itens = [
+        Item(
+            product_id=p.id, unit_id=unidade.id, num_tombo_ou_serie=f"{p.id}-{n}",
+            observacao="Observação do item. " * 25, **escopo,
+        )
+        for p in produtos
+        for n in range(ITENS_POR_PRODUTO)
+    ]
+    db.add_all(itens)
+    db.add_all([Stock(product_id=p.id, unit_id=unidade.id, quantidade=10, **escopo) for p in produtos])
+    db.flush()
+    db.add_all([
+        Movement(
+            tipo="TRANSFERENCIA", quantidade=1, data=inicio + timedelta(minutes=i),
+            observacao="Observação da movimentação. " * 12, user_id=user.id,
+            product_id=itens[i % len(itens)].product_id, item_id=itens[i % len(itens)].id,
+            unit_origem_id=unidade.id, unit_destino_id=unidade.id,
+        )
+        for i in range(MOVIMENTACOES)
+    ])
+    db.commit()
+
+
+def _consulta_caixa(db: Session, antes: bool):
+    opcoes = [
+        joinedload(Processo.orgao_origem),
+        joinedload(Processo.unidade_origem),
+        joinedload(Processo.creator),
+        selectinload(Processo.assinantes).joinedload(ProcessoAssinante.user),
+    ]
+    if antes:
+        opcoes.append(undefer(Processo.conteudo))
+    return (
+        db.query(Processo).options(*opcoes)
+        .filter(Processo.arquivado == False)
+        .order_by(Processo.created_at.desc(), Processo.id.desc())
+        .limit(PAGINA_CAIXA)
+        .all()
+    )
+
+
+def _consulta_produtos(db: Session, antes: bool):
+    opcoes = [
+        joinedload(Product.category),
+        joinedload(Product.type),
+        joinedload(Product.brand),
+        joinedload(Product.items).joinedload(Item.unit),
+        joinedload(Product.stocks).joinedload(Stock.unit),
+    ]
+    if antes:
+        opcoes += [undefer(Product.description), defaultload(Product.items).undefer(Item.observacao)]
+    return db.query(Product).options(*opcoes).all()
+
+
+def _consulta_movimentacoes(db: Session, antes: bool):
+    opcoes = [
+        joinedload(Movement.user),
+        joinedload(Movement.product).joinedload(Product.type),
+        joinedload(Movement.item),
+        joinedload(Movement.unit_origem),
+        joinedload(Movement.unit_destino),
+    ]
+    if antes:
+        opcoes += [undefer(Movement.observacao), defaultload(Movement.item).undefer(Item.observacao)]
+    return db.query(Movement).options(*opcoes).order_by(Movement.data.desc()).all()
+
+
+def _tamanho(valor) -> int:
+    if valor is None:
+        return 0
+    if isinstance(valor, (bytes, str)):
+        return len(valor.encode("utf-8") if isinstance(valor, str) else valor)
+    return 8
+
+
+def _medir(engine, consulta, antes: bool) -> dict:
+    # Bytes: repete no driver cada SELECT que a consulta emitiu e soma os valores
+    comandos = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capturar)
+    try:
+        with Session(engine) as db:
+            consulta(db, antes)
+    finally:
+        event.remove(engine, "before_cursor_execute", _capturar)
+    total_bytes = 0
+    linhas = 0
+    bruto = engine.raw_connection()
+    try:
+        for statement, parameters in comandos:
+            cursor = bruto.cursor()
+            cursor.execute(statement, parameters)
+            for linha in cursor.fetchall():
+                linhas += 1
+                total_bytes += sum(_tamanho(v) for v in linha)
+            cursor.close()
+    finally:
+        bruto.close()
+
+    # Memória: pico durante a consulta, com sessão nova (sem identity map aquecido)
+    with Session(engine) as db:
+        tracemalloc.start()
+        resultado = consulta(db, antes)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del resultado
+    return {"bytes": total_bytes, "linhas": linhas, "consultas": len(comandos), "pico": pico}
+
+
+def main():
+    engine = _criar_banco()
+    with Session(engine) as db:
+        _popular(db)
+
+    for nome, consulta in (
+        (f"Caixa ({PAGINA_CAIXA} de {PROCESSOS} processos)", _consulta_caixa),
+        (f"Produtos ({PRODUTOS}, {ITENS_POR_PRODUTO} itens cada)", _consulta_produtos),
+        (f"Movimentações ({MOVIMENTACOES})", _consulta_movimentacoes),
+    ):
+        antes = _medir(engine, consulta, antes=True)
+        depois = _medir(engine, consulta, antes=False)
+        print(nome)
+        for rotulo, r in (("  antes (Text carregado)", antes), ("  depois (deferred)     ", depois)):
+            print(
+                f"{rotulo}: {r['bytes'] / 1024:8.1f} KB lidos em {r['linhas']} linhas "
+                f"({r['consultas']} consultas), pico de memória {r['pico'] / 1024:8.1f} KB"
+            )
+        print(
+            f"  redução: {100 * (1 - depois['bytes'] / antes['bytes']):.0f}% dos bytes, "
+            f"{100 * (1 - depois['pico'] / antes['pico']):.0f}% do pico de memória"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: cadastro de um produto com 10 mil itens tombados, item a item
+(como era) e em faixa sequencial (modo faixa de routers/products.py).
+
+Passos medidos (os mesmos da rota POST /products/add, sem a camada HTTP):
+- item a item: _validar_numeros_itens (uma consulta por número), um Item por
+  db.add + flush e uma ENTRADA por item (StockService.registrar_entrada_cadastro);
+- faixa: _gerar_faixa_tombos, _validar_faixa_tombos (uma consulta por
+  intervalo), um INSERT em lote dos itens e um INSERT ... SELECT das entradas
+  (StockService.registrar_entradas_cadastro_itens).
+
+Cada cenário roda num banco novo já com itens de outros produtos, para a
+validação de unicidade ter o que consultar. As consultas são os comandos
+enviados ao driver (um executemany conta como um).
+
+Usa um SQLite em memória com dados sintéticos (colunas Computed do PostgreSQL
+viram colunas comuns). Execute: python bench_faixa_tombos.py
+"""
+import time
+
+from sqlalchemy import MetaData, create_engine, event, func, insert
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import Brand, Category, EquipmentType, Estado, Item, Movement, Municipio, Orgao, Product, Unidade, User
+from routers.products import _gerar_faixa_tombos, _validar_faixa_tombos, _validar_numeros_itens
+from services.stock_service import StockService
+
+QUANTIDADE = 10000
+TOMBO_INICIAL = "100.000"
+ITENS_EXISTENTES = 20000  # tombos 500.000 em diante, fora da faixa cadastrada
+
+
+def _criar_banco():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    for tabela in Base.metadata.sorted_tables:
+        copia = tabela.to_metadata(metadata)
+        for coluna in copia.columns:
+            if coluna.computed is not None:
+                coluna.computed = coluna.server_default = None
+    metadata.create_all(engine)
+    return engine
+
+
+def _popular(db: Session) -> dict:
+    estado = Estado(nome="Amapá", uf="AP")
+    municipio = Municipio(nome="Macapá", estado=estado)
+    orgao = Orgao(nome="Secretaria de Administração", sigla="SEAD", municipio=municipio)
+    unidade = Unidade(nome="Almoxarifado", sigla="ALMOX", orgao=orgao)
+    db.add_all([estado, municipio, orgao, unidade])
+    db.flush()
+    user = User(
+        nome="Maria da Silva", cpf="00000000000", email="maria@exemplo.gov.br", password="x",
+        municipio_id=municipio.id, orgao_id=orgao.id, unidade_id=unidade.id,
+    )
+    categoria = Category(nome="Mobiliário")
+    db.add_all([user, categoria])
+    db.flush()
+    tipo = EquipmentType(nome="Cadeira", category_id=categoria.id)
+    marca = Brand(nome="Marca")
+    db.add_all([tipo, marca])
+    db.flush()
+
+    escopo = dict(municipio_id=municipio.id, orgao_id=orgao.id)
+    outro = Product(name="Mesa", type_id=tipo.id, brand_id=marca.id, category_id=categoria.id,
+                    controla_por_serie=True, **escopo)
+    db.add(outro)
+    db.flush()
+    db.execute(insert(Item), [
+        {"product_id": outro.id, "unit_id": unidade.id, "tombo": True,
+         "num_tombo_ou_serie": f"{n // 1000:03d}.{n % 1000:03d}", **escopo}
+        for n in range(500000, 500000 + ITENS_EXISTENTES)
+    ])
+    db.commit()
+    return {
+        "user_id": user.id, "unit_id": unidade.id, "type_id": tipo.id, "brand_id": marca.id,
+        "category_id": categoria.id, **escopo,
+    }
+
+
+def _novo_produto(db: Session, ctx: dict) -> Product:
+    product = Product(
+        name="Cadeira Marca", type_id=ctx["type_id"], brand_id=ctx["brand_id"], category_id=ctx["category_id"],
+        controla_por_serie=True, quantidade=0, quantidade_minima=0,
+        municipio_id=ctx["municipio_id"], orgao_id=ctx["orgao_id"], created_by=ctx["user_id"],
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+    return product
+
+
+def _cadastro_item_a_item(db: Session, ctx: dict) -> None:
+    numeros, _ = _gerar_faixa_tombos(TOMBO_INICIAL, QUANTIDADE)
+    erro = _validar_numeros_itens(db, [(True, n) for n in numeros])
+    assert erro is None, erro
+    product = _novo_produto(db, ctx)
+    itens = []
+    for num in numeros:
+        item = Item(
+            product_id=product.id, municipio_id=ctx["municipio_id"], orgao_id=ctx["orgao_id"],
+            unit_id=ctx["unit_id"], tombo=True, num_tombo_ou_serie=num, status="Disponível",
+        )
+        db.add(item)
+        itens.append(item)
+    db.flush()
+    for item in itens:
+        StockService.registrar_entrada_cadastro(db, product, ctx["user_id"], ctx["unit_id"], quantidade=1,
+                                                item_id=item.id)
+    db.commit()
+
+
+def _cadastro_faixa(db: Session, ctx: dict) -> None:
+    numeros, erro = _gerar_faixa_tombos(TOMBO_INICIAL, QUANTIDADE)
+    erro = erro or _validar_faixa_tombos(db, numeros)
+    assert erro is None, erro
+    product = _novo_produto(db, ctx)
+    db.execute(insert(Item), [
+        {
+            "product_id": product.id, "municipio_id": ctx["municipio_id"], "orgao_id": ctx["orgao_id"],
+            "unit_id": ctx["unit_id"], "tombo": True, "num_tombo_ou_serie": num, "status": "Disponível",
+        }
+        for num in numeros
+    ])
+    StockService.registrar_entradas_cadastro_itens(db, product, ctx["user_id"], ctx["unit_id"])
+    db.commit()
+
+
+def _medir(cadastro) -> dict:
+    engine = _criar_banco()
+    with Session(engine) as db:
+        ctx = _popular(db)
+
+    comandos = []
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        with Session(engine) as db:
+            inicio = time.perf_counter()
+            cadastro(db, ctx)
+            segundos = time.perf_counter() - inicio
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
+
+    with Session(engine) as db:
+        itens = db.query(func.count(Item.id)).scalar() - ITENS_EXISTENTES
+        entradas = db.query(func.count(Movement.id)).filter(Movement.tipo == "ENTRADA").scalar()
+    assert itens == entradas == QUANTIDADE, (itens, entradas)
+    return {"segundos": segundos, "consultas": len(comandos)}
+
+
+def main():
+    print(f"Cadastro de {QUANTIDADE} itens tombados a partir de {TOMBO_INICIAL} "
+          f"({ITENS_EXISTENTES} itens já cadastrados)")
+    antes = _medir(_cadastro_item_a_item)
+    depois = _medir(_cadastro_faixa)
+    for rotulo, r in (("  antes (item a item)", antes), ("  depois (faixa)     ", depois)):
+        print(f"{rotulo}: {r['segundos']:7.2f}s, {r['consultas']:6d} consultas")
+    print(f"  {antes['segundos'] / depois['segundos']:.0f}x mais rápido, "
+          f"{antes['consultas'] - depois['consultas']} consultas a menos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Verificação: número de consultas de GET /movements/items/{type_id}
+(routers/movements.py, get_product_items) conforme cresce o número de
+produtos e itens do tipo.
+
+Para cada tamanho, metade dos produtos controla por série (com itens) e
+metade não (só saldo em estoque). Mede a lista completa, a primeira e a
+última página; as consultas são os comandos enviados ao driver. O script
+falha (AssertionError) se o número de consultas crescer com o tamanho —
+sinal de consulta por produto ou por item: a lista completa deve fazer
+sempre 2 consultas e a paginada no máximo 4 (duas contagens e uma consulta
+por origem que a página alcança: itens e/ou estoque).
+
+Usa um SQLite em memória com dados sintéticos (colunas Computed do PostgreSQL
+viram colunas comuns). Execute: python bench_itens_movimentacao.py
+"""
+import time
+
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import Brand, Category, EquipmentType, Estado, Item, Municipio, Orgao, Product, Stock, Unidade
+from routers.movements import get_product_items
+
+PRODUTOS = (10, 100, 1000)
+ITENS_POR_PRODUTO = 5
+POR_PAGINA = 100
+LIMITE_CONSULTAS = {"lista completa": 2, "primeira página": 4, "última página": 4}
+
+
+def _criar_banco():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    for tabela in Base.metadata.sorted_tables:
+        copia = tabela.to_metadata(metadata)
+        for coluna in copia.columns:
+            if coluna.computed is not None:
+                coluna.computed = coluna.server_default = None
+    metadata.create_all(engine)
+    return engine
+
+
+def _popular(db: Session, produtos: int) -> int:
+    estado = Estado(nome="Amapá", uf="AP")
+    municipio = Municipio(nome="Macapá", estado=estado)
+    orgao = Orgao(nome="Secretaria de Administração", sigla="SEAD", municipio=municipio)
+    unidade = Unidade(nome="Almoxarifado", sigla="ALMOX", orgao=orgao)
+    categoria = Category(nome="Informática")
+    db.add_all([estado, municipio, orgao, unidade, categoria])
+    db.flush()
+    tipo = EquipmentType(nome="Computador", category_id=categoria.id)
+    marca = Brand(nome="Marca")
+    db.add_all([tipo, marca])
+    db.flush()
+
+    escopo = dict(municipio_id=municipio.id, orgao_id=orgao.id)
+    lista = [
+        Product(
+            name=f"Produto {i}", type_id=tipo.id, brand_id=marca.id, category_id=categoria.id,
+            controla_por_serie=i % 2 == 0, **escopo,
+        )
+        for i in range(produtos)
+    ]
+    db.add_all(lista)
+    db.flush()
+    db.add_all([
+        Item(product_id=p.id, unit_id=unidade.id, tombo=False, num_tombo_ou_serie=f"S{p.id}-{n}", **escopo)
+        for p in lista if p.controla_por_serie
+        for n in range(ITENS_POR_PRODUTO)
+    ])
+    db.add_all([
+        Stock(product_id=p.id, unit_id=unidade.id, quantidade=10, **escopo)
+        for p in lista if not p.controla_por_serie
+    ])
+    db.commit()
+    return tipo.id
+
+
+def _medir(engine, chamada) -> tuple[int, float, int]:
+    comandos = []
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        with Session(engine) as db:
+            inicio = time.perf_counter()
+            resposta = chamada(db)
+            segundos = time.perf_counter() - inicio
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
+    opcoes = resposta if isinstance(resposta, list) else resposta["items"]
+    return len(comandos), segundos, len(opcoes)
+
+
+def main():
+    cenarios = {
+        "lista completa": lambda db, t: get_product_items(
+            t, product_id=None, unit_id=None, q=None, pagina=None, por_pagina=POR_PAGINA, db=db),
+        "primeira página": lambda db, t: get_product_items(
+            t, product_id=None, unit_id=None, q=None, pagina=1, por_pagina=POR_PAGINA, db=db),
+        "última página": lambda db, t: get_product_items(
+            t, product_id=None, unit_id=None, q=None, pagina=10**6, por_pagina=POR_PAGINA, db=db),
+    }
+    consultas = {nome: set() for nome in cenarios}
+
+    for produtos in PRODUTOS:
+        engine = _criar_banco()
+        with Session(engine) as db:
+            type_id = _popular(db, produtos)
+        print(f"{produtos} produtos ({produtos // 2 * ITENS_POR_PRODUTO} itens, {produtos - produtos // 2} estoques)")
+        for nome, cenario in cenarios.items():
+            n, segundos, opcoes = _medir(engine, lambda db: cenario(db, type_id))
+            consultas[nome].add(n)
+            print(f"  {nome:16}: {n} consultas, {opcoes:5d} opções em {segundos * 1000:7.1f} ms")
+
+    for nome, contagens in consultas.items():
+        assert max(contagens) <= LIMITE_CONSULTAS[nome], (
+            f"{nome}: {sorted(contagens)} consultas, limite {LIMITE_CONSULTAS[nome]}"
+        )
+    print("OK: número de consultas limitado, independente do número de produtos e itens.")
+
+
+if __name__ == "__main__":
+    main()
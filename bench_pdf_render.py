@@ -0,0 +1,99 @@
+"""
+Benchmark: latência de uma rota leve enquanto 20 PDFs são gerados ao mesmo tempo.
+
+Simula o threadpool do AnyIO (40 threads) de um worker: 20 threads geram o
+PDF de um processo com 100 tramitações e, em paralelo, uma "rota" leve
+(montar e serializar a lista de órgãos de um município) é chamada a cada
+20 ms pelo mesmo threadpool. Compara a geração na própria thread (como era)
+com a geração no pool de processos de services/pdf_render.py.
+
+Não usa banco. Execute: python bench_pdf_render.py
+"""
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import pdf_render
+from services.pdf_documentos import documento_processo
+
+PDFS_CONCORRENTES = 20
+TRAMITES = 100
+INTERVALO_ROTA = 0.02
+
+
+def _dados_processo() -> dict:
+    assinatura = {"nome": "Maria da Silva", "cargo": "Divisão de Protocolo", "data_hora": "01/02/2024 10:00:00"}
+    return {
+        "numero": "000123/2024",
+        "assunto": "Solicitação de material",
+        "requerente": "Secretaria de Saúde",
+        "conteudo": "<p>" + "Texto do processo. " * 80 + "</p>",
+        "criacao": {"origem": "SESAU / PROT", "data": "01/02/2024 10:00", "por": "Maria", "assinatura": assinatura},
+        "tramites": [
+            {
+                "origem": "SESAU / PROT",
+                "destino": "SEAD / ALMOX",
+                "data": "02/02/2024 11:00",
+                "por": "João",
+                "despacho": "Encaminho para providências. " * 20,
+                "assinatura": assinatura,
+            }
+            for _ in range(TRAMITES)
+        ],
+    }
+
+
+def _rota_leve() -> str:
+    orgaos = [{"id": i, "nome": f"Secretaria {i}", "sigla": f"S{i}"} for i in range(300)]
+    return json.dumps(orgaos, ensure_ascii=False)
+
+
+def _medir(gerar, dados) -> dict:
+    latencias = []
+    with ThreadPoolExecutor(max_workers=40) as threadpool:
+        inicio = time.perf_counter()
+        pdfs = [threadpool.submit(gerar, dados) for _ in range(PDFS_CONCORRENTES)]
+        while not all(f.done() for f in pdfs):
+            t0 = time.perf_counter()
+            threadpool.submit(_rota_leve).result()
+            latencias.append((time.perf_counter() - t0) * 1000)
+            time.sleep(INTERVALO_ROTA)
+        for f in pdfs:
+            f.result()
+        total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "total_s": total,
+        "p50_ms": statistics.median(latencias),
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] if len(latencias) > 1 else latencias[0],
+        "max_ms": latencias[-1],
+        "amostras": len(latencias),
+    }
+
+
+def main():
+    dados = _dados_processo()
+    ocioso = []
+    for _ in range(50):
+        t0 = time.perf_counter()
+        _rota_leve()
+        ocioso.append((time.perf_counter() - t0) * 1000)
+    print(f"Rota leve sem carga: p50 {statistics.median(ocioso):.2f} ms")
+
+    pdf_render.renderizar(documento_processo, dados)  # aquece o pool (spawn + imports)
+    for nome, gerar in (
+        ("PDF na thread da requisição", documento_processo),
+        ("PDF no pool de processos", lambda d: pdf_render.renderizar(documento_processo, d)),
+    ):
+        r = _medir(gerar, dados)
+        print(
+            f"{nome}: {PDFS_CONCORRENTES} PDFs em {r['total_s']:.1f} s | rota leve "
+            f"p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, máx {r['max_ms']:.1f} ms "
+            f"({r['amostras']} amostras)"
+        )
+    pdf_render.encerrar()
+
+
+if __name__ == "__main__":
+    main()
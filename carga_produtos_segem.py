@@ -4,24 +4,47 @@ Script de carga: importa planilha CSV (colunas codigo e descricao) para a tabela
 
 Uso:
     python carga_produtos_segem.py planilha.csv
+    python carga_produtos_segem.py planilha.csv --lote 5000 --somente-alterados
+    python carga_produtos_segem.py planilha.csv --url sqlite:///catalogo.db
 
 O CSV deve ter:
     - Primeira linha: cabeçalho com "codigo" e "descricao" (ou codigo;descricao)
     - Separador: vírgula (,) ou ponto e vírgula (;)
     - Encoding: UTF-8 (ou use --encoding para outro)
 
-Se o código já existir, a descrição é atualizada.
+Se o código já existir, a descrição é atualizada. As linhas são lidas sob
+demanda e gravadas em lotes (um commit por lote): no PostgreSQL com
+INSERT ... ON CONFLICT (codigo) DO UPDATE; nos demais bancos (ex.: SQLite)
+com uma consulta dos códigos do lote seguida de INSERT/UPDATE em lote.
+Com --somente-alterados, códigos cuja descrição não mudou não são regravados.
+
+Arquivo sintético para testes: python carga_produtos_segem.py --gerar-exemplo 100000 exemplo.csv
+(a comparação com a carga linha a linha está em bench_carga_produtos_segem.py).
+O resumo final informa o tempo total e as linhas por segundo.
 """
 
+import argparse
 import csv
-import sys
 import os
+import random
+import sys
+import time
+from itertools import islice
 
 # Adiciona o diretório do projeto ao path para importar database e models
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import bindparam, create_engine, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import sessionmaker
+
 from database import SessionLocal
-from models import ProdutoSegem
+from models import CatalogoVersao, ProdutoSegem
+from services.segem_catalogo import registrar_alteracao_catalogo
+
+TAMANHO_LOTE_PADRAO = 1000
+
+_tabela = ProdutoSegem.__table__
 
 
 def detect_delimiter(sample_line: str) -> str:
@@ -41,84 +64,198 @@ def normalizar_header(campo: str) -> str:
     return s
 
 
+def ler_linhas(f):
+    """Gera (codigo, descricao) a partir do arquivo aberto, sem carregá-lo inteiro."""
+    first = f.readline()
+    if not first:
+        return
+    delim = detect_delimiter(first)
+    headers = [normalizar_header(h) for h in next(csv.reader([first], delimiter=delim))]
+    idx_codigo = idx_descricao = None
+    for i, h in enumerate(headers):
+        if h in ("codigo", "código", "cod"):
+            idx_codigo = i
+        if h in ("descricao", "descrição", "desc"):
+            idx_descricao = i
+
+    if idx_codigo is None:
+        idx_codigo = 0
+    if idx_descricao is None:
+        idx_descricao = 1 if len(headers) > 1 else 0
+
+    for row in csv.reader(f, delimiter=delim):
+        if len(row) <= max(idx_codigo, idx_descricao):
+            continue
+        codigo = (row[idx_codigo] or "").strip()
+        descricao = (row[idx_descricao] or "").strip()
+        if not codigo:
+            continue
+        yield codigo, descricao or None
+
+
+def em_lotes(linhas, tamanho: int):
+    """Agrupa as linhas em dicts {codigo: descricao}; código repetido no lote vale a última linha."""
+    it = iter(linhas)
+    while True:
+        bloco = list(islice(it, tamanho))
+        if not bloco:
+            return
+        yield len(bloco), dict(bloco)
+
+
+def _upsert_postgres(conn, lote: dict, somente_alterados: bool) -> tuple[int, int]:
+    """INSERT ... ON CONFLICT; xmax = 0 identifica as linhas inseridas (as demais foram atualizadas)."""
+    stmt = pg_insert(_tabela).values([{"codigo": c, "descricao": d} for c, d in lote.items()])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["codigo"],
+        set_={"descricao": stmt.excluded.descricao},
+        where=_tabela.c.descricao.is_distinct_from(stmt.excluded.descricao) if somente_alterados else None,
+    ).returning(literal_column("(xmax = 0)"))
+    gravados = conn.execute(stmt).fetchall()
+    inseridos = sum(1 for r in gravados if r[0])
+    return inseridos, len(gravados) - inseridos
+
+
+def _upsert_generico(conn, lote: dict, somente_alterados: bool) -> tuple[int, int]:
+    """Fallback portável (SQLite etc.): uma consulta dos códigos do lote e gravação em lote."""
+    existentes = dict(
+        conn.execute(
+            select(_tabela.c.codigo, _tabela.c.descricao).where(_tabela.c.codigo.in_(list(lote)))
+        ).fetchall()
+    )
+    novos = [{"codigo": c, "descricao": d} for c, d in lote.items() if c not in existentes]
+    alterados = [
+        {"b_codigo": c, "b_descricao": d}
+        for c, d in lote.items()
+        if c in existentes and (not somente_alterados or existentes[c] != d)
+    ]
+    if novos:
+        conn.execute(insert(_tabela), novos)
+    if alterados:
+        conn.execute(
+            _tabela.update()
+            .where(_tabela.c.codigo == bindparam("b_codigo"))
+            .values(descricao=bindparam("b_descricao")),
+            alterados,
+        )
+    return len(novos), len(alterados)
+
+
+def novos_totais() -> dict:
+    return {"lidas": 0, "inseridos": 0, "atualizados": 0, "sem_alteracao": 0, "lotes": 0}
+
+
+def carregar(db, linhas, tamanho_lote: int = TAMANHO_LOTE_PADRAO, somente_alterados: bool = False,
+             progresso: bool = True, totais: dict | None = None) -> dict:
+    """
+    Grava as linhas em lotes (commit por lote) e retorna os totais.
+    Se `totais` for informado, é atualizado a cada lote confirmado: após uma
+    exceção, o chamador ainda sabe o que já foi gravado.
+    """
+    upsert = _upsert_postgres if db.get_bind().dialect.name == "postgresql" else _upsert_generico
+    if totais is None:
+        totais = novos_totais()
+    inicio = time.monotonic()
+
+    for lidas, lote in em_lotes(linhas, tamanho_lote):
+        inseridos, atualizados = upsert(db.connection(), lote, somente_alterados)
+        db.commit()
+        totais["lidas"] += lidas
+        totais["inseridos"] += inseridos
+        totais["atualizados"] += atualizados
+        totais["sem_alteracao"] += len(lote) - inseridos - atualizados
+        totais["lotes"] += 1
+        if progresso:
+            decorrido = time.monotonic() - inicio
+            taxa = totais["lidas"] / decorrido if decorrido else 0
+            print(
+                f"\r  {totais['lidas']} linhas | {totais['inseridos']} inseridos, "
+                f"{totais['atualizados']} atualizados, {totais['sem_alteracao']} sem alteração "
+                f"({taxa:.0f} linhas/s)",
+                end="",
+                flush=True,
+            )
+    if progresso and totais["lotes"]:
+        print()
+    totais["segundos"] = time.monotonic() - inicio
+    return totais
+
+
+def gerar_exemplo(path: str, quantidade: int) -> None:
+    """Gera um CSV sintético (codigo;descricao) para medir a carga."""
+    palavras = ["CABO", "PARAFUSO", "MEDIÇÃO", "CADEIRA", "MESA", "MONITOR", "SENSOR", "AÇO", "UMIDADE", "SOLO"]
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(["codigo", "descricao"])
+        for i in range(quantidade):
+            w.writerow([f"{900000000 + i}", " ".join(rnd.choice(palavras) for _ in range(4))])
+    print(f"Arquivo de exemplo gerado: {path} ({quantidade} linhas)")
+
+
+def _sessao(url: str | None):
+    if not url:
+        return SessionLocal()
+    engine = create_engine(url)
+    ProdutoSegem.metadata.create_all(engine, tables=[_tabela, CatalogoVersao.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python carga_produtos_segem.py <arquivo.csv> [--encoding ENCODING]")
-        print("Exemplo: python carga_produtos_segem.py planilha.csv")
-        print("         python carga_produtos_segem.py planilha.csv --encoding latin-1")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Carga do catálogo produtos_segem a partir de CSV.")
+    parser.add_argument("arquivo", help="arquivo CSV (ou destino, com --gerar-exemplo)")
+    parser.add_argument("--encoding", default="utf-8", help="encoding do CSV (ex.: latin-1)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_PADRAO, help="linhas por lote/commit")
+    parser.add_argument("--somente-alterados", action="store_true",
+                        help="não regrava códigos cuja descrição não mudou")
+    parser.add_argument("--url", help="URL do banco (padrão: database.py); ex.: sqlite:///catalogo.db")
+    parser.add_argument("--gerar-exemplo", type=int, metavar="N",
+                        help="gera um CSV sintético com N linhas em ARQUIVO e sai")
+    args = parser.parse_args()
 
-    path = sys.argv[1]
-    encoding = "utf-8"
-    if "--encoding" in sys.argv:
-        idx = sys.argv.index("--encoding")
-        if idx + 1 < len(sys.argv):
-            encoding = sys.argv[idx + 1]
+    if args.gerar_exemplo:
+        gerar_exemplo(args.arquivo, args.gerar_exemplo)
+        return
 
-    if not os.path.isfile(path):
-        print(f"Arquivo não encontrado: {path}")
+    if not os.path.isfile(args.arquivo):
+        print(f"Arquivo não encontrado: {args.arquivo}")
+        sys.exit(1)
+    if args.lote < 1:
+        print("--lote deve ser maior que zero.")
         sys.exit(1)
 
-    db = SessionLocal()
+    db = _sessao(args.url)
+    totais = novos_totais()
     try:
-        with open(path, "r", encoding=encoding, newline="") as f:
-            # Ler primeira linha para detectar delimitador e cabeçalho
-            first = f.readline()
-            delim = detect_delimiter(first)
-            f.seek(0)
-            reader = csv.reader(f, delimiter=delim)
-            rows = list(reader)
-
-        if not rows:
+        with open(args.arquivo, "r", encoding=args.encoding, newline="") as f:
+            carregar(db, ler_linhas(f), args.lote, args.somente_alterados, totais=totais)
+
+        if not totais["lidas"]:
             print("Arquivo vazio.")
             sys.exit(0)
 
-        headers = [normalizar_header(h) for h in rows[0]]
-        idx_codigo = idx_descricao = None
-        for i, h in enumerate(headers):
-            if h in ("codigo", "código", "cod"):
-                idx_codigo = i
-            if h in ("descricao", "descrição", "desc"):
-                idx_descricao = i
-
-        if idx_codigo is None:
-            idx_codigo = 0
-        if idx_descricao is None:
-            idx_descricao = 1 if len(headers) > 1 else 0
-
-        inseridos = 0
-        atualizados = 0
-        erros = 0
-
-        for i, row in enumerate(rows[1:], start=2):  # linha 2 em diante
-            if len(row) <= max(idx_codigo, idx_descricao):
-                continue
-            codigo = (row[idx_codigo] or "").strip()
-            descricao = (row[idx_descricao] or "").strip()
-            if not codigo:
-                continue
-            try:
-                existente = db.query(ProdutoSegem).filter(ProdutoSegem.codigo == codigo).first()
-                if existente:
-                    existente.descricao = descricao or None
-                    atualizados += 1
-                else:
-                    db.add(ProdutoSegem(codigo=codigo, descricao=descricao or None))
-                    inseridos += 1
-            except Exception as e:
-                erros += 1
-                print(f"Linha {i}: erro - {e}")
+        # Avisa os workers da aplicação para recarregar o catálogo em cache
+        if totais["inseridos"] or totais["atualizados"]:
+            registrar_alteracao_catalogo(db)
 
-        db.commit()
-        print(f"Carga concluída: {inseridos} inseridos, {atualizados} atualizados.", end="")
-        if erros:
-            print(f" {erros} erros.")
-        else:
-            print()
+        segundos = totais["segundos"]
+        taxa = totais["lidas"] / segundos if segundos else 0
+        print(
+            f"Carga concluída: {totais['inseridos']} inseridos, {totais['atualizados']} atualizados, "
+            f"{totais['sem_alteracao']} sem alteração em {totais['lotes']} lote(s) "
+            f"- {segundos:.1f}s ({taxa:.0f} linhas/s)."
+        )
 
     except Exception as e:
         db.rollback()
-        print(f"Erro: {e}")
+        print(f"\nErro: {e}")
+        # Lotes já confirmados ficam no banco: os workers precisam recarregar mesmo assim
+        if totais["inseridos"] or totais["atualizados"]:
+            registrar_alteracao_catalogo(db)
+            print(
+                f"Carga interrompida após {totais['lotes']} lote(s): {totais['inseridos']} inseridos, "
+                f"{totais['atualizados']} atualizados já gravados."
+            )
         sys.exit(1)
     finally:
         db.close()
@@ -0,0 +1,79 @@
+"""Respostas com cabeçalhos de cache HTTP (ETag + Cache-Control)."""
+
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+
+
+def _etag_confere(request: Request, etag: str) -> bool:
+    enviado = request.headers.get("if-none-match") or ""
+    return any(tag.strip() in (etag, "*") for tag in enviado.split(","))
+
+
+def cached_json_response(request: Request, payload, etag: str, max_age: int = 60) -> Response:
+    """
+    JSONResponse com ETag fraco e Cache-Control privado.
+    Responde 304 (sem corpo) quando o navegador já tem a mesma versão.
+    """
+    etag_header = f'W/"{etag}"'
+    headers = {
+        "ETag": etag_header,
+        "Cache-Control": f"private, max-age={max_age}",
+    }
+    if _etag_confere(request, etag_header):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+def cached_json_bytes_response(
+    request: Request,
+    corpo: bytes,
+    etag: str,
+    corpo_gzip: bytes | None = None,
+    max_age: int = 60,
+) -> Response:
+    """
+    Como cached_json_response, para documentos já serializados (e opcionalmente
+    já comprimidos): envia a versão gzip quando o navegador aceita.
+    """
+    etag_header = f'W/"{etag}"'
+    headers = {
+        "ETag": etag_header,
+        "Cache-Control": f"private, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_confere(request, etag_header):
+        return Response(status_code=304, headers=headers)
+    aceita = request.headers.get("accept-encoding") or ""
+    if corpo_gzip is not None and "gzip" in aceita.lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(corpo_gzip, media_type="application/json", headers=headers)
+    return Response(corpo, media_type="application/json", headers=headers)
+
+
+def cached_file_response(
+    request: Request,
+    caminho: str,
+    etag: str,
+    media_type: str,
+    filename: str | None = None,
+    max_age: int = 300,
+) -> Response:
+    """
+    Arquivo com ETag forte: 304 quando o navegador já tem a versão, e
+    requisições Range/If-Range (visualizadores de PDF) atendidas pelo FileResponse.
+    Com `filename`, envia como anexo (download).
+    """
+    etag_header = f'"{etag}"'
+    headers = {
+        "ETag": etag_header,
+        "Cache-Control": f"private, max-age={max_age}",
+    }
+    if _etag_confere(request, etag_header):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        caminho,
+        media_type=media_type,
+        headers=headers,
+        filename=filename,
+        content_disposition_type="attachment" if filename else "inline",
+    )
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from templating import templates
 from fastapi.staticfiles import StaticFiles
@@ -5,12 +7,22 @@ from starlette.middleware.sessions import SessionMiddleware  # ✅ Import no top
 from middleware import AuthRequiredMiddleware
 from middleware_audit import AuditMiddleware
 from database import Base, engine
+from services import anexos_tarefas, eventos_caixa, pdf_render
 import os
 
 # ========================================
 # 1. CRIAR APP
 # ========================================
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anexos_tarefas.iniciar()  # fila de miniaturas/texto dos anexos
+    yield
+    pdf_render.encerrar()  # processos de geração de PDF
+    eventos_caixa.encerrar()  # listener do broker de eventos da caixa
+    anexos_tarefas.encerrar()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ========================================
 # 2. ADICIONAR MIDDLEWARES (ANTES DE TUDO)
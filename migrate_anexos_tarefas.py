@@ -0,0 +1,59 @@
+"""
+Migração: fila de processamento dos anexos (tabela tarefas_anexos) e texto
+extraído dos anexos para a busca (processos.texto_anexos, com índice
+trigram opcional).
+Execute: python migrate_anexos_tarefas.py
+"""
+from database import engine
+from sqlalchemy import text
+
+from models import TarefaAnexo
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        if coluna_existe(conn, "processos", "texto_anexos"):
+            print("  Coluna processos.texto_anexos já existe, pulando.")
+        else:
+            conn.execute(text("ALTER TABLE processos ADD COLUMN texto_anexos TEXT"))
+            print("  Adicionada coluna processos.texto_anexos")
+
+        TarefaAnexo.__table__.create(conn, checkfirst=True)  # também cria os índices
+        print("  Tabela tarefas_anexos OK")
+
+        # Anexos já gravados entram na fila (os de conteúdo igual compartilham a tarefa)
+        r = conn.execute(text("""
+            INSERT INTO tarefas_anexos (tipo, chave, media_type, status, tentativas, tem_miniatura,
+                                        proxima_tentativa_at, created_at)
+            SELECT 'extrair', sha256, MIN(media_type), 'pendente', 0, FALSE, now(), now()
+            FROM tramite_anexos
+            GROUP BY sha256
+            ON CONFLICT (tipo, chave) DO NOTHING
+        """))
+        print(f"  {r.rowcount} conteúdo(s) de anexos enfileirado(s)")
+
+    # Trigram é opcional: sem a extensão a pesquisa continua funcionando, só mais lenta
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_processos_texto_anexos_trgm "
+                "ON processos USING gin (texto_anexos gin_trgm_ops)"
+            ))
+        print("  Índice trigram ix_processos_texto_anexos_trgm OK")
+    except Exception as e:
+        print(f"  Aviso: não foi possível criar o índice trigram (pg_trgm): {e}")
+
+    print("Migração fila de anexos concluída.")
+
+
+if __name__ == "__main__":
+    main()
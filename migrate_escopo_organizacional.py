@@ -0,0 +1,69 @@
+"""
+Migração: ancestrais materializados da hierarquia administrativa
+(orgaos.estado_id; unidades.municipio_id e unidades.estado_id), com índices,
+e preenchimento das linhas existentes a partir de orgaos/municipios.
+Execute: python migrate_escopo_organizacional.py
+"""
+from database import engine
+from sqlalchemy import text
+
+COLUNAS = [
+    ("orgaos", "estado_id", "INTEGER REFERENCES estados(id)"),
+    ("unidades", "municipio_id", "INTEGER REFERENCES municipios(id)"),
+    ("unidades", "estado_id", "INTEGER REFERENCES estados(id)"),
+]
+
+INDICES = [
+    ("orgaos", "municipio_id"),
+    ("orgaos", "estado_id"),
+    ("unidades", "orgao_id"),
+    ("unidades", "municipio_id"),
+    ("unidades", "estado_id"),
+]
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        for tabela, coluna, tipo in COLUNAS:
+            if coluna_existe(conn, tabela, coluna):
+                print(f"  Coluna {tabela}.{coluna} já existe, pulando.")
+            else:
+                conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}"))
+                print(f"  Adicionada coluna {tabela}.{coluna}")
+
+        for tabela, coluna in INDICES:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabela}_{coluna} ON {tabela} ({coluna})"
+            ))
+            print(f"  Índice ix_{tabela}_{coluna} OK")
+
+        r = conn.execute(text("""
+            UPDATE orgaos o SET estado_id = m.estado_id
+            FROM municipios m
+            WHERE m.id = o.municipio_id
+              AND o.estado_id IS DISTINCT FROM m.estado_id
+        """))
+        print(f"  orgaos.estado_id preenchido em {r.rowcount} linha(s)")
+
+        r = conn.execute(text("""
+            UPDATE unidades u SET municipio_id = o.municipio_id, estado_id = o.estado_id
+            FROM orgaos o
+            WHERE o.id = u.orgao_id
+              AND (u.municipio_id IS DISTINCT FROM o.municipio_id
+                   OR u.estado_id IS DISTINCT FROM o.estado_id)
+        """))
+        print(f"  unidades.municipio_id/estado_id preenchidos em {r.rowcount} linha(s)")
+
+    print("Migração escopo organizacional concluída.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Migração: coluna gerada items.busca_numero e índices de busca por tombo/série.
+Execute: python migrate_items_busca_numero.py
+"""
+from database import engine
+from sqlalchemy import text
+from models import ITEM_BUSCA_NUMERO_SQL
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        if coluna_existe(conn, "items", "busca_numero"):
+            print("  Coluna items.busca_numero já existe, pulando.")
+        else:
+            conn.execute(text(
+                f"ALTER TABLE items ADD COLUMN busca_numero VARCHAR "
+                f"GENERATED ALWAYS AS ({ITEM_BUSCA_NUMERO_SQL}) STORED"
+            ))
+            print("  Adicionada coluna items.busca_numero")
+
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_items_busca_numero_prefixo "
+            "ON items (busca_numero text_pattern_ops)"
+        ))
+        print("  Índice de prefixo ix_items_busca_numero_prefixo OK")
+
+    # Trigram é opcional: sem a extensão a busca por trecho continua funcionando, só mais lenta
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_items_busca_numero_trgm "
+                "ON items USING gin (busca_numero gin_trgm_ops)"
+            ))
+        print("  Índice trigram ix_items_busca_numero_trgm OK")
+    except Exception as e:
+        print(f"  Aviso: não foi possível criar o índice trigram (pg_trgm): {e}")
+
+    print("Migração items.busca_numero concluída.")
+
+
+if __name__ == "__main__":
+    main()
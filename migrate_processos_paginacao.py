@@ -0,0 +1,31 @@
+"""
+Migração: índices da paginação por cursor das listas de processos
+(caixa: created_at, id; arquivados: coalesce(arquivado_at, created_at), id;
+histórico: coalesce(ultima_tramitacao_at, created_at), id, que substitui o
+índice só da última atividade).
+Execute: python migrate_processos_paginacao.py
+"""
+from database import engine
+from sqlalchemy import text
+
+INDICES = [
+    ("ix_processos_created_at_id", "(created_at, id)"),
+    ("ix_processos_arquivo_ordem", "(coalesce(arquivado_at, created_at), id)"),
+    ("ix_processos_historico_ordem", "(coalesce(ultima_tramitacao_at, created_at), id)"),
+]
+
+
+def main():
+    with engine.begin() as conn:
+        for nome, colunas in INDICES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON processos {colunas}"))
+            print(f"  Índice {nome} OK")
+        # Coberto pelo ix_processos_historico_ordem (mesma expressão como primeira coluna)
+        conn.execute(text("DROP INDEX IF EXISTS ix_processos_ultima_atividade"))
+        print("  Índice ix_processos_ultima_atividade removido")
+
+    print("Migração índices de paginação concluída.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Migração: resumo das tramitações em processos (ultima_tramitacao_at e
+qtd_tramites), com índice por (última atividade, id) para o histórico, e
+preenchimento dos processos existentes a partir de tramites.
+Execute: python migrate_processos_ultima_tramitacao.py
+"""
+from database import engine
+from sqlalchemy import text
+
+COLUNAS = [
+    ("ultima_tramitacao_at", "TIMESTAMP"),
+    ("qtd_tramites", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        for col, tipo in COLUNAS:
+            if coluna_existe(conn, "processos", col):
+                print(f"  Coluna processos.{col} já existe, pulando.")
+            else:
+                conn.execute(text(f"ALTER TABLE processos ADD COLUMN {col} {tipo}"))
+                print(f"  Adicionada coluna processos.{col}")
+
+        r = conn.execute(text("""
+            UPDATE processos p
+            SET ultima_tramitacao_at = t.ultima, qtd_tramites = t.qtd
+            FROM (
+                SELECT processo_id, MAX(created_at) AS ultima, COUNT(*) AS qtd
+                FROM tramites
+                GROUP BY processo_id
+            ) t
+            WHERE t.processo_id = p.id
+              AND (p.ultima_tramitacao_at IS DISTINCT FROM t.ultima OR p.qtd_tramites <> t.qtd)
+        """))
+        print(f"  Resumo de tramitações preenchido em {r.rowcount} processo(s)")
+
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_processos_historico_ordem
+            ON processos (coalesce(ultima_tramitacao_at, created_at), id)
+        """))
+        print("  Índice ix_processos_historico_ordem OK")
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_tramites_processo_id ON tramites (processo_id)"
+        ))
+        print("  Índice ix_tramites_processo_id OK")
+
+    print("Migração resumo de tramitações concluída.")
+
+
+if __name__ == "__main__":
+    main()
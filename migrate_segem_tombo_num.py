@@ -0,0 +1,44 @@
+"""
+Migração: coluna gerada tombo_num (Nº TOMBO numérico) em segem_itens e
+segem_itens_produtos, com índice, e tabela segem_tombo_contador.
+Os valores existentes são calculados pelo próprio banco ao adicionar a coluna.
+Execute: python migrate_segem_tombo_num.py
+"""
+from database import Base, engine
+from sqlalchemy import text
+from models import SEGEM_TOMBO_NUM_SQL
+
+TABELAS = ["segem_itens", "segem_itens_produtos"]
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        for tabela in TABELAS:
+            if coluna_existe(conn, tabela, "tombo_num"):
+                print(f"  Coluna {tabela}.tombo_num já existe, pulando.")
+            else:
+                conn.execute(text(
+                    f"ALTER TABLE {tabela} ADD COLUMN tombo_num INTEGER "
+                    f"GENERATED ALWAYS AS ({SEGEM_TOMBO_NUM_SQL}) STORED"
+                ))
+                print(f"  Adicionada coluna {tabela}.tombo_num")
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabela}_tombo_num ON {tabela} (tombo_num)"
+            ))
+            print(f"  Índice ix_{tabela}_tombo_num OK")
+
+    # Cria segem_tombo_contador se não existir
+    Base.metadata.create_all(bind=engine)
+    print("Migração tombo_num concluída.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Migração: tabela tramite_anexos (anexos das tramitações, guardados por
+SHA-256 em services/anexos.py) e cota de anexos por município
+(municipios.cota_anexos_mb; vazio = SIGEIN_ANEXOS_COTA_MB).
+Execute: python migrate_tramite_anexos.py
+"""
+from database import engine
+from sqlalchemy import text
+
+from models import TramiteAnexo
+
+
+def coluna_existe(conn, tabela: str, coluna: str) -> bool:
+    r = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :tabela AND column_name = :coluna
+    """), {"tabela": tabela, "coluna": coluna})
+    return r.fetchone() is not None
+
+
+def main():
+    with engine.begin() as conn:
+        if coluna_existe(conn, "municipios", "cota_anexos_mb"):
+            print("  Coluna municipios.cota_anexos_mb já existe, pulando.")
+        else:
+            conn.execute(text("ALTER TABLE municipios ADD COLUMN cota_anexos_mb INTEGER"))
+            print("  Adicionada coluna municipios.cota_anexos_mb")
+
+        TramiteAnexo.__table__.create(conn, checkfirst=True)  # também cria os índices
+        print("  Tabela tramite_anexos OK")
+
+    print("Migração anexos de tramitação concluída.")
+
+
+if __name__ == "__main__":
+    main()
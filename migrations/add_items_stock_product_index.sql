@@ -0,0 +1,5 @@
+-- Migração: índices por produto em items e stock
+-- Usados pelo endpoint de unidades de origem do formulário de movimentação.
+-- PostgreSQL:
+CREATE INDEX IF NOT EXISTS ix_items_product_id ON items (product_id);
+CREATE INDEX IF NOT EXISTS ix_stock_product_id ON stock (product_id);
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, Float, Date, ForeignKey, func, Enum as SQLEnum, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, Text, DateTime, Float, Date, ForeignKey, func, Enum as SQLEnum, Table, Computed, Index, UniqueConstraint, text
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 from database import Base
 from datetime import datetime
@@ -163,7 +163,7 @@ class Product(Base):
     brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
 
     model = Column(String)
-    description = Column(Text)
+    description = deferred(Column(Text))
     controla_por_serie = Column(Boolean, default=True)
     ativo = Column(Boolean, default=True)
 
@@ -188,6 +188,12 @@ class Product(Base):
 # ITEM (Produto com série = 1 item = 1 unidade física)
 # =====================================================
 
+ITEM_BUSCA_NUMERO_SQL = (
+    "CASE WHEN tombo THEN regexp_replace(num_tombo_ou_serie, '[^0-9]', '', 'g') "
+    "ELSE upper(regexp_replace(num_tombo_ou_serie, '[^A-Za-z0-9]', '', 'g')) END"
+)
+
+
 class Item(Base):
     __tablename__ = "items"
 
@@ -197,11 +203,17 @@ class Item(Base):
     municipio_id = Column(Integer, ForeignKey("municipios.id"), nullable=False)
     orgao_id = Column(Integer, ForeignKey("orgaos.id"), nullable=False)
     
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     unit_id = Column(Integer, ForeignKey("unidades.id"), nullable=False)
 
     tombo = Column(Boolean, default=False)
     num_tombo_ou_serie = Column(String, unique=True)
+    # Chave de busca (services/item_search.py): só dígitos para tombo,
+    # maiúsculas sem pontuação para série. Mantida pelo banco.
+    busca_numero = Column(
+        String,
+        Computed(ITEM_BUSCA_NUMERO_SQL, persisted=True),
+    )
 
     estado_id = Column(Integer, ForeignKey("equipment_states.id"))
     status = Column(String, default="Disponível")
@@ -209,7 +221,7 @@ class Item(Base):
     data_aquisicao = Column(Date)
     valor_aquisicao = Column(Float)
     garantia_ate = Column(Date)
-    observacao = Column(Text)
+    observacao = deferred(Column(Text))
 
     municipio = relationship("Municipio")
     orgao = relationship("Orgao")
@@ -217,6 +229,15 @@ class Item(Base):
     estado = relationship("EquipmentState")
     unit = relationship("Unidade", back_populates="items")
 
+    __table_args__ = (
+        # Busca por prefixo (LIKE 'abc%'); o índice trigram fica em migrate_items_busca_numero.py
+        Index(
+            "ix_items_busca_numero_prefixo",
+            "busca_numero",
+            postgresql_ops={"busca_numero": "text_pattern_ops"},
+        ),
+    )
+
 
 # =====================================================
 # STOCK (Produto sem série)
@@ -231,7 +252,7 @@ class Stock(Base):
     municipio_id = Column(Integer, ForeignKey("municipios.id"), nullable=False)
     orgao_id = Column(Integer, ForeignKey("orgaos.id"), nullable=False)
 
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     unit_id = Column(Integer, ForeignKey("unidades.id"), nullable=False)  # ✅ agora é Unidade
 
     quantidade = Column(Integer, default=0)
@@ -263,7 +284,7 @@ class Movement(Base):
     tipo = Column(String(30), nullable=False)
 
     data = Column(DateTime, default=datetime.utcnow)
-    observacao = Column(Text)
+    observacao = deferred(Column(Text))
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
@@ -383,7 +404,8 @@ class Processo(Base):
     ano = Column(Integer)
     assunto = Column(String(500))
     requerente = Column(String(200))
-    conteudo = Column(Text)
+    conteudo = deferred(Column(Text))  # HTML do documento: fora das listas (undefer no PDF)
+    texto_anexos = deferred(Column(Text))  # texto extraído dos anexos, só para a busca (services/anexos_tarefas.py)
     
     # ✅ Origem (quem criou)
     municipio_origem_id = Column(Integer, ForeignKey("municipios.id"), nullable=False)
@@ -415,6 +437,11 @@ class Processo(Base):
     arquivado = Column(Boolean, default=False)
     arquivado_at = Column(DateTime, nullable=True)
     arquivado_por_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    # Resumo das tramitações, mantido por processo_tramitar_post (evita carregar
+    # os trâmites nas listagens); migrate_processos_ultima_tramitacao.py preenche os antigos
+    ultima_tramitacao_at = Column(DateTime, nullable=True)
+    qtd_tramites = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relacionamentos
     atribuido_to = relationship("User", foreign_keys=[atribuido_to_id])
@@ -432,6 +459,23 @@ class Processo(Base):
     creator = relationship("User", foreign_keys=[created_by])
     arquivado_por = relationship("User", foreign_keys=[arquivado_por_id])
 
+    __table_args__ = (
+        # Paginação por cursor (services/paginacao.py): chave de ordenação + id.
+        # Histórico: ordenação/filtro por última atividade (ultima_atividade_at abaixo)
+        Index("ix_processos_historico_ordem", text("coalesce(ultima_tramitacao_at, created_at)"), "id"),
+        Index("ix_processos_created_at_id", "created_at", "id"),
+        Index("ix_processos_arquivo_ordem", text("coalesce(arquivado_at, created_at)"), "id"),
+    )
+
+    @hybrid_property
+    def ultima_atividade_at(self):
+        """Última tramitação ou, sem tramitações, a criação."""
+        return self.ultima_tramitacao_at or self.created_at
+
+    @ultima_atividade_at.expression
+    def ultima_atividade_at(cls):
+        return func.coalesce(cls.ultima_tramitacao_at, cls.created_at)
+
 
 class ProcessoAssinante(Base):
     """Assinantes do processo (usuários que devem assinar)"""
@@ -450,7 +494,7 @@ class Tramite(Base):
     __tablename__ = "tramites"
     
     id = Column(Integer, primary_key=True, index=True)
-    processo_id = Column(Integer, ForeignKey("processos.id"), nullable=False)
+    processo_id = Column(Integer, ForeignKey("processos.id"), nullable=False, index=True)
     
     # De onde saiu
     municipio_origem_id = Column(Integer, ForeignKey("municipios.id"))
@@ -462,8 +506,8 @@ class Tramite(Base):
     orgao_destino_id = Column(Integer, ForeignKey("orgaos.id"), nullable=False)
     unidade_destino_id = Column(Integer, ForeignKey("unidades.id"), nullable=False)
     
-    despacho = Column(Text)
-    anexo_path = Column(String(500))
+    despacho = deferred(Column(Text))
+    anexo_path = Column(String(500))  # legado; anexos em tramite_anexos
     
     created_at = Column(DateTime, default=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"))
@@ -474,6 +518,64 @@ class Tramite(Base):
     unidade_origem = relationship("Unidade", foreign_keys=[unidade_origem_id])
     orgao_destino = relationship("Orgao", foreign_keys=[orgao_destino_id])
     unidade_destino = relationship("Unidade", foreign_keys=[unidade_destino_id])
+    anexos = relationship("TramiteAnexo", back_populates="tramite", order_by="TramiteAnexo.ordem")
+
+
+class TramiteAnexo(Base):
+    """Arquivo anexado a uma tramitação; o conteúdo fica em disco pelo SHA-256 (services/anexos.py)"""
+    __tablename__ = "tramite_anexos"
+    __table_args__ = (
+        # Cota do município: soma dos conteúdos distintos (index-only)
+        Index("ix_tramite_anexos_municipio_sha", "municipio_id", "sha256", "tamanho"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tramite_id = Column(Integer, ForeignKey("tramites.id"), nullable=False, index=True)
+    ordem = Column(Integer, nullable=False, default=0)
+    nome = Column(String(255), nullable=False)  # nome original do arquivo
+    sha256 = Column(String(64), nullable=False, index=True)
+    tamanho = Column(BigInteger, nullable=False)
+    media_type = Column(String(100), nullable=False)
+    municipio_id = Column(Integer, ForeignKey("municipios.id"), nullable=False)  # município que paga a cota
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    created_by = Column(Integer, ForeignKey("users.id"))
+
+    tramite = relationship("Tramite", back_populates="anexos")
+    # Miniatura/texto do conteúdo (uma tarefa por SHA-256, compartilhada pelos anexos iguais)
+    tarefa = relationship(
+        "TarefaAnexo",
+        primaryjoin="and_(foreign(TramiteAnexo.sha256) == TarefaAnexo.chave, TarefaAnexo.tipo == 'extrair')",
+        viewonly=True,
+        uselist=False,
+    )
+
+
+class TarefaAnexo(Base):
+    """
+    Fila persistente do processamento de anexos (services/anexos_tarefas.py):
+    "extrair" (chave = SHA-256): miniatura e texto do conteúdo;
+    "indexar" (chave = id do processo): texto dos anexos em processos.texto_anexos.
+    """
+    __tablename__ = "tarefas_anexos"
+    __table_args__ = (
+        UniqueConstraint("tipo", "chave", name="uq_tarefas_anexos_tipo_chave"),
+        Index("ix_tarefas_anexos_fila", "status", "proxima_tentativa_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(20), nullable=False)
+    chave = Column(String(64), nullable=False)
+    media_type = Column(String(100))
+    status = Column(String(20), nullable=False, default="pendente")  # pendente, processando, concluido, falhou
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa_at = Column(DateTime, default=datetime.utcnow)
+    iniciada_at = Column(DateTime)
+    concluida_at = Column(DateTime)
+    erro = Column(String(500))  # última falha
+    tem_miniatura = Column(Boolean, nullable=False, default=False)
+    texto = deferred(Column(Text))  # texto extraído (sem limite de exibição: só para a busca)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class Circular(Base):
@@ -597,6 +699,7 @@ class Municipio(Base):
     codigo_ibge = Column(String(7), unique=True)  # ✅ código IBGE para validação
     estado_id = Column(Integer, ForeignKey("estados.id"), nullable=False)
     ativo = Column(Boolean, default=True)
+    cota_anexos_mb = Column(Integer)  # None = SIGEIN_ANEXOS_COTA_MB (services/anexos.py)
     
     estado = relationship("Estado", back_populates="municipios")
     orgaos = relationship("Orgao", back_populates="municipio")
@@ -610,7 +713,9 @@ class Orgao(Base):
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(200), nullable=False)  # Ex: "Secretaria de Saúde"
     sigla = Column(String(20))  # Ex: "SESAU"
-    municipio_id = Column(Integer, ForeignKey("municipios.id"), nullable=False)
+    municipio_id = Column(Integer, ForeignKey("municipios.id"), nullable=False, index=True)
+    # Ancestral materializado (services/escopo_organizacional.py)
+    estado_id = Column(Integer, ForeignKey("estados.id"), index=True)
     responsavel = Column(String(200))  # ✅ nome do responsável
     email = Column(String(200))  # ✅ email institucional
     telefone = Column(String(20))
@@ -626,7 +731,11 @@ class Unidade(Base):
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(200), nullable=False)
     sigla = Column(String(20))
-    orgao_id = Column(Integer, ForeignKey("orgaos.id"), nullable=False)
+    orgao_id = Column(Integer, ForeignKey("orgaos.id"), nullable=False, index=True)
+    # Ancestrais materializados (services/escopo_organizacional.py): filtros por
+    # município/estado sem join com orgaos e municipios
+    municipio_id = Column(Integer, ForeignKey("municipios.id"), index=True)
+    estado_id = Column(Integer, ForeignKey("estados.id"), index=True)
     responsavel = Column(String(200))
     ramal = Column(String(10))
     ativo = Column(Boolean, default=True)
@@ -679,6 +788,14 @@ class Unidade(Base):
 # SEGEM (Sistema de Gestão de Materiais)
 # =====================================================
 
+# Nº TOMBO "003.502" -> 3502 (NULL se fora do formato); mesmo critério de routers/segem._parse_tombo_to_int
+SEGEM_TOMBO_NUM_SQL = (
+    r"CASE WHEN num_tombo_gcm ~ '^ *[0-9]{1,3}\.[0-9]{1,3} *$' "
+    r"THEN split_part(btrim(num_tombo_gcm), '.', 1)::integer * 1000 "
+    r"+ split_part(btrim(num_tombo_gcm), '.', 2)::integer END"
+)
+
+
 class SegemItem(Base):
     __tablename__ = "segem_itens"
 
@@ -688,9 +805,10 @@ class SegemItem(Base):
 
     ano = Column(Integer)  # ANO
     num_tombo_gcm = Column(String(50))  # Nº TOMBO (GCM)
+    tombo_num = Column(Integer, Computed(SEGEM_TOMBO_NUM_SQL, persisted=True), index=True)
     local = Column(String(200))  # LOCAL
     codigo = Column(String(100))  # CÓDIGO
-    descricao = Column(Text)  # DESCRIÇÃO
+    descricao = deferred(Column(Text))  # DESCRIÇÃO
     situacao = Column(String(100))  # SITUAÇÃO
     valor_rs = Column(Float)  # VALOR R$
     entrada_no_siga = Column(String(100))  # ENTRADA NO SIGA
@@ -715,11 +833,20 @@ class SegemItemProduto(Base):
     id = Column(Integer, primary_key=True, index=True)
     segem_item_id = Column(Integer, ForeignKey("segem_itens.id"), nullable=False)
     num_tombo_gcm = Column(String(50))
+    tombo_num = Column(Integer, Computed(SEGEM_TOMBO_NUM_SQL, persisted=True), index=True)
     valor_rs = Column(Float)
 
     segem_item = relationship("SegemItem", back_populates="produtos")
 
 
+class SegemTomboContador(Base):
+    """Último Nº TOMBO reservado (linha única id=1); serializa reservas concorrentes."""
+    __tablename__ = "segem_tombo_contador"
+
+    id = Column(Integer, primary_key=True)
+    ultimo = Column(Integer, nullable=False, default=0)
+
+
 class ProdutoSegem(Base):
     """Catálogo de produtos SEGEM (código + descrição) para preenchimento automático no formulário."""
     __tablename__ = "produtos_segem"
@@ -729,5 +856,14 @@ class ProdutoSegem(Base):
     descricao = Column(Text)
 
 
+class CatalogoVersao(Base):
+    """Versão de catálogos e cadastros (produtos_segem, pdf_processos); os workers comparam para invalidar caches."""
+    __tablename__ = "catalogo_versoes"
+
+    nome = Column(String(50), primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime, default=datetime.utcnow)
+
+
 # Alias legado: vários routers ainda importam Unit
 Unit = Unidade
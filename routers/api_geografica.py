@@ -1,80 +1,99 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Estado, Municipio, Orgao, Unidade, Grupo, Assunto, Subassunto
+from http_cache import cached_json_response
+from services.indice_categorias import buscar_categorias, get_indice_categorias
+from services.hierarquia_geografica import (
+    estados_json,
+    get_hierarquia,
+    municipios_json,
+    orgaos_json,
+    resolver_caminho,
+    subarvore,
+    unidades_json,
+)
 
 router = APIRouter(prefix="/api", tags=["API Geográfica"])
 
 
+_MAX_AGE = 60  # depois disso o navegador revalida pelo ETag (304 sem corpo)
+
+
+def _resposta(request: Request, h, payload):
+    return cached_json_response(request, payload, etag=f"geo-{h.etag}", max_age=_MAX_AGE)
+
+
 @router.get("/estados")
-def listar_estados(db: Session = Depends(get_db)):
+def listar_estados(request: Request, db: Session = Depends(get_db)):
     """Lista todos os estados"""
-    estados = db.query(Estado).order_by(Estado.nome).all()
-    return [{"id": e.id, "nome": e.nome, "uf": e.uf} for e in estados]
+    h = get_hierarquia(db)
+    return _resposta(request, h, estados_json(h))
 
 
 @router.get("/municipios/{estado_id}")
-def listar_municipios(estado_id: int, db: Session = Depends(get_db)):
+def listar_municipios(estado_id: int, request: Request, db: Session = Depends(get_db)):
     """Lista municípios de um estado"""
-    municipios = (
-        db.query(Municipio)
-        .filter(Municipio.estado_id == estado_id, Municipio.ativo == True)
-        .order_by(Municipio.nome)
-        .all()
-    )
-    return [{"id": m.id, "nome": m.nome} for m in municipios]
+    h = get_hierarquia(db)
+    return _resposta(request, h, municipios_json(h, estado_id))
 
 
 @router.get("/orgaos/{municipio_id}")
-def listar_orgaos(municipio_id: int, db: Session = Depends(get_db)):
+def listar_orgaos(municipio_id: int, request: Request, db: Session = Depends(get_db)):
     """Lista órgãos de um município"""
-    orgaos = (
-        db.query(Orgao)
-        .filter(Orgao.municipio_id == municipio_id, Orgao.ativo == True)
-        .order_by(Orgao.nome)
-        .all()
-    )
-    return [
-        {
-            "id": o.id,
-            "nome": o.nome,
-            "sigla": o.sigla
-        }
-        for o in orgaos
-    ]
+    h = get_hierarquia(db)
+    return _resposta(request, h, orgaos_json(h, municipio_id))
 
 
 @router.get("/unidades/{orgao_id}")
-def listar_unidades(orgao_id: int, db: Session = Depends(get_db)):
+def listar_unidades(orgao_id: int, request: Request, db: Session = Depends(get_db)):
     """Lista unidades de um órgão"""
-    unidades = (
-        db.query(Unidade)
-        .filter(Unidade.orgao_id == orgao_id, Unidade.ativo == True)
-        .order_by(Unidade.nome)
-        .all()
-    )
-    return [
-        {
-            "id": u.id,
-            "nome": u.nome,
-            "sigla": u.sigla
-        }
-        for u in unidades
-    ]
+    h = get_hierarquia(db)
+    return _resposta(request, h, unidades_json(h, orgao_id))
 
 
 @router.get("/estado-do-municipio/{municipio_id}")
-def get_estado_do_municipio(municipio_id: int, db: Session = Depends(get_db)):
+def get_estado_do_municipio(municipio_id: int, request: Request, db: Session = Depends(get_db)):
     """Retorna o estado de um município (para modo edição)"""
-    municipio = db.query(Municipio).filter(Municipio.id == municipio_id).first()
-    
+    h = get_hierarquia(db)
+    municipio = h.municipios_por_id.get(municipio_id)
+
     if not municipio:
         return {"error": "Município não encontrado"}
-    
-    return {
+
+    return _resposta(request, h, {
         "estado_id": municipio.estado_id,
         "municipio_id": municipio.id
+    })
+
+
+@router.get("/hierarquia")
+def obter_hierarquia(
+    request: Request,
+    estado_id: int | None = None,
+    municipio_id: int | None = None,
+    orgao_id: int | None = None,
+    unidade_id: int | None = None,
+    arvore: bool = False,
+    db: Session = Depends(get_db),
+):
+    """
+    Cascata inteira em uma chamada: a partir do nível mais profundo informado,
+    completa o caminho (estado/município/órgão/unidade) e devolve a lista de
+    cada nível. Com `arvore=true`, inclui os descendentes ativos do nó
+    selecionado aninhados até as unidades.
+    """
+    h = get_hierarquia(db)
+    caminho = resolver_caminho(h, estado_id, municipio_id, orgao_id, unidade_id)
+    payload = {
+        **caminho,
+        "estados": estados_json(h),
+        "municipios": municipios_json(h, caminho["estado_id"]),
+        "orgaos": orgaos_json(h, caminho["municipio_id"]),
+        "unidades": unidades_json(h, caminho["orgao_id"]),
     }
+    if arvore:
+        payload["arvore"] = subarvore(h, caminho)
+    return _resposta(request, h, payload)
 
 
 # ========================================
@@ -84,94 +103,26 @@ def get_estado_do_municipio(municipio_id: int, db: Session = Depends(get_db)):
 @router.get("/grupos")
 def listar_grupos(db: Session = Depends(get_db)):
     """Lista todos os grupos"""
-    grupos = db.query(Grupo).filter(Grupo.ativo == True).order_by(Grupo.nome).all()
-    return [{"id": g.id, "nome": g.nome} for g in grupos]
+    return get_indice_categorias(db).grupos
 
 
 @router.get("/assuntos/{grupo_id}")
 def listar_assuntos(grupo_id: int, db: Session = Depends(get_db)):
     """Lista assuntos de um grupo"""
-    assuntos = (
-        db.query(Assunto)
-        .filter(Assunto.grupo_id == grupo_id, Assunto.ativo == True)
-        .order_by(Assunto.nome)
-        .all()
-    )
-    return [{"id": a.id, "nome": a.nome} for a in assuntos]
+    return get_indice_categorias(db).assuntos_do_grupo.get(grupo_id, [])
 
 
 @router.get("/subassuntos/{assunto_id}")
 def listar_subassuntos(assunto_id: int, db: Session = Depends(get_db)):
     """Lista subassuntos de um assunto"""
-    subassuntos = (
-        db.query(Subassunto)
-        .filter(Subassunto.assunto_id == assunto_id, Subassunto.ativo == True)
-        .order_by(Subassunto.nome)
-        .all()
-    )
-    return [{"id": s.id, "nome": s.nome} for s in subassuntos]
+    return get_indice_categorias(db).subassuntos_do_assunto.get(assunto_id, [])
 
 
 @router.get("/categoria/search")
 def buscar_categoria(
     q: str = Query("", min_length=1),
+    limite: int = Query(30, ge=1, le=100),
     db: Session = Depends(get_db),
 ):
-    """Busca tipo LIKE em grupo, assunto e subassunto. Refina conforme digita."""
-    termo = f"%{q.strip()}%"
-    resultados = []
-
-    # Grupos que batem
-    grupos = (
-        db.query(Grupo)
-        .filter(Grupo.ativo == True, Grupo.nome.ilike(termo))
-        .order_by(Grupo.nome)
-        .all()
-    )
-    for g in grupos:
-        resultados.append({
-            "label": g.nome,
-            "grupo_id": g.id,
-            "assunto_id": None,
-            "subassunto_id": None,
-        })
-
-    # Assuntos que batem (com grupo)
-    assuntos = (
-        db.query(Assunto)
-        .join(Grupo)
-        .filter(Assunto.ativo == True, Grupo.ativo == True, Assunto.nome.ilike(termo))
-        .order_by(Grupo.nome, Assunto.nome)
-        .all()
-    )
-    for a in assuntos:
-        resultados.append({
-            "label": f"{a.grupo.nome} > {a.nome}",
-            "grupo_id": a.grupo_id,
-            "assunto_id": a.id,
-            "subassunto_id": None,
-        })
-
-    # Subassuntos que batem (com assunto e grupo)
-    subassuntos = (
-        db.query(Subassunto)
-        .join(Assunto)
-        .join(Grupo)
-        .filter(
-            Subassunto.ativo == True,
-            Assunto.ativo == True,
-            Grupo.ativo == True,
-            Subassunto.nome.ilike(termo),
-        )
-        .order_by(Grupo.nome, Assunto.nome, Subassunto.nome)
-        .all()
-    )
-    for s in subassuntos:
-        resultados.append({
-            "label": f"{s.assunto.grupo.nome} > {s.assunto.nome} > {s.nome}",
-            "grupo_id": s.assunto.grupo_id,
-            "assunto_id": s.assunto_id,
-            "subassunto_id": s.id,
-        })
-
-    return resultados
\ No newline at end of file
+    """Busca por prefixo de palavras (sem acento) em grupo, assunto e subassunto. Refina conforme digita."""
+    return buscar_categorias(get_indice_categorias(db), q, limite)
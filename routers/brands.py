@@ -8,21 +8,16 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
 from database import get_db
 from dependencies import get_current_user, registrar_log
-from models import Brand, Category, EquipmentType
+from models import Brand, EquipmentType
 from templating import templates
 from ui_alerts import alert_back
+from services.reference_data import get_reference_data, invalidate_reference_data
 
 router = APIRouter(prefix="/brands", tags=["Brands"])
 
 
 def _categories_with_types(db: Session):
-    return (
-        db.query(Category)
-        .options(joinedload(Category.equipment_types))
-        .filter(Category.ativo == True)
-        .order_by(Category.nome)
-        .all()
-    )
+    return [c for c in get_reference_data(db).categorias if c.ativo]
 
 
 def _sync_brand_types(db: Session, marca: Brand, type_ids: List[int]) -> None:
@@ -49,9 +44,10 @@ def _marca_nome_duplicada(db: Session, nome: str, exclude_id: int | None = None)
     return q.first() is not None
 
 
-def _brand_display(brand: Brand) -> dict:
-    tipos = sorted(brand.equipment_types, key=lambda t: t.nome)
-    cats = sorted({t.category.nome for t in tipos if t.category}, key=str.lower)
+def _brand_display(ref, brand) -> dict:
+    tipos = sorted((ref.tipos_por_id[t] for t in brand.type_ids if t in ref.tipos_por_id), key=lambda t: t.nome)
+    nomes_categoria = {c.id: c.nome for c in ref.categorias}
+    cats = sorted({nomes_categoria[t.category_id] for t in tipos if t.category_id in nomes_categoria}, key=str.lower)
     return {
         "categorias": ", ".join(cats) if cats else "—",
         "tipos": ", ".join(t.nome for t in tipos) if tipos else "—",
@@ -64,23 +60,20 @@ def list_brands(request: Request, db: Session = Depends(get_db), user: str = Dep
     if not user:
         return RedirectResponse("/login")
 
-    brands = (
-        db.query(Brand)
-        .options(
-            joinedload(Brand.equipment_types).joinedload(EquipmentType.category),
-        )
-        .order_by(Brand.nome)
-        .all()
-    )
-    brands_view = [{"marca": b, **_brand_display(b)} for b in brands]
+    ref = get_reference_data(db)
+    brands_view = [{"marca": b, **_brand_display(ref, b)} for b in ref.marcas]
 
+    nomes_categoria = {c.id: c.nome for c in ref.categorias}
     categorias_set = set()
     tipos_set = set()
-    for b in brands:
-        for t in b.equipment_types:
+    for b in ref.marcas:
+        for type_id in b.type_ids:
+            t = ref.tipos_por_id.get(type_id)
+            if not t:
+                continue
             tipos_set.add(t.nome)
-            if t.category:
-                categorias_set.add(t.category.nome)
+            if t.category_id in nomes_categoria:
+                categorias_set.add(nomes_categoria[t.category_id])
     categorias = sorted(categorias_set, key=str.lower)
     tipos = sorted(tipos_set, key=str.lower)
 
@@ -107,9 +100,7 @@ def add_brand_form(
     if not user:
         return RedirectResponse("/login")
 
-    existing_brand_names = [
-        b.nome for b in db.query(Brand.nome).order_by(Brand.nome).all()
-    ]
+    existing_brand_names = [b.nome for b in get_reference_data(db).marcas]
 
     return templates.TemplateResponse(
         "brand_add.html",
@@ -158,6 +149,7 @@ def add_brand(
         db.rollback()
         return alert_back(f'A marca "{nome_limpo}" já está cadastrada.')
 
+    invalidate_reference_data()
     registrar_log(db, usuario=user, acao=f"Cadastrou marca: {nome_limpo}", ip=ip)
     return RedirectResponse("/brands", status_code=HTTP_302_FOUND)
 
@@ -229,6 +221,7 @@ def edit_brand(
         except IntegrityError:
             db.rollback()
             return alert_back(f'A marca "{nome_limpo}" já está cadastrada.')
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Editou marca ID {brand_id}", ip=ip)
 
     return RedirectResponse("/brands", status_code=HTTP_302_FOUND)
@@ -250,6 +243,7 @@ def delete_brand(
     if marca:
         db.delete(marca)
         db.commit()
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Excluiu marca ID {brand_id}", ip=ip)
 
     return RedirectResponse("/brands", status_code=HTTP_302_FOUND)
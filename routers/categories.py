@@ -5,6 +5,7 @@ from database import get_db
 from models import Category
 from dependencies import get_current_user, registrar_log
 from templating import templates
+from services.reference_data import invalidate_reference_data
 from starlette.status import HTTP_302_FOUND
 
 router = APIRouter(prefix="/categories", tags=["Categorias"])
@@ -48,6 +49,7 @@ def add_category(
     category = Category(nome=nome, descricao=descricao)
     db.add(category)
     db.commit()
+    invalidate_reference_data()
     registrar_log(
         db,
         usuario=user,
@@ -91,6 +93,7 @@ def edit_category(
         category.nome = nome
         category.descricao = descricao
         db.commit()
+        invalidate_reference_data()
         registrar_log(
             db,
             usuario=user,
@@ -114,6 +117,7 @@ def delete_category(
         nome = category.nome
         db.delete(category)
         db.commit()
+        invalidate_reference_data()
         registrar_log(
             db,
             usuario=user,
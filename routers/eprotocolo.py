@@ -1,14 +1,26 @@
+import os
+
 from fastapi import APIRouter, Request, Depends, Query
-from fastapi.responses import RedirectResponse, JSONResponse, Response
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
+from http_cache import cached_file_response
 from fastapi import Form
 from models import Requerente
-from sqlalchemy import or_
-from sqlalchemy.orm import Session, joinedload
-from database import get_db
-from dependencies import get_current_user
+from sqlalchemy import DateTime, Text, func, insert, literal, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal, get_db
+from dependencies import get_current_user, registrar_log
 from templating import templates
-from models import Estado, Municipio, User, Processo, ProcessoAssinante, Tramite, Orgao, Unidade, Grupo, Assunto, Subassunto
-from datetime import datetime
+from ui_alerts import alert_back
+from services.hierarquia_geografica import get_hierarquia, resolver_caminho
+from services import anexos, anexos_tarefas, eventos_caixa
+from services.indice_categorias import invalidate_indice_categorias
+from services.paginacao import contar_limitado, navegacao, paginar
+from services.pdf_render import RenderizacaoIndisponivel
+from services.processo_exportacao import LIMITE_PROCESSOS, gerar_zip, progresso_exportacao
+from services.processo_pdf import agendar_pdf_processo, pdf_processo
+from models import User, Processo, ProcessoAssinante, Tramite, TramiteAnexo, Unidade, Grupo, Assunto, Subassunto
+from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/eprotocolo", tags=["E-Protocolo"])
 
@@ -54,7 +66,7 @@ def processos_criar(
     u = db.query(User).filter(User.email == user).first()
     if not u:
         return RedirectResponse("/login")
-    estados = db.query(Estado).order_by(Estado.nome).all()
+    estados = get_hierarquia(db).estados
     return templates.TemplateResponse(
         "eprotocolo/processos/criar.html",
         {"request": request, "user": user, "user_obj": u, "estados": estados}
@@ -151,6 +163,7 @@ async def processos_criar_post(
             pa = ProcessoAssinante(processo_id=p.id, user_id=aid)
             db.add(pa)
     db.commit()
+    eventos_caixa.publicar([uid, u.unidade_id], "processo_chegou", processo_ids=[p.id])
     return RedirectResponse("/eprotocolo/processos/caixa", status_code=303)
 
 
@@ -160,20 +173,18 @@ def processos_caixa(
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
     aba: str = Query("todos", alias="aba"),
-    pagina: int = Query(1, ge=1),
+    pagina: int = Query(None, ge=1),
     por_pagina: int = Query(10, ge=5, le=100),
+    apos: str = Query(None),
+    antes: str = Query(None),
+    ultima: bool = Query(False),
 ):
     if not user:
         return RedirectResponse("/login")
     u = db.query(User).filter(User.email == user).first()
     if not u:
         return RedirectResponse("/login")
-    # Base: processos na unidade atual OU criados pela unidade do usuário
-    base_filter = or_(
-        Processo.unidade_atual_id == u.unidade_id,
-        Processo.unidade_origem_id == u.unidade_id,
-    )
-    q_base = db.query(Processo).filter(base_filter)
+    q_base = db.query(Processo).filter(_filtro_caixa(u))
 
     # Filtro por aba (status e demais critérios da caixa)
     q = q_base
@@ -200,35 +211,21 @@ def processos_caixa(
         elif aba == "lidos":
             q = q.filter(Processo.lido_at != None)
 
-    total = q.count()
-    offset = (pagina - 1) * por_pagina
-    processos = (
+    # Total da aba = badge já contado (sem um COUNT a mais)
+    contadores = _contadores_caixa(q_base, u)
+    total = contadores.get(aba, contadores["todos"])
+    pag = paginar(
         q.options(
             joinedload(Processo.orgao_origem),
             joinedload(Processo.unidade_origem),
             joinedload(Processo.creator),
-            joinedload(Processo.assinantes).joinedload(ProcessoAssinante.user),
-        )
-        .order_by(Processo.created_at.desc())
-        .offset(offset)
-        .limit(por_pagina)
-        .all()
+            selectinload(Processo.assinantes).joinedload(ProcessoAssinante.user),
+        ),
+        Processo.created_at, Processo.id, por_pagina,
+        pagina=pagina, apos=apos, antes=antes, ultima=ultima, total=total,
     )
-
-    # Contagens por aba (para badges) — abas de tramitação só consideram não arquivados
-    q_nao_arq = q_base.filter(Processo.arquivado == False)
-    cnt_todos = q_nao_arq.count()
-    cnt_urgentes = q_nao_arq.filter(Processo.urgente == True).count()
-    cnt_assinados = q_nao_arq.filter(Processo.status == "Assinado").count()
-    cnt_a_assinar = q_nao_arq.filter(
-        Processo.assinantes.any(ProcessoAssinante.user_id == u.id),
-        Processo.status != "Assinado",
-    ).count()
-    cnt_recebidos = q_nao_arq.filter(Processo.status.in_(["Recebido", "Em tramitação"])).count()
-    cnt_em_edicao = q_nao_arq.filter(Processo.status == "Em edição").count()
-    cnt_nao_lidos = q_nao_arq.filter(Processo.lido_at == None).count()
-    cnt_lidos = q_nao_arq.filter(Processo.lido_at != None).count()
-    cnt_arquivados = q_base.filter(Processo.arquivado == True).count()
+    processos = pag.itens
+    nav = navegacao(pag, total, True, {"aba": aba, "por_pagina": por_pagina})
 
     return templates.TemplateResponse(
         "eprotocolo/processos/caixa.html",
@@ -237,22 +234,85 @@ def processos_caixa(
             "user": user,
             "processos": processos,
             "total": total,
-            "pagina": pagina,
+            "pagina": pag.numero,
             "por_pagina": por_pagina,
+            "nav": nav,
             "aba": aba,
-            "cnt_todos": cnt_todos,
-            "cnt_urgentes": cnt_urgentes,
-            "cnt_assinados": cnt_assinados,
-            "cnt_a_assinar": cnt_a_assinar,
-            "cnt_recebidos": cnt_recebidos,
-            "cnt_em_edicao": cnt_em_edicao,
-            "cnt_nao_lidos": cnt_nao_lidos,
-            "cnt_lidos": cnt_lidos,
-            "cnt_arquivados": cnt_arquivados,
+            **{f"cnt_{nome}": n for nome, n in contadores.items()},
         },
     )
 
 
+def _filtro_caixa(u: User):
+    """Processos na unidade atual OU criados pela unidade do usuário (base da caixa)."""
+    return or_(
+        Processo.unidade_atual_id == u.unidade_id,
+        Processo.unidade_origem_id == u.unidade_id,
+    )
+
+
+def _contadores_caixa(q_base, u: User) -> dict:
+    """Contagens por aba (badges); abas de tramitação só consideram não arquivados."""
+    q_nao_arq = q_base.filter(Processo.arquivado == False)
+    return {
+        "todos": q_nao_arq.count(),
+        "urgentes": q_nao_arq.filter(Processo.urgente == True).count(),
+        "assinados": q_nao_arq.filter(Processo.status == "Assinado").count(),
+        "a_assinar": q_nao_arq.filter(
+            Processo.assinantes.any(ProcessoAssinante.user_id == u.id),
+            Processo.status != "Assinado",
+        ).count(),
+        "recebidos": q_nao_arq.filter(Processo.status.in_(["Recebido", "Em tramitação"])).count(),
+        "em_edicao": q_nao_arq.filter(Processo.status == "Em edição").count(),
+        "nao_lidos": q_nao_arq.filter(Processo.lido_at == None).count(),
+        "lidos": q_nao_arq.filter(Processo.lido_at != None).count(),
+        "arquivados": q_base.filter(Processo.arquivado == True).count(),
+    }
+
+
+@router.get("/processos/caixa/contadores")
+def processos_caixa_contadores(
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Badges da caixa em JSON (a tela recarrega só isto ao receber um evento)."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    u = db.query(User).filter(User.email == user).first()
+    if not u:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    return JSONResponse(_contadores_caixa(db.query(Processo).filter(_filtro_caixa(u)), u))
+
+
+@router.get("/processos/caixa/eventos")
+async def processos_caixa_eventos(
+    request: Request,
+    user: str = Depends(get_current_user),
+):
+    """
+    Eventos da caixa da unidade do usuário (Server-Sent Events). Sem get_db: a conexão
+    fica aberta enquanto a caixa estiver aberta e não deve ocupar uma conexão do pool.
+    """
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    unidade_id = await run_in_threadpool(_unidade_do_usuario, user)
+    if not unidade_id:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    return StreamingResponse(
+        eventos_caixa.fluxo_sse(unidade_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _unidade_do_usuario(email: str) -> int | None:
+    db = SessionLocal()
+    try:
+        return db.query(User.unidade_id).filter(User.email == email).scalar()
+    finally:
+        db.close()
+
+
 @router.get("/processos/{processo_id:int}/visualizar")
 def processo_visualizar(
     request: Request,
@@ -281,6 +341,7 @@ def processo_visualizar(
             joinedload(Processo.tramites).joinedload(Tramite.unidade_origem),
             joinedload(Processo.tramites).joinedload(Tramite.orgao_destino),
             joinedload(Processo.tramites).joinedload(Tramite.unidade_destino),
+            joinedload(Processo.tramites).selectinload(Tramite.anexos).selectinload(TramiteAnexo.tarefa),
         )
         .filter(Processo.id == processo_id)
         .first()
@@ -306,6 +367,7 @@ def processo_visualizar(
         "destino": dest_str,
         "por": processo.creator.nome if processo.creator else "-",
         "tramite_id": None,
+        "anexos": [],
     })
     # 2. Tramitações
     for t in tramites_ordenados:
@@ -318,11 +380,10 @@ def processo_visualizar(
             "destino": dest,
             "por": t.usuario.nome if t.usuario else "-",
             "tramite_id": t.id,
+            "anexos": t.anexos,
         })
     # Dias na unidade atual
-    data_ref = processo.created_at
-    if tramites_ordenados and tramites_ordenados[-1].created_at:
-        data_ref = tramites_ordenados[-1].created_at
+    data_ref = processo.ultima_atividade_at
     try:
         delta = datetime.now() - (data_ref or datetime.min)
         dias_na_unidade = max(0, delta.days)
@@ -466,10 +527,35 @@ def processo_toggle_urgente(
     if not processo:
         return JSONResponse({"error": "Processo não encontrado"}, status_code=404)
     processo.urgente = not processo.urgente
+    unidades = [processo.unidade_atual_id, processo.unidade_origem_id]
     db.commit()
+    eventos_caixa.publicar(unidades, "contadores", processo_ids=[processo_id])
     return JSONResponse({"ok": True, "urgente": processo.urgente})
 
 
+def _ler_destino(form) -> tuple[tuple[int, int, int] | None, str | None]:
+    """(município, órgão, unidade) de destino informados no formulário de tramitação, ou mensagem de erro."""
+    try:
+        mid = int(form.get("municipio_destino_id")) if form.get("municipio_destino_id") else None
+        oid = int(form.get("orgao_destino_id")) if form.get("orgao_destino_id") else None
+        uid = int(form.get("unidade_destino_id")) if form.get("unidade_destino_id") else None
+    except (ValueError, TypeError):
+        return None, "Dados do destinatário inválidos"
+    if not all([mid, oid, uid]):
+        return None, "Selecione Estado, Município, Órgão e Unidade destinatários"
+    return (mid, oid, uid), None
+
+
+def _validar_destino(db: Session, mid: int, oid: int, uid: int) -> str | None:
+    """Mensagem de erro se a unidade não pertence ao órgão e o órgão ao município (uma consulta, sem join)."""
+    destino = db.query(Unidade.orgao_id, Unidade.municipio_id).filter(Unidade.id == uid).first()
+    if not destino or destino.orgao_id != oid:
+        return "Unidade não pertence ao órgão informado"
+    if destino.municipio_id != mid:
+        return "Órgão não pertence ao município informado"
+    return None
+
+
 @router.post("/processos/{processo_id:int}/tramitar")
 async def processo_tramitar_post(
     processo_id: int,
@@ -477,284 +563,473 @@ async def processo_tramitar_post(
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
 ):
-    """Tramita o processo para a caixa de outra unidade. Registra quem tramitou, data/hora e despacho."""
+    """
+    Tramita o processo para a caixa de outra unidade. Registra quem tramitou, data/hora,
+    despacho e anexos (recebidos em streaming e guardados por conteúdo, services/anexos.py).
+    """
     if not user:
         return JSONResponse({"error": "Não autorizado"}, status_code=401)
     u = db.query(User).filter(User.email == user).first()
     if not u:
         return JSONResponse({"error": "Não autorizado"}, status_code=401)
 
-    form = await request.form()
-    municipio_destino_id = form.get("municipio_destino_id")
-    orgao_destino_id = form.get("orgao_destino_id")
-    unidade_destino_id = form.get("unidade_destino_id")
-    despacho = form.get("despacho") or ""
+    processo = db.query(Processo).filter(Processo.id == processo_id).first()
+    if not processo:
+        return JSONResponse({"error": "Processo não encontrado"}, status_code=404)
 
     try:
-        mid = int(municipio_destino_id) if municipio_destino_id else None
-        oid = int(orgao_destino_id) if orgao_destino_id else None
-        uid = int(unidade_destino_id) if unidade_destino_id else None
-    except (ValueError, TypeError):
-        return JSONResponse({"error": "Dados do destinatário inválidos"}, status_code=400)
+        form, arquivos = await anexos.receber_formulario(request)
+    except anexos.AnexoInvalido as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    try:
+        despacho = form.get("despacho") or ""
+        destino, erro = _ler_destino(form)
+        if erro:
+            return JSONResponse({"error": erro}, status_code=400)
+        mid, oid, uid = destino
+
+        # Validar que a unidade pertence ao órgão e ao município
+        erro = _validar_destino(db, mid, oid, uid)
+        if erro:
+            return JSONResponse({"error": erro}, status_code=400)
+
+        # Não tramitar para a mesma unidade
+        if processo.unidade_atual_id == uid:
+            return JSONResponse({"error": "O processo já está nesta unidade"}, status_code=400)
+
+        # Cota de anexos do município em que o processo está (quem envia)
+        municipio_cota_id = processo.municipio_atual_id or u.municipio_id
+        if arquivos:
+            try:
+                anexos.verificar_cota(db, municipio_cota_id, arquivos)
+            except anexos.AnexoInvalido as e:
+                db.rollback()
+                return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+        # Criar registro de Tramite (origem = localização atual do processo)
+        unidade_anterior_id = processo.unidade_atual_id
+        unidade_origem_id = processo.unidade_origem_id
+        agora = datetime.utcnow()
+        tramite = Tramite(
+            processo_id=processo_id,
+            municipio_origem_id=processo.municipio_atual_id,
+            orgao_origem_id=processo.orgao_atual_id,
+            unidade_origem_id=processo.unidade_atual_id,
+            municipio_destino_id=mid,
+            orgao_destino_id=oid,
+            unidade_destino_id=uid,
+            despacho=despacho.strip() or None,
+            created_at=agora,
+            created_by=u.id,
+        )
+        db.add(tramite)
+        for ordem, arquivo in enumerate(arquivos):
+            anexos.guardar(arquivo)
+            tramite.anexos.append(TramiteAnexo(
+                ordem=ordem,
+                nome=arquivo.nome,
+                sha256=arquivo.sha256,
+                tamanho=arquivo.tamanho,
+                media_type=arquivo.media_type,
+                municipio_id=municipio_cota_id,
+                created_at=agora,
+                created_by=u.id,
+            ))
+        anexos_tarefas.enfileirar(db, processo_id, arquivos)  # miniatura e texto em segundo plano
+        processo.ultima_tramitacao_at = agora
+        processo.qtd_tramites = Processo.qtd_tramites + 1  # incremento no banco (tramitações simultâneas)
+
+        # Atualizar localização atual do processo
+        processo.municipio_atual_id = mid
+        processo.orgao_atual_id = oid
+        processo.unidade_atual_id = uid
+        processo.status = "Em tramitação"
+        processo.lido_at = None  # Unidade destino ainda não leu
+        processo.atribuido_to_id = None  # Desatribuir ao tramitar
+
+        db.commit()
+    finally:
+        anexos.descartar(arquivos)
+    if arquivos:
+        anexos_tarefas.avisar()
+    # A unidade de origem continua vendo o processo na caixa (_filtro_caixa): só recebe "contadores"
+    if unidade_anterior_id != unidade_origem_id:
+        eventos_caixa.publicar([unidade_anterior_id], "processo_saiu", processo_ids=[processo_id])
+    eventos_caixa.publicar([uid], "processo_chegou", processo_ids=[processo_id])
+    eventos_caixa.publicar([unidade_origem_id], "contadores", processo_ids=[processo_id])
+    agendar_pdf_processo(processo_id)
+    return JSONResponse({"ok": True, "message": "Processo tramitado com sucesso", "processo_id": processo_id})
 
-    if not all([mid, oid, uid]):
-        return JSONResponse({"error": "Selecione Estado, Município, Órgão e Unidade destinatários"}, status_code=400)
 
-    processo = db.query(Processo).filter(Processo.id == processo_id).first()
-    if not processo:
+def _anexos_da_caixa(db: Session, u: User, *colunas):
+    """Consulta de anexos (ou colunas deles) de processos na caixa da unidade do usuário."""
+    return (
+        db.query(*colunas)
+        .select_from(TramiteAnexo)
+        .join(Tramite, Tramite.id == TramiteAnexo.tramite_id)
+        .join(Processo, Processo.id == Tramite.processo_id)
+        .filter(_filtro_caixa(u))
+    )
+
+
+@router.get("/processos/anexos/{anexo_id:int}")
+def processo_anexo(
+    request: Request,
+    anexo_id: int,
+    download: int = Query(0, description="1 para download"),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Arquivo anexado a uma tramitação (com Range para os visualizadores de PDF)."""
+    if not user:
+        return RedirectResponse("/login")
+    u = db.query(User).filter(User.email == user).first()
+    if not u:
+        return RedirectResponse("/login")
+    anexo = _anexos_da_caixa(db, u, TramiteAnexo).filter(TramiteAnexo.id == anexo_id).first()
+    if not anexo:
+        return alert_back("Anexo não encontrado.", status_code=404)
+    if not os.path.exists(anexos.caminho_blob(anexo.sha256)):
+        return alert_back("O arquivo deste anexo não está disponível.", status_code=404)
+    return anexos.resposta_anexo(request, anexo, download=bool(download))
+
+
+def _situacao_anexo(anexo: TramiteAnexo) -> dict:
+    """Situação do processamento em segundo plano (miniatura/texto) do anexo."""
+    tarefa = anexo.tarefa
+    status = tarefa.status if tarefa else "pendente"
+    return {
+        "id": anexo.id,
+        "status": status,
+        "tentativas": tarefa.tentativas if tarefa else 0,
+        "erro": tarefa.erro if tarefa and status == "falhou" else None,
+        "miniatura": (
+            f"/eprotocolo/processos/anexos/{anexo.id}/miniatura"
+            if tarefa and status == "concluido" and tarefa.tem_miniatura else None
+        ),
+    }
+
+
+@router.get("/processos/anexos/{anexo_id:int}/miniatura")
+def processo_anexo_miniatura(
+    request: Request,
+    anexo_id: int,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Miniatura (PNG) da primeira página do anexo, gerada em segundo plano."""
+    if not user:
+        return RedirectResponse("/login")
+    u = db.query(User).filter(User.email == user).first()
+    if not u:
+        return RedirectResponse("/login")
+    sha256 = _anexos_da_caixa(db, u, TramiteAnexo.sha256).filter(TramiteAnexo.id == anexo_id).scalar()
+    caminho = anexos.caminho_miniatura(sha256) if sha256 else None
+    if not caminho or not os.path.exists(caminho):
+        return JSONResponse({"error": "Miniatura não disponível"}, status_code=404)
+    return cached_file_response(request, caminho, f"{sha256}-m", "image/png", max_age=86400)
+
+
+@router.get("/processos/{processo_id:int}/anexos/situacao")
+def processo_anexos_situacao(
+    processo_id: int,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Situação do processamento dos anexos do processo (a tela consulta enquanto há pendentes)."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    u = db.query(User).filter(User.email == user).first()
+    if not u:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    if not db.query(Processo.id).filter(Processo.id == processo_id, _filtro_caixa(u)).first():
         return JSONResponse({"error": "Processo não encontrado"}, status_code=404)
+    lista = (
+        db.query(TramiteAnexo)
+        .join(Tramite, Tramite.id == TramiteAnexo.tramite_id)
+        .options(selectinload(TramiteAnexo.tarefa))
+        .filter(Tramite.processo_id == processo_id)
+        .all()
+    )
+    return JSONResponse({"anexos": [_situacao_anexo(a) for a in lista]})
 
-    # Validar que a unidade pertence ao órgão e ao município
-    unidade = db.query(Unidade).filter(Unidade.id == uid).first()
-    if not unidade or unidade.orgao_id != oid:
-        return JSONResponse({"error": "Unidade não pertence ao órgão informado"}, status_code=400)
-    orgao = db.query(Orgao).filter(Orgao.id == oid).first()
-    if not orgao or orgao.municipio_id != mid:
-        return JSONResponse({"error": "Órgão não pertence ao município informado"}, status_code=400)
-
-    # Não tramitar para a mesma unidade
-    if processo.unidade_atual_id == uid:
-        return JSONResponse({"error": "O processo já está nesta unidade"}, status_code=400)
-
-    # Criar registro de Tramite (origem = localização atual do processo)
-    tramite = Tramite(
-        processo_id=processo_id,
-        municipio_origem_id=processo.municipio_atual_id,
-        orgao_origem_id=processo.orgao_atual_id,
-        unidade_origem_id=processo.unidade_atual_id,
-        municipio_destino_id=mid,
-        orgao_destino_id=oid,
-        unidade_destino_id=uid,
-        despacho=despacho.strip() or None,
-        anexo_path=None,  # TODO: suporte a upload de arquivos
-        created_by=u.id,
+
+# Ações em lote (seleção da caixa)
+LIMITE_LOTE = 100
+
+
+def _ids_do_form(form) -> list[int]:
+    """Ids selecionados (campo `ids` repetido), sem duplicados, na ordem recebida."""
+    ids = []
+    for v in form.getlist("ids"):
+        try:
+            ids.append(int(v))
+        except (ValueError, TypeError):
+            continue
+    return list(dict.fromkeys(ids))
+
+
+def _processos_da_caixa(db: Session, u: User, ids: list[int]) -> dict:
+    """
+    {id: linha (unidade_atual_id, unidade_origem_id, arquivado)} dos `ids` que estão na
+    caixa da unidade do usuário (mesmo critério da caixa), numa consulta; as linhas ficam
+    travadas até o commit.
+    """
+    rows = (
+        db.query(Processo.id, Processo.unidade_atual_id, Processo.unidade_origem_id, Processo.arquivado)
+        .filter(Processo.id.in_(ids), _filtro_caixa(u))
+        .with_for_update()
+        .all()
     )
-    db.add(tramite)
+    return {r.id: r for r in rows}
 
-    # Atualizar localização atual do processo
-    processo.municipio_atual_id = mid
-    processo.orgao_atual_id = oid
-    processo.unidade_atual_id = uid
-    processo.status = "Em tramitação"
-    processo.lido_at = None  # Unidade destino ainda não leu
-    processo.atribuido_to_id = None  # Desatribuir ao tramitar
 
-    db.commit()
-    return JSONResponse({"ok": True, "message": "Processo tramitado com sucesso", "processo_id": processo_id})
+def _publicar_por_unidade(na_caixa: dict, ids: list[int], tipo: str, origem: bool = False) -> None:
+    """Um evento por unidade atual (e de origem, se `origem`) com os ids que estavam nela."""
+    por_unidade: dict[int, list[int]] = {}
+    for pid in ids:
+        linha = na_caixa[pid]
+        unidades = {linha.unidade_atual_id, linha.unidade_origem_id} if origem else {linha.unidade_atual_id}
+        for unidade_id in unidades:
+            por_unidade.setdefault(unidade_id, []).append(pid)
+    for unidade_id, pids in por_unidade.items():
+        eventos_caixa.publicar([unidade_id], tipo, processo_ids=pids)
 
 
-def _html_para_texto(raw: str) -> str:
-    """Converte HTML para texto seguro para Paragraph do ReportLab."""
-    import re
-    texto = raw or ""
-    texto = re.sub(r"<[^>]+>", " ", texto).replace("&nbsp;", " ").strip()
-    texto = texto.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-    return texto.replace("\n", "<br/>") if texto else "-"
-
-
-def _quadro_cabecalho(linhas, styles) -> "Table":
-    """Retorna uma Table com borda contendo campos rotulo:valor em linhas."""
-    from reportlab.platypus import Table, TableStyle, Paragraph
-    from reportlab.lib import colors
-    from reportlab.lib.units import cm
-    data = [[Paragraph(f"<b>{r}</b>", styles["Normal"]), Paragraph(v or "-", styles["Normal"])] for r, v in linhas]
-    t = Table(data, colWidths=[4*cm, None])
-    t.setStyle(TableStyle([
-        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#495057")),
-        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#dee2e6")),
-        ("BACKGROUND", (0, 0), (0, -1), colors.HexColor("#e9ecef")),
-        ("PADDING", (0, 0), (-1, -1), 8),
-        ("FONTSIZE", (0, 0), (-1, -1), 10),
-    ]))
-    return t
-
-
-def _quadro_conteudo(texto: str, styles) -> "Table":
-    """Retorna uma Table com borda para bloco de conteúdo/despacho."""
-    from reportlab.platypus import Table, TableStyle, Paragraph
-    from reportlab.lib import colors
-    p = Paragraph(texto, styles["Normal"])
-    t = Table([[p]], colWidths=[None])
-    t.setStyle(TableStyle([
-        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#495057")),
-        ("PADDING", (0, 0), (-1, -1), 12),
-        ("BACKGROUND", (0, 0), (-1, -1), colors.white),
-    ]))
-    return t
-
-
-def _bloco_assinatura(nome: str, cargo_unidade: str, data_hora: str, styles) -> list:
-    """Retorna elementos do bloco de assinatura eletrônica no estilo de referência."""
-    from reportlab.platypus import Paragraph, Spacer
-    from reportlab.lib.styles import ParagraphStyle
-    nome_upper = (nome or "-").upper()
-    cargo_upper = (cargo_unidade or "-").upper()
-    # Formato: Assinatura eletrônica: DD/MM/YYYY HH:MM:SS
-    assinatura_str = f"Assinatura eletrônica: {data_hora}" if data_hora else "Assinatura eletrônica: -"
-    return [
-        Spacer(1, 16),
-        Paragraph(f"<b>{nome_upper}</b>", ParagraphStyle(
-            name="AssinaturaNome", parent=styles["Normal"], fontSize=11, spaceAfter=4
-        )),
-        Paragraph(f"<b>{cargo_upper}</b>", ParagraphStyle(
-            name="AssinaturaCargo", parent=styles["Normal"], fontSize=11, spaceAfter=4
-        )),
-        Paragraph(assinatura_str, ParagraphStyle(
-            name="AssinaturaData", parent=styles["Normal"], fontSize=9, textColor="gray"
-        )),
-    ]
+async def _ler_lote(request: Request, db: Session, user: str):
+    """(usuário, formulário, ids) da ação em lote, ou JSONResponse de erro."""
+    if not user:
+        return JSONResponse({"error": "Não autorizado"}, status_code=401)
+    u = db.query(User).filter(User.email == user).first()
+    if not u:
+        return JSONResponse({"error": "Não autorizado"}, status_code=401)
+    form = await request.form()
+    ids = _ids_do_form(form)
+    if not ids:
+        return JSONResponse({"error": "Selecione ao menos um processo"}, status_code=400)
+    if len(ids) > LIMITE_LOTE:
+        return JSONResponse({"error": f"Selecione no máximo {LIMITE_LOTE} processos por vez"}, status_code=400)
+    return u, form, ids
 
 
-def _gerar_pdf_processo(processo, tramites):
-    """Gera PDF do processo: cada movimentação em sua própria página, com cabeçalho e campos em quadros."""
-    from io import BytesIO
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-    from reportlab.lib import colors
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, pagesize=A4,
-        rightMargin=1.5*cm, leftMargin=1.5*cm,
-        topMargin=1.5*cm, bottomMargin=1.5*cm,
+@router.post("/processos/lote/tramitar")
+async def processos_tramitar_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """
+    Tramita os processos selecionados para o mesmo destino: destino validado uma vez,
+    acesso conferido numa consulta, trâmites inseridos com um INSERT ... SELECT e
+    processos atualizados com um único UPDATE. Os que já estão na unidade de destino são ignorados.
+    """
+    lote = await _ler_lote(request, db, user)
+    if isinstance(lote, JSONResponse):
+        return lote
+    u, form, ids = lote
+    despacho = (form.get("despacho") or "").strip() or None
+    destino, erro = _ler_destino(form)
+    if erro:
+        return JSONResponse({"error": erro}, status_code=400)
+    mid, oid, uid = destino
+    erro = _validar_destino(db, mid, oid, uid)
+    if erro:
+        return JSONResponse({"error": erro}, status_code=400)
+
+    na_caixa = _processos_da_caixa(db, u, ids)
+    fora = [pid for pid in ids if pid not in na_caixa or na_caixa[pid].arquivado]
+    if fora:
+        db.rollback()
+        return JSONResponse(
+            {"error": f"{len(fora)} processo(s) selecionado(s) não estão na caixa da sua unidade ou estão arquivados"},
+            status_code=403,
+        )
+    mover = [pid for pid in ids if na_caixa[pid].unidade_atual_id != uid]
+    if not mover:
+        db.rollback()
+        return JSONResponse({"error": "Os processos selecionados já estão nesta unidade"}, status_code=400)
+
+    # Trâmites: origem = localização atual de cada processo (lida no próprio INSERT)
+    agora = datetime.utcnow()
+    origem = select(
+        Processo.id,
+        Processo.municipio_atual_id,
+        Processo.orgao_atual_id,
+        Processo.unidade_atual_id,
+        literal(mid),
+        literal(oid),
+        literal(uid),
+        literal(despacho, Text),
+        literal(agora, DateTime),
+        literal(u.id),
+    ).where(Processo.id.in_(mover))
+    db.execute(
+        insert(Tramite).from_select(
+            [
+                "processo_id", "municipio_origem_id", "orgao_origem_id", "unidade_origem_id",
+                "municipio_destino_id", "orgao_destino_id", "unidade_destino_id",
+                "despacho", "created_at", "created_by",
+            ],
+            origem,
+        )
     )
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="BoxTitle", parent=styles["Heading2"], fontSize=11, spaceAfter=6))
-    normal = styles["Normal"]
-
-    story = []
-
-    # ---------- PÁGINA 1: CRIAÇÃO ----------
-    titulo = Paragraph(f"<b>PROCESSO {processo.numero}</b> — Criação", ParagraphStyle(
-        name="TituloPag", parent=normal, fontSize=14, spaceAfter=12, alignment=1
-    ))
-    story.append(titulo)
-    story.append(Spacer(1, 8))
-
-    origem_str = f"{(processo.orgao_origem.sigla or processo.orgao_origem.nome) if processo.orgao_origem else '-'} / {(processo.unidade_origem.sigla or processo.unidade_origem.nome) if processo.unidade_origem else '-'}"
-    dest_str = origem_str  # na criação, destino = origem
-    data_str = processo.created_at.strftime("%d/%m/%Y %H:%M") if processo.created_at else "-"
-    por_str = processo.creator.nome if processo.creator else "-"
-
-    cab_criacao = [
-        ("Assunto", processo.assunto or "Sem assunto"),
-        ("Requerente", processo.requerente or "-"),
-        ("Origem", origem_str),
-        ("Destino", dest_str),
-        ("Data/Hora", data_str),
-        ("Por", por_str),
-    ]
-    story.append(_quadro_cabecalho(cab_criacao, styles))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph("<b>Conteúdo</b>", normal))
-    story.append(Spacer(1, 4))
-    conteudo_texto = _html_para_texto(processo.conteudo or "Sem conteúdo.")
-    story.append(_quadro_conteudo(conteudo_texto, styles))
-
-    # Assinatura da criação (criador)
-    creator = processo.creator
-    nome_criador = creator.nome if creator else "-"
-    cargo_criador = "-"
-    if creator:
-        if creator.unidade:
-            cargo_criador = creator.unidade.nome or (creator.orgao.nome if creator.orgao else "-")
-        elif creator.orgao:
-            cargo_criador = creator.orgao.nome
-    data_criacao = processo.created_at.strftime("%d/%m/%Y %H:%M:%S") if processo.created_at else ""
-    story.extend(_bloco_assinatura(nome_criador, cargo_criador, data_criacao, styles))
-
-    # ---------- PÁGINAS 2+: TRAMITAÇÕES ----------
-    for tram in tramites:
-        story.append(PageBreak())
-
-        proc_orig = f"{(tram.orgao_origem.sigla or tram.orgao_origem.nome) if tram.orgao_origem else '-'} / {(tram.unidade_origem.sigla or tram.unidade_origem.nome) if tram.unidade_origem else '-'}"
-        proc_dest = f"{(tram.orgao_destino.sigla or tram.orgao_destino.nome) if tram.orgao_destino else '-'} / {(tram.unidade_destino.sigla or tram.unidade_destino.nome) if tram.unidade_destino else '-'}"
-        data_tram = tram.created_at.strftime("%d/%m/%Y %H:%M") if tram.created_at else "-"
-        por_tram = tram.usuario.nome if tram.usuario else "-"
-
-        titulo_tram = Paragraph(
-            f"<b>PROCESSO {processo.numero}</b> — Tramitação",
-            ParagraphStyle(name="TituloTram", parent=normal, fontSize=14, spaceAfter=12, alignment=1)
+    db.query(Processo).filter(Processo.id.in_(mover)).update(
+        {
+            Processo.municipio_atual_id: mid,
+            Processo.orgao_atual_id: oid,
+            Processo.unidade_atual_id: uid,
+            Processo.status: "Em tramitação",
+            Processo.lido_at: None,
+            Processo.atribuido_to_id: None,
+            Processo.ultima_tramitacao_at: agora,
+            Processo.qtd_tramites: Processo.qtd_tramites + 1,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    registrar_log(
+        db,
+        usuario=user,
+        acao=f"Tramitou {len(mover)} processo(s) em lote para a unidade {uid}",
+        ip=request.client.host,
+    )
+    # Processos que estavam na unidade de origem continuam na caixa dela: só "contadores"
+    saiu = [pid for pid in mover if na_caixa[pid].unidade_atual_id != na_caixa[pid].unidade_origem_id]
+    _publicar_por_unidade(na_caixa, saiu, "processo_saiu")
+    eventos_caixa.publicar([uid], "processo_chegou", processo_ids=mover)
+    eventos_caixa.publicar(
+        [na_caixa[pid].unidade_origem_id for pid in mover], "contadores", processo_ids=mover
+    )
+    for pid in mover:
+        agendar_pdf_processo(pid)
+    return JSONResponse({
+        "ok": True,
+        "message": f"{len(mover)} processo(s) tramitado(s) com sucesso",
+        "tramitados": len(mover),
+        "ignorados": len(ids) - len(mover),
+    })
+
+
+@router.post("/processos/lote/arquivar")
+async def processos_arquivar_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Arquiva os processos selecionados com um único UPDATE (os já arquivados são ignorados)."""
+    lote = await _ler_lote(request, db, user)
+    if isinstance(lote, JSONResponse):
+        return lote
+    u, _, ids = lote
+    na_caixa = _processos_da_caixa(db, u, ids)
+    fora = [pid for pid in ids if pid not in na_caixa]
+    if fora:
+        db.rollback()
+        return JSONResponse(
+            {"error": f"{len(fora)} processo(s) selecionado(s) não estão na caixa da sua unidade"},
+            status_code=403,
+        )
+    arquivar = [pid for pid in ids if not na_caixa[pid].arquivado]
+    if arquivar:
+        db.query(Processo).filter(Processo.id.in_(arquivar)).update(
+            {
+                Processo.arquivado: True,
+                Processo.arquivado_at: datetime.utcnow(),
+                Processo.arquivado_por_id: u.id,
+            },
+            synchronize_session=False,
+        )
+    db.commit()
+    if arquivar:
+        registrar_log(
+            db,
+            usuario=user,
+            acao=f"Arquivou {len(arquivar)} processo(s) em lote",
+            ip=request.client.host,
         )
-        story.append(titulo_tram)
-        story.append(Spacer(1, 8))
-
-        cab_tram = [
-            ("Origem", proc_orig),
-            ("Destino", proc_dest),
-            ("Data/Hora", data_tram),
-            ("Por", por_tram),
-        ]
-        story.append(_quadro_cabecalho(cab_tram, styles))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph("<b>Despacho</b>", normal))
-        story.append(Spacer(1, 4))
-        despacho_texto = _html_para_texto(tram.despacho or "-")
-        story.append(_quadro_conteudo(despacho_texto, styles))
-
-        # Assinatura da tramitação (quem tramitou)
-        usuario_tram = tram.usuario
-        nome_tram = usuario_tram.nome if usuario_tram else "-"
-        cargo_tram = "-"
-        if usuario_tram:
-            if usuario_tram.unidade:
-                cargo_tram = usuario_tram.unidade.nome or (usuario_tram.orgao.nome if usuario_tram.orgao else "-")
-            elif usuario_tram.orgao:
-                cargo_tram = usuario_tram.orgao.nome
-        data_tram_sig = tram.created_at.strftime("%d/%m/%Y %H:%M:%S") if tram.created_at else ""
-        story.extend(_bloco_assinatura(nome_tram, cargo_tram, data_tram_sig, styles))
-
-    doc.build(story)
-    return buffer.getvalue()
+        _publicar_por_unidade(na_caixa, arquivar, "processo_saiu", origem=True)
+    return JSONResponse({
+        "ok": True,
+        "message": f"{len(arquivar)} processo(s) arquivado(s) com sucesso",
+        "arquivados": len(arquivar),
+        "ignorados": len(ids) - len(arquivar),
+    })
 
 
 @router.get("/processos/{processo_id:int}/pdf")
 def processo_pdf(
+    request: Request,
     processo_id: int,
     download: int = Query(0, description="1 para download"),
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
 ):
-    """Retorna o processo em PDF (visualizar no navegador ou download)."""
+    """Retorna o processo em PDF (visualizar no navegador ou download), a partir do cache em disco."""
     if not user:
         return RedirectResponse("/login")
-    processo = (
-        db.query(Processo)
-        .options(
-            joinedload(Processo.creator).options(
-                joinedload(User.orgao),
-                joinedload(User.unidade),
-            ),
-            joinedload(Processo.orgao_origem), joinedload(Processo.unidade_origem),
-            joinedload(Processo.orgao_atual), joinedload(Processo.unidade_atual),
-            joinedload(Processo.tramites).options(
-                joinedload(Tramite.usuario).options(
-                    joinedload(User.orgao),
-                    joinedload(User.unidade),
-                ),
-                joinedload(Tramite.orgao_origem),
-                joinedload(Tramite.unidade_origem),
-                joinedload(Tramite.orgao_destino),
-                joinedload(Tramite.unidade_destino),
-            ),
+    try:
+        pdf = pdf_processo(db, processo_id)
+    except RenderizacaoIndisponivel:
+        return alert_back("Não foi possível gerar o PDF agora. Tente novamente em instantes.", status_code=503)
+    if not pdf:
+        return RedirectResponse("/eprotocolo/processos/caixa", status_code=303)
+    # Marcar como lido ao abrir ou baixar o PDF: só na primeira leitura e nunca em
+    # revalidações (If-None-Match) ou pedidos parciais (Range) dos visualizadores
+    cabecalhos = request.headers
+    if not any(h in cabecalhos for h in ("if-none-match", "if-range", "range")):
+        marcados = (
+            db.query(Processo)
+            .filter(Processo.id == processo_id, Processo.lido_at == None)
+            .update({Processo.lido_at: datetime.utcnow()}, synchronize_session=False)
         )
-        .filter(Processo.id == processo_id)
-        .first()
+        if marcados:
+            db.commit()
+    filename = f"processo_{pdf.numero.replace('/', '_')}.pdf"
+    return cached_file_response(
+        request, pdf.caminho, pdf.etag, "application/pdf",
+        filename=filename if download else None,
     )
-    if not processo:
-        return RedirectResponse("/eprotocolo/processos/caixa", status_code=303)
-    # Marcar como lido ao imprimir ou baixar PDF
-    processo.lido_at = datetime.utcnow()
-    db.commit()
-    tramites = sorted(processo.tramites, key=lambda t: t.created_at or datetime.min)
-    pdf_bytes = _gerar_pdf_processo(processo, tramites)
-    filename = f"processo_{processo.numero.replace('/', '_')}.pdf"
-    headers = {}
-    if download:
-        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+def _filtrar_consulta(q, numero, ano, status, nome, assunto, orgao_id, unidade_id, data_de, data_ate):
+    """Aplica os filtros da Consulta de Processos (também usados na exportação em ZIP)."""
+    if numero:
+        q = q.filter(Processo.numero.ilike(f"%{numero}%"))
+    if ano:
+        try:
+            q = q.filter(Processo.ano == int(ano))
+        except ValueError:
+            pass
+    if status:
+        q = q.filter(Processo.status == status)
+    if nome:
+        q = q.filter(Processo.requerente.ilike(f"%{nome}%"))
+    if assunto:
+        q = q.filter(Processo.assunto.ilike(f"%{assunto}%"))
+    if orgao_id:
+        try:
+            q = q.filter(Processo.orgao_origem_id == int(orgao_id))
+        except ValueError:
+            pass
+    if unidade_id:
+        try:
+            q = q.filter(Processo.unidade_origem_id == int(unidade_id))
+        except ValueError:
+            pass
+    if data_de:
+        try:
+            dt = datetime.strptime(data_de, "%d/%m/%Y")
+            q = q.filter(Processo.created_at >= dt)
+        except ValueError:
+            pass
+    if data_ate:
+        try:
+            dt = datetime.strptime(data_ate, "%d/%m/%Y")
+            dt = dt.replace(hour=23, minute=59, second=59)
+            q = q.filter(Processo.created_at <= dt)
+        except ValueError:
+            pass
+    return q
 
 
 @router.get("/processos/consulta")
@@ -786,10 +1061,8 @@ def processos_consulta(
         return RedirectResponse("/login")
 
     # Cascata Estado -> Município -> Órgão -> Unidade (igual à tela de criação)
-    estados = db.query(Estado).order_by(Estado.nome).all()
-    municipios = []
-    orgaos = []
-    unidades = []
+    h = get_hierarquia(db)
+    estados = h.estados
 
     eid = int(estado_id) if estado_id and estado_id.isdigit() else None
     mid = int(municipio_id) if municipio_id and municipio_id.isdigit() else None
@@ -797,59 +1070,20 @@ def processos_consulta(
 
     # Se orgao_id veio na URL, carregar estado/município para preencher cascata
     if oid and not (eid and mid):
-        orgao = db.query(Orgao).filter(Orgao.id == oid).first()
-        if orgao and orgao.municipio:
-            mid = orgao.municipio_id
-            eid = orgao.municipio.estado_id
-
-    if eid:
-        municipios = db.query(Municipio).filter(Municipio.estado_id == eid, Municipio.ativo == True).order_by(Municipio.nome).all()
-    if mid:
-        orgaos = db.query(Orgao).filter(Orgao.municipio_id == mid, Orgao.ativo == True).order_by(Orgao.nome).all()
-    if oid:
-        unidades = db.query(Unidade).filter(Unidade.orgao_id == oid, Unidade.ativo == True).order_by(Unidade.nome).all()
+        caminho = resolver_caminho(h, orgao_id=oid)
+        if caminho["municipio_id"]:
+            mid = caminho["municipio_id"]
+            eid = caminho["estado_id"]
+
+    municipios = h.municipios_do_estado.get(eid, []) if eid else []
+    orgaos = h.orgaos_do_municipio.get(mid, []) if mid else []
+    unidades = h.unidades_do_orgao.get(oid, []) if oid else []
 
     # Processos (busca em qualquer município quando filtro por órgão/unidade)
     tem_filtro = any([numero, ano, status, nome, assunto, orgao_id, unidade_id, data_de, data_ate])
-    q = db.query(Processo)
-    if numero:
-        q = q.filter(Processo.numero.ilike(f"%{numero}%"))
-    if ano:
-        try:
-            q = q.filter(Processo.ano == int(ano))
-        except ValueError:
-            pass
-    if status:
-        q = q.filter(Processo.status == status)
-    if nome:
-        q = q.filter(Processo.requerente.ilike(f"%{nome}%"))
-    if assunto:
-        q = q.filter(Processo.assunto.ilike(f"%{assunto}%"))
-    if orgao_id:
-        try:
-            q = q.filter(Processo.orgao_origem_id == int(orgao_id))
-        except ValueError:
-            pass
-    if unidade_id:
-        try:
-            q = q.filter(Processo.unidade_origem_id == int(unidade_id))
-        except ValueError:
-            pass
-    if data_de:
-        try:
-            from datetime import datetime
-            dt = datetime.strptime(data_de, "%d/%m/%Y")
-            q = q.filter(Processo.created_at >= dt)
-        except ValueError:
-            pass
-    if data_ate:
-        try:
-            from datetime import datetime
-            dt = datetime.strptime(data_ate, "%d/%m/%Y")
-            dt = dt.replace(hour=23, minute=59, second=59)
-            q = q.filter(Processo.created_at <= dt)
-        except ValueError:
-            pass
+    q = _filtrar_consulta(
+        db.query(Processo), numero, ano, status, nome, assunto, orgao_id, unidade_id, data_de, data_ate,
+    )
     if not tem_filtro:
         processos = []
         total = 0
@@ -892,16 +1126,94 @@ def processos_consulta(
     )
 
 
+@router.get("/processos/exportar.zip")
+def processos_exportar_zip(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+    ids: list[int] = Query(None),
+    token: str = Query(None, max_length=64),
+    numero: str = Query(None),
+    ano: str = Query(None),
+    status: str = Query(None),
+    nome: str = Query(None),
+    assunto: str = Query(None),
+    orgao_id: str = Query(None),
+    unidade_id: str = Query(None),
+    data_de: str = Query(None),
+    data_ate: str = Query(None),
+):
+    """
+    ZIP com o PDF de cada processo: dos `ids` informados ou do resultado da
+    consulta (mesmos filtros). O ZIP é enviado enquanto os PDFs são gerados;
+    o progresso fica em /processos/exportar/progresso/{token}.
+    """
+    if not user:
+        return RedirectResponse("/login")
+    if ids:
+        q = db.query(Processo.id).filter(Processo.id.in_(ids))
+    elif any([numero, ano, status, nome, assunto, orgao_id, unidade_id, data_de, data_ate]):
+        q = _filtrar_consulta(
+            db.query(Processo.id), numero, ano, status, nome, assunto, orgao_id, unidade_id, data_de, data_ate,
+        )
+    else:
+        return alert_back("Informe os critérios da consulta ou selecione os processos a exportar.")
+    selecionados = [
+        r[0] for r in q.order_by(Processo.created_at.desc()).limit(LIMITE_PROCESSOS + 1)
+    ]
+    if not selecionados:
+        return alert_back("Nenhum processo encontrado para exportar.", icon="info")
+    if len(selecionados) > LIMITE_PROCESSOS:
+        return alert_back(
+            f"A exportação está limitada a {LIMITE_PROCESSOS} processos. Refine os filtros da consulta."
+        )
+
+    registrar_log(
+        db,
+        usuario=user,
+        acao=f"Exportou PDFs de {len(selecionados)} processo(s) em ZIP",
+        ip=request.client.host,
+    )
+    filename = f"processos_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    return StreamingResponse(
+        gerar_zip(selecionados, token),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Total-Processos": str(len(selecionados)),
+        },
+    )
+
+
+@router.get("/processos/exportar/progresso/{token}")
+def processos_exportar_progresso(token: str, user: str = Depends(get_current_user)):
+    """Progresso da exportação em ZIP iniciada com `token` ({total, gerados, concluido, erro})."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    progresso = progresso_exportacao(token)
+    if progresso is None:
+        return JSONResponse({"error": "Exportação não encontrada"}, status_code=404)
+    return JSONResponse(progresso)
+
+
 @router.get("/processos/historico")
 def processos_historico(
     request: Request,
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
     pesquisa: str = Query("", alias="pesquisa"),
-    pagina: int = Query(1, ge=1),
+    pagina: int = Query(None, ge=1),
     por_pagina: int = Query(10, ge=5, le=100),
+    ordem: str = Query("atualizacao", pattern="^(atualizacao|criacao)$"),
+    parado_dias: int = Query(None, ge=1, le=3650),
+    apos: str = Query(None),
+    antes: str = Query(None),
+    ultima: bool = Query(False),
 ):
-    """Histórico da Unidade: lista processos da unidade do usuário com paginação e busca."""
+    """
+    Histórico da Unidade: lista processos da unidade do usuário com paginação e busca,
+    por última atividade (ou criação) e, opcionalmente, só os parados há `parado_dias` dias.
+    """
     if not user:
         return RedirectResponse("/login")
     u = db.query(User).filter(User.email == user).first()
@@ -919,29 +1231,28 @@ def processos_historico(
                 Processo.numero.ilike(termo),
                 Processo.assunto.ilike(termo),
                 Processo.requerente.ilike(termo),
+                Processo.texto_anexos.ilike(termo),  # texto extraído dos anexos
             )
         )
-    total = q.count()
-    offset = (pagina - 1) * por_pagina
-    processos = (
+    if parado_dias:
+        limite = datetime.utcnow() - timedelta(days=parado_dias)
+        q = q.filter(Processo.ultima_atividade_at < limite)
+    total, exato = contar_limitado(q)
+    chave = Processo.created_at if ordem == "criacao" else Processo.ultima_atividade_at
+    pag = paginar(
         q.options(
             joinedload(Processo.orgao_origem),
             joinedload(Processo.unidade_origem),
-            joinedload(Processo.tramites),
-        )
-        .order_by(Processo.created_at.desc())
-        .offset(offset)
-        .limit(por_pagina)
-        .all()
+        ),
+        chave, Processo.id, por_pagina,
+        pagina=pagina, apos=apos, antes=antes, ultima=ultima, total=total if exato else None,
     )
+    processos = pag.itens
+    nav = navegacao(pag, total, exato, {
+        "pesquisa": pesquisa, "por_pagina": por_pagina, "ordem": ordem, "parado_dias": parado_dias,
+    })
     # Data de atualização: última tramitação ou criação
-    def ultima_atualizacao(p):
-        if p.tramites:
-            ult = max(p.tramites, key=lambda t: t.created_at or datetime.min)
-            return ult.created_at
-        return p.created_at
-
-    processos_com_data = [(p, ultima_atualizacao(p)) for p in processos]
+    processos_com_data = [(p, p.ultima_atividade_at) for p in processos]
     return templates.TemplateResponse(
         "eprotocolo/processos/historico.html",
         {
@@ -949,11 +1260,13 @@ def processos_historico(
             "user": user,
             "processos": processos,
             "processos_com_data": processos_com_data,
-            "total": total,
-            "pagina": pagina,
+            "total": nav["total"],
+            "pagina": pag.numero,
             "por_pagina": por_pagina,
+            "nav": nav,
             "pesquisa": pesquisa or "",
-            "ultima_pagina": ((total + por_pagina - 1) // por_pagina) if total else 1,
+            "ordem": ordem,
+            "parado_dias": parado_dias,
         },
     )
 
@@ -979,7 +1292,9 @@ async def processo_arquivar(
     processo.arquivado = True
     processo.arquivado_at = datetime.utcnow()
     processo.arquivado_por_id = u.id
+    unidades = [processo.unidade_atual_id, processo.unidade_origem_id]
     db.commit()
+    eventos_caixa.publicar(unidades, "processo_saiu", processo_ids=[processo_id])
     return RedirectResponse(str(redirect_to), status_code=303)
 
 
@@ -1001,7 +1316,9 @@ async def processo_desarquivar(
     processo.arquivado = False
     processo.arquivado_at = None
     processo.arquivado_por_id = None
+    unidades = [processo.unidade_atual_id, processo.unidade_origem_id]
     db.commit()
+    eventos_caixa.publicar(unidades, "processo_chegou", processo_ids=[processo_id])
     return RedirectResponse(str(redirect_to), status_code=303)
 
 
@@ -1011,8 +1328,11 @@ def processos_arquivados(
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
     pesquisa: str = Query("", alias="pesquisa"),
-    pagina: int = Query(1, ge=1),
+    pagina: int = Query(None, ge=1),
     por_pagina: int = Query(10, ge=5, le=100),
+    apos: str = Query(None),
+    antes: str = Query(None),
+    ultima: bool = Query(False),
 ):
     """Processos Arquivados: lista processos arquivados da unidade do usuário com paginação e busca."""
     if not user:
@@ -1032,32 +1352,23 @@ def processos_arquivados(
                 Processo.numero.ilike(termo),
                 Processo.assunto.ilike(termo),
                 Processo.requerente.ilike(termo),
+                Processo.texto_anexos.ilike(termo),  # texto extraído dos anexos
             )
         )
-    total = q.count()
-    offset = (pagina - 1) * por_pagina
-    processos = (
+    total, exato = contar_limitado(q)
+    pag = paginar(
         q.options(
             joinedload(Processo.orgao_origem),
             joinedload(Processo.unidade_origem),
-            joinedload(Processo.tramites),
             joinedload(Processo.arquivado_por),
-        )
-        .order_by(Processo.arquivado_at.desc(), Processo.created_at.desc())
-        .offset(offset)
-        .limit(por_pagina)
-        .all()
+        ),
+        func.coalesce(Processo.arquivado_at, Processo.created_at), Processo.id, por_pagina,
+        pagina=pagina, apos=apos, antes=antes, ultima=ultima, total=total if exato else None,
     )
+    processos = pag.itens
+    nav = navegacao(pag, total, exato, {"pesquisa": pesquisa, "por_pagina": por_pagina})
     # Data de atualização: arquivado_at ou última tramitação ou criação
-    def data_atualizacao(p):
-        if p.arquivado_at:
-            return p.arquivado_at
-        if p.tramites:
-            ult = max(p.tramites, key=lambda t: t.created_at or datetime.min)
-            return ult.created_at
-        return p.created_at
-
-    processos_com_data = [(p, data_atualizacao(p)) for p in processos]
+    processos_com_data = [(p, p.arquivado_at or p.ultima_atividade_at) for p in processos]
     return templates.TemplateResponse(
         "eprotocolo/processos/arquivados.html",
         {
@@ -1066,11 +1377,11 @@ def processos_arquivados(
             "user_obj": u,
             "processos": processos,
             "processos_com_data": processos_com_data,
-            "total": total,
-            "pagina": pagina,
+            "total": nav["total"],
+            "pagina": pag.numero,
             "por_pagina": por_pagina,
+            "nav": nav,
             "pesquisa": pesquisa or "",
-            "ultima_pagina": ((total + por_pagina - 1) // por_pagina) if total else 1,
         },
     )
 
@@ -1333,6 +1644,7 @@ async def grupo_cadastrar_post(
     g = Grupo(nome=nome.strip(), ativo=True)
     db.add(g)
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/grupos", status_code=303)
 
 
@@ -1368,6 +1680,7 @@ async def grupo_editar_post(
         return RedirectResponse("/eprotocolo/administracao/grupos", status_code=303)
     grupo.nome = nome.strip()
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/grupos", status_code=303)
 
 
@@ -1428,6 +1741,7 @@ async def assunto_cadastrar_post(
     a = Assunto(grupo_id=grupo_id, nome=nome.strip(), ativo=True)
     db.add(a)
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/assuntos", status_code=303)
 
 
@@ -1466,6 +1780,7 @@ async def assunto_editar_post(
     assunto.grupo_id = grupo_id
     assunto.nome = nome.strip()
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/assuntos", status_code=303)
 
 
@@ -1538,6 +1853,7 @@ async def subassunto_cadastrar_post(
     s = Subassunto(assunto_id=assunto_id, nome=nome.strip(), ativo=True)
     db.add(s)
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/subassuntos", status_code=303)
 
 
@@ -1577,6 +1893,7 @@ async def subassunto_editar_post(
     subassunto.assunto_id = assunto_id
     subassunto.nome = nome.strip()
     db.commit()
+    invalidate_indice_categorias()
     return RedirectResponse("/eprotocolo/administracao/subassuntos", status_code=303)
 
 
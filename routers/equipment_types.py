@@ -4,8 +4,9 @@ from starlette.status import HTTP_302_FOUND
 from sqlalchemy.orm import Session, joinedload
 from database import get_db
 from dependencies import get_current_user, registrar_log
-from models import EquipmentType, Category
+from models import EquipmentType
 from templating import templates
+from services.reference_data import get_reference_data, invalidate_reference_data
 
 # Cria o roteador para Tipos de Equipamentos
 router = APIRouter(prefix="/equipment-types", tags=["Equipment Types"])
@@ -51,7 +52,7 @@ def add_equipment_type_form(request: Request, db: Session = Depends(get_db), use
     if not user:
         return RedirectResponse("/login")
 
-    categories = db.query(Category).order_by(Category.nome).all()
+    categories = get_reference_data(db).categorias
 
     return templates.TemplateResponse(
         "equipment_type_add.html",
@@ -89,6 +90,7 @@ def add_equipment_type(
     db.add(novo_tipo)
     db.commit()
     db.refresh(novo_tipo)
+    invalidate_reference_data()
 
     registrar_log(db, usuario=user, acao=f"Cadastrou tipo de equipamento: {nome}", ip=ip)
     return RedirectResponse("/equipment-types", status_code=HTTP_302_FOUND)
@@ -111,7 +113,7 @@ def edit_equipment_type_form(
         return RedirectResponse("/login")
 
     tipo = db.query(EquipmentType).filter(EquipmentType.id == type_id).first()
-    categories = db.query(Category).order_by(Category.nome).all()
+    categories = get_reference_data(db).categorias
 
     return templates.TemplateResponse(
         "equipment_type_add.html",
@@ -143,6 +145,7 @@ def edit_equipment_type(
         tipo.nome = nome
         tipo.category_id = category_id
         db.commit()
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Editou tipo de equipamento ID {type_id}", ip=ip)
 
     return RedirectResponse("/equipment-types", status_code=HTTP_302_FOUND)
@@ -195,6 +198,7 @@ def delete_equipment_type(
     if tipo:
         db.delete(tipo)
         db.commit()
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Excluiu tipo de equipamento ID {type_id}", ip=ip)
 
     return RedirectResponse("/equipment-types", status_code=HTTP_302_FOUND)
@@ -4,19 +4,18 @@ import io
 
 import pytz
 from fastapi import APIRouter, Request, Depends
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from openpyxl import Workbook
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from database import get_db
 from dependencies import get_current_user
 from models import Log
+from services.pdf_documentos import documento_logs
+from services.pdf_render import RenderizacaoIndisponivel, renderizar
 from templating import templates
+from ui_alerts import alert_back
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
@@ -148,32 +147,12 @@ def export_logs_pdf(db: Session = Depends(get_db), user: str = Depends(get_curre
         return RedirectResponse("/login")
 
     data = _export_rows(db)
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph("Auditoria do Sistema — SIGEIN", styles["Title"]))
-    elements.append(Paragraph(f"Exportado por: {user}", styles["Normal"]))
-    elements.append(Paragraph("<br/>", styles["Normal"]))
-
-    table = Table(data, colWidths=[110, 90, 70, 70, 200])
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e8eef5")),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 9),
-                ("FONTSIZE", (0, 1), (-1, -1), 8),
-                ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ]
-        )
-    )
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    return StreamingResponse(
-        buffer,
+    try:
+        pdf_bytes = renderizar(documento_logs, {"usuario": user, "linhas": data})
+    except RenderizacaoIndisponivel:
+        return alert_back("Não foi possível gerar o PDF agora. Tente novamente em instantes.", status_code=503)
+    return Response(
+        content=pdf_bytes,
         media_type="application/pdf",
         headers={"Content-Disposition": "attachment; filename=auditoria_sigen.pdf"},
     )
@@ -1,11 +1,22 @@
 ﻿from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi import APIRouter, Request, Form, Depends, Query
 from urllib.parse import quote
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, undefer
+from sqlalchemy import func, or_, exists
 from models import Product, Unit, Category, Movement, User, Stock, Item, Unidade
 from services.stock_service import StockService
-from services.movement_form_data import build_movement_form_context
+from services.movement_form_data import (
+    build_movement_form_context,
+    build_movement_products_skeleton,
+    build_unit_options,
+)
+from http_cache import cached_json_response
+from services.item_search import (
+    LIMITE_CODIGOS_LOTE,
+    buscar_itens,
+    resolver_codigos,
+    separar_codigos,
+)
 from database import get_db
 from datetime import datetime
 from dependencies import get_current_user, registrar_log
@@ -72,6 +83,7 @@ def _movement_detail_query(db: Session, movement_id: int):
     return (
         db.query(Movement)
         .options(
+            undefer(Movement.observacao),
             joinedload(Movement.user),
             joinedload(Movement.product).joinedload(Product.type),
             joinedload(Movement.product).joinedload(Product.brand),
@@ -219,7 +231,6 @@ def nova_movimentacao_form(
             "request": request,
             "movimento": {},
             "prefill": prefill,
-            "products": ctx["products"],
             "movement_units": ctx["units"],
             "movement_categories": ctx["categories"],
             "user": user,
@@ -395,7 +406,9 @@ def editar_movimentacao_form(
     if not user:
         return RedirectResponse("/login")
 
-    movimento = db.query(Movement).filter(Movement.id == movement_id).first()
+    movimento = (
+        db.query(Movement).options(undefer(Movement.observacao)).filter(Movement.id == movement_id).first()
+    )
     if not movimento:
         return {"error": "Movimentação não encontrada"}
 
@@ -431,7 +444,6 @@ def editar_movimentacao_form(
             "request": request,
             "movimento": movimento_dict,
             "prefill": {},
-            "products": ctx["products"],
             "movement_units": ctx["units"],
             "movement_categories": ctx["categories"],
             "user": user,
@@ -542,6 +554,34 @@ def delete_movement(movement_id: int, db: Session = Depends(get_db), user: str =
 # -------------------------------
 # API AUXILIARES
 # -------------------------------
+@router.get("/form-data")
+def movement_form_data(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Esqueleto produto/tipo/categoria do formulário, com ETag por conteúdo."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+
+    payload = build_movement_products_skeleton(db)
+    return cached_json_response(request, payload, payload["versao"])
+
+
+@router.get("/unidades-origem/{type_id}")
+def movement_unit_options(
+    type_id: int,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Unidades de origem do tipo selecionado (itens físicos ou saldo em estoque)."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+
+    return build_unit_options(db, type_id, product_id)
+
+
 @router.get("/movements/stock/type/{type_id}")
 def get_product_stock(type_id: int, db: Session = Depends(get_db)):
     result = []
@@ -589,95 +629,172 @@ def get_product_stock(type_id: int, db: Session = Depends(get_db)):
     return result
 
 
+def _item_option(row) -> dict:
+    item_id, product_id, tombo, num, unit_id, unit_name, product_name = row
+    return {
+        "id": item_id,
+        "product_id": product_id,
+        "tombo": tombo,
+        "num": num if num else f"Produto sem série - {product_name}",
+        "unit_id": unit_id,
+        "unit_name": unit_name,
+    }
+
+
+def _stock_option(row) -> dict:
+    product_id, product_name, quantidade, unit_id, unit_name = row
+    return {
+        "id": None,
+        "product_id": product_id,
+        "tombo": False,
+        "num": f"{product_name} (estoque: {quantidade})",
+        "unit_id": unit_id,
+        "unit_name": unit_name,
+    }
+
+
+# Declarada antes de /items/{type_id} para não ser capturada por ela
+@router.get("/items/search")
+def search_items(
+    product_id: Optional[int] = None,
+    tipo: Optional[str] = None,
+    q: str = "",
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+
+    is_tombo = None
+    if tipo:
+        is_tombo = tipo.upper() == "TOMBO"
+
+    return [
+        {
+            "id": i["id"],
+            "text": i["num"],
+            "unit_id": i["unit_id"],
+            "unit_name": i["unit_name"],
+        }
+        for i in buscar_itens(db, q, product_id=product_id, is_tombo=is_tombo)
+    ]
+
+
+@router.post("/items/lookup")
+def lookup_items(
+    codigos: str = Form(""),
+    tipo: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """
+    Resolução em lote para leitor de código de barras: `codigos` separados por
+    linha, vírgula ou ponto e vírgula (até LIMITE_CODIGOS_LOTE por chamada).
+    """
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+
+    lista = separar_codigos(codigos)
+    if len(lista) > LIMITE_CODIGOS_LOTE:
+        return JSONResponse(
+            {"error": f"Envie no máximo {LIMITE_CODIGOS_LOTE} códigos por vez."},
+            status_code=400,
+        )
+
+    is_tombo = None
+    if tipo:
+        is_tombo = tipo.upper() == "TOMBO"
+
+    encontrados, nao_encontrados = resolver_codigos(db, lista, is_tombo=is_tombo)
+    return {"encontrados": encontrados, "nao_encontrados": nao_encontrados}
+
+
 @router.get("/items/{type_id}")
 def get_product_items(
     type_id: int,
     product_id: Optional[int] = None,
     unit_id: Optional[int] = None,
+    q: Optional[str] = None,
+    pagina: Optional[int] = Query(None, ge=1),
+    por_pagina: int = Query(100, ge=10, le=500),
     db: Session = Depends(get_db),
 ):
-    items_result = []
+    """
+    Opções do select de itens: itens físicos do tipo e, para produtos sem série
+    ainda sem Item cadastrado, o saldo em estoque. Sempre duas consultas
+    (mais duas contagens quando paginado), independente do número de produtos.
+    Sem `pagina` devolve a lista completa; com `pagina` devolve
+    {items, total, pagina, por_pagina, ultima_pagina}.
+    """
+    termo = (q or "").strip()
 
     # 1️⃣ Itens físicos já cadastrados (controla por série ou não)
-    q = (
-        db.query(Item)
-        .join(Product)
+    itens_q = (
+        db.query(
+            Item.id,
+            Item.product_id,
+            Item.tombo,
+            Item.num_tombo_ou_serie,
+            Item.unit_id,
+            Unidade.nome,
+            Product.name,
+        )
+        .join(Product, Product.id == Item.product_id)
         .join(Unidade, Item.unit_id == Unidade.id)  # Só itens cuja unidade existe
         .filter(Product.type_id == type_id)
     )
     if product_id:
-        q = q.filter(Item.product_id == product_id)
+        itens_q = itens_q.filter(Item.product_id == product_id)
     if unit_id:
-        q = q.filter(Item.unit_id == unit_id)
-    items = q.all()
-
-    for i in items:
-        label = i.num_tombo_ou_serie if i.num_tombo_ou_serie else f"Produto sem série - {i.product.name}"
-        items_result.append({
-            "id": i.id,
-            "product_id": i.product_id,
-            "tombo": i.tombo,
-            "num": label,
-            "unit_id": i.unit_id,
-            "unit_name": i.unit.nome if i.unit else None,
-        })
+        itens_q = itens_q.filter(Item.unit_id == unit_id)
+    if termo:
+        like = f"%{termo}%"
+        itens_q = itens_q.filter(or_(Item.num_tombo_ou_serie.ilike(like), Product.name.ilike(like)))
+    itens_q = itens_q.order_by(Item.num_tombo_ou_serie, Item.id)
 
     # 2️⃣ Produtos sem série com estoque na unidade e sem Item cadastrado
-    products_sem_serie = (
-        db.query(Product)
-        .filter(Product.type_id == type_id, Product.controla_por_serie == False)
-        .all()
-    )
-
-    for p in products_sem_serie:
-        item_exists = db.query(Item).filter(Item.product_id == p.id).first()
-        if item_exists:
-            continue
-        stocks_q = db.query(Stock).filter(
-            Stock.product_id == p.id,
-            Stock.quantidade > 0,
-        )
-        if unit_id:
-            stocks_q = stocks_q.filter(Stock.unit_id == unit_id)
-        for s in stocks_q.all():
-            items_result.append({
-                "id": None,
-                "product_id": p.id,
-                "tombo": False,
-                "num": f"{p.name} (estoque: {s.quantidade})",
-                "unit_id": s.unit_id,
-                "unit_name": s.unit.nome if s.unit else None,
-            })
-
-    return items_result
-
-
-@router.get("/items/search")
-def search_items(
-    product_id: int,
-    tipo: str,
-    q: str = "",
-    db: Session = Depends(get_db)
-):
-    is_tombo = tipo.upper() == "TOMBO"
-
-    items = (
-        db.query(Item)
+    estoque_q = (
+        db.query(Stock.product_id, Product.name, Stock.quantidade, Stock.unit_id, Unidade.nome)
+        .join(Product, Product.id == Stock.product_id)
+        .outerjoin(Unidade, Unidade.id == Stock.unit_id)
         .filter(
-            Item.product_id == product_id,
-            Item.tombo == is_tombo,
-            Item.num_tombo_ou_serie.ilike(f"%{q}%")
+            Product.type_id == type_id,
+            Product.controla_por_serie == False,
+            Stock.quantidade > 0,
+            ~exists().where(Item.product_id == Product.id),
         )
-        .limit(20)
-        .all()
     )
+    if unit_id:
+        estoque_q = estoque_q.filter(Stock.unit_id == unit_id)
+    if termo:
+        estoque_q = estoque_q.filter(Product.name.ilike(f"%{termo}%"))
+    estoque_q = estoque_q.order_by(Product.name, Stock.id)
+
+    if pagina is None:
+        return [_item_option(r) for r in itens_q.all()] + [_stock_option(r) for r in estoque_q.all()]
+
+    # Paginação sobre a concatenação itens + estoque
+    total_itens = itens_q.order_by(None).count()
+    total = total_itens + estoque_q.order_by(None).count()
+    ultima_pagina = max(1, (total + por_pagina - 1) // por_pagina)
+    pagina = min(pagina, ultima_pagina)
+    inicio = (pagina - 1) * por_pagina
+    fim = inicio + por_pagina
+
+    resultado = []
+    if inicio < total_itens:
+        resultado += [_item_option(r) for r in itens_q.offset(inicio).limit(por_pagina).all()]
+    if fim > total_itens:
+        offset_estoque = max(0, inicio - total_itens)
+        resultado += [
+            _stock_option(r)
+            for r in estoque_q.offset(offset_estoque).limit(por_pagina - len(resultado)).all()
+        ]
 
-    return [
-        {
-            "id": i.id,
-            "text": i.num_tombo_ou_serie,
-            "unit_id": i.unit_id,
-            "unit_name": i.unit.nome
-        }
-        for i in items
-    ]
+    return {
+        "items": resultado,
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "ultima_pagina": ultima_pagina,
+    }
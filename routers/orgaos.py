@@ -7,6 +7,9 @@ from database import get_db
 from dependencies import get_current_user, registrar_log
 from models import User, Orgao, Municipio, Estado, PerfilEnum
 from templating import templates
+from services.escopo_organizacional import propagar_escopo_orgao
+from services.hierarquia_geografica import invalidate_hierarquia
+from services.processo_pdf import invalidar_pdfs_processos
 
 router = APIRouter(prefix="/orgaos", tags=["Órgãos"])
 
@@ -103,9 +106,11 @@ def add_orgao(
         municipio_id=municipio_id,
         ativo=ativo and ativo.lower() in ("true", "1", "on", "sim"),
     )
+    propagar_escopo_orgao(db, novo_orgao)
     db.add(novo_orgao)
     db.commit()
     db.refresh(novo_orgao)
+    invalidate_hierarquia()
 
     registrar_log(
         db,
@@ -168,6 +173,8 @@ def edit_orgao(
     ip = request.client.host
     orgao = db.query(Orgao).filter(Orgao.id == orgao_id).first()
     if orgao:
+        if (orgao.nome, orgao.sigla) != (nome, sigla or None):
+            invalidar_pdfs_processos(db)
         orgao.nome = nome
         orgao.sigla = sigla or None
         orgao.responsavel = responsavel or None
@@ -175,7 +182,9 @@ def edit_orgao(
         orgao.telefone = telefone or None
         orgao.municipio_id = municipio_id
         orgao.ativo = ativo and ativo.lower() in ("true", "1", "on", "sim")
+        propagar_escopo_orgao(db, orgao)
         db.commit()
+        invalidate_hierarquia()
         registrar_log(
             db,
             usuario=user,
@@ -232,7 +241,9 @@ def delete_orgao(
 
     nome_orgao = orgao.nome
     db.delete(orgao)
+    invalidar_pdfs_processos(db)
     db.commit()
+    invalidate_hierarquia()
 
     registrar_log(
         db,
@@ -1,21 +1,25 @@
+import json
 import re
 from typing import Optional
 
 from fastapi import APIRouter, Request, Form, Depends, Query
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
 from starlette.status import HTTP_302_FOUND
-from sqlalchemy import or_
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, insert, update, func
+from sqlalchemy.orm import Session, joinedload, undefer
 from sqlalchemy.exc import IntegrityError
 from database import get_db
 from dependencies import get_current_user, registrar_log
 from models import (
-    Product, EquipmentType, Brand, Category, EquipmentState,
-    Item, Movement, Stock, User, Unidade, Orgao, Municipio, Estado,
+    Product, EquipmentType, Brand,
+    Item, Movement, Stock, User, Unidade, Orgao, Municipio,
 )
 from templating import templates
 from ui_alerts import alert_back
+from http_cache import cached_json_response
 from services.stock_service import StockService
+from services.reference_data import get_reference_data
+from services.movement_form_data import invalidate_movement_products
 from datetime import datetime
 
 router = APIRouter(prefix="/products", tags=["Products"])
@@ -61,7 +65,7 @@ def _get_product_stocks(db: Session, product_id: int):
 
 
 def _primary_item(db: Session, product_id: int):
-    return db.query(Item).filter(Item.product_id == product_id).first()
+    return db.query(Item).options(undefer(Item.observacao)).filter(Item.product_id == product_id).first()
 
 
 def _primary_stock_row(stocks, item=None):
@@ -190,6 +194,7 @@ def view_product(
     product = (
         db.query(Product)
         .options(
+            undefer(Product.description),
             joinedload(Product.category),
             joinedload(Product.type),
             joinedload(Product.brand),
@@ -317,12 +322,13 @@ def add_product_form(request: Request, db: Session = Depends(get_db), user: str
             .all()
         )
 
+    ref = get_reference_data(db)
     # Estados geográficos (para Master escolher Estado/Município/Órgão/Unidade)
-    estados_geograficos = db.query(Estado).order_by(Estado.nome).all() if is_master else []
+    estados_geograficos = ref.estados if is_master else []
 
-    categorias = db.query(Category).order_by(Category.nome).all()
-    tipos = db.query(EquipmentType).all()
-    estados = db.query(EquipmentState).all()  # estado físico do item (equipment_states)
+    categorias = ref.categorias
+    tipos = ref.tipos
+    estados = ref.estados_fisicos  # estado físico do item (equipment_states)
 
     return templates.TemplateResponse(
         "product_form.html",
@@ -436,6 +442,52 @@ def _validar_numeros_itens(
     return None
 
 
+# Limite de itens por faixa sequencial (um lote de tombos por cadastro)
+_FAIXA_TOMBO_MAX = 10000
+
+
+def _gerar_faixa_tombos(inicio_raw: str, quantidade: int) -> tuple[list[str], str | None]:
+    """
+    Gera a faixa sequencial de tombos (formato 000.000) a partir do tombo inicial.
+    Retorna (numeros, erro).
+    """
+    inicio = _normalize_numero_item(True, inicio_raw)
+    if inicio is None:
+        return [], "Tombo inicial inválido. Use o formato 000.000 (6 dígitos)."
+    if quantidade < 1 or quantidade > _FAIXA_TOMBO_MAX:
+        return [], f"A quantidade da faixa deve estar entre 1 e {_FAIXA_TOMBO_MAX}."
+    primeiro = int(inicio.replace(".", ""))
+    ultimo = primeiro + quantidade - 1
+    if ultimo > 999999:
+        return [], "A faixa informada ultrapassa o tombo 999.999."
+    return [f"{n // 1000:03d}.{n % 1000:03d}" for n in range(primeiro, ultimo + 1)], None
+
+
+def _validar_faixa_tombos(db: Session, numeros: list[str]) -> str | None:
+    """
+    Verifica colisões da faixa com uma única consulta por intervalo.
+    O formato fixo 000.000 permite comparar os tombos como texto (BETWEEN).
+    """
+    if not numeros:
+        return "Informe o tombo inicial e a quantidade da faixa."
+    faixa = set(numeros)
+    em_uso = sorted(
+        row[0]
+        for row in (
+            db.query(Item.num_tombo_ou_serie)
+            .filter(Item.num_tombo_ou_serie.between(numeros[0], numeros[-1]))
+            .all()
+        )
+        if row[0] in faixa
+    )
+    if not em_uso:
+        return None
+    exibidos = ", ".join(em_uso[:10])
+    if len(em_uso) > 10:
+        exibidos += f" e mais {len(em_uso) - 10}"
+    return f"A faixa contém tombos já cadastrados: {exibidos}."
+
+
 # ----------------- ADD PRODUCT -----------------
 @router.post("/add")
 async def add_product(
@@ -452,6 +504,12 @@ async def add_product(
     tipo_numero = form_data.getlist("tipo_numero[]") or form_data.getlist("tipo_numero")
     estado_id_list = form_data.getlist("estado_id[]")
     status_list = form_data.getlist("status[]")
+    # Modo faixa: tombo inicial + quantidade, com atributos compartilhados por todos os itens
+    modo_faixa = form_data.get("modo_numero") == "faixa"
+    tombo_inicial = form_data.get("tombo_inicial") or ""
+    quantidade_faixa = _parse_int(form_data.get("quantidade_faixa"), 0) or 0
+    estado_id_faixa = _parse_int(form_data.get("estado_id_faixa"))
+    status_faixa = form_data.get("status_faixa") or "Disponível"
 
     category_id = _parse_int(form_data.get("category_id"))
     type_id = _parse_int(form_data.get("type_id")) or 0
@@ -502,7 +560,14 @@ async def add_product(
     municipio_id = unidade.orgao.municipio_id
     orgao_id = unidade.orgao_id
 
-    if controla_por_serie:
+    numeros_faixa: list[str] = []
+    if controla_por_serie and modo_faixa:
+        numeros_faixa, err_num = _gerar_faixa_tombos(tombo_inicial, quantidade_faixa)
+        if not err_num:
+            err_num = _validar_faixa_tombos(db, numeros_faixa)
+        if err_num:
+            return alert_back(err_num)
+    elif controla_por_serie:
         pares_numero = _coletar_pares_numero(numero, tipo_numero)
         if not pares_numero:
             return alert_back("Informe ao menos um número de tombo ou de série.")
@@ -527,6 +592,7 @@ async def add_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    invalidate_movement_products()
 
     if controla_por_serie:
         items_criados = []
@@ -542,6 +608,40 @@ async def add_product(
                 garantia_dt = datetime.strptime(str(garantia_ate).strip(), "%Y-%m-%d").date()
             except (ValueError, TypeError):
                 pass
+        if numeros_faixa:
+            # Faixa sequencial: um INSERT para os itens e um INSERT ... SELECT para as entradas
+            db.execute(
+                insert(Item),
+                [
+                    {
+                        "product_id": product.id,
+                        "municipio_id": municipio_id,
+                        "orgao_id": orgao_id,
+                        "unit_id": unidade.id,
+                        "tombo": True,
+                        "num_tombo_ou_serie": num_norm,
+                        "estado_id": estado_id_faixa,
+                        "status": status_faixa,
+                        "data_aquisicao": data_aq,
+                        "valor_aquisicao": valor_aquisicao,
+                        "garantia_ate": garantia_dt,
+                        "observacao": observacao,
+                    }
+                    for num_norm in numeros_faixa
+                ],
+            )
+            StockService.registrar_entradas_cadastro_itens(db, product, user_obj.id, unidade.id)
+            db.commit()
+            registrar_log(
+                db,
+                usuario=user,
+                acao=(
+                    f"Cadastrou produto em faixa: {product.name} "
+                    f"({len(numeros_faixa)} itens, tombos {numeros_faixa[0]} a {numeros_faixa[-1]})"
+                ),
+                ip=request.client.host,
+            )
+            return RedirectResponse("/products", status_code=HTTP_302_FOUND)
         for i, num in enumerate(numero):
             num_str = (num if isinstance(num, str) else str(num or "")).strip()
             if not num_str:
@@ -644,6 +744,207 @@ async def add_product(
     return RedirectResponse("/products", status_code=HTTP_302_FOUND)
 
 
+# ----------------- ITENS (SUB-EDITOR PAGINADO) -----------------
+def _termos_busca_numero(q: str) -> list[str]:
+    """Termo digitado + variante formatada 000.000 quando o usuário digita só dígitos do tombo."""
+    termo = (q or "").strip()
+    if not termo:
+        return []
+    termos = [termo]
+    if termo.isdigit() and 3 < len(termo) <= 6:
+        termos.append(f"{termo[:3]}.{termo[3:]}")
+    return termos
+
+
+@router.get("/{product_id}/itens")
+def list_product_items(
+    product_id: int,
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(50, ge=10, le=200),
+    q: str = Query(""),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Página de itens (tombo/série) do produto para o sub-editor do formulário de edição."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+
+    query = db.query(Item).filter(Item.product_id == product_id)
+    termos = _termos_busca_numero(q)
+    if termos:
+        query = query.filter(or_(*[Item.num_tombo_ou_serie.ilike(f"%{t}%") for t in termos]))
+
+    total = query.count()
+    itens = (
+        query.order_by(Item.id)
+        .offset((pagina - 1) * por_pagina)
+        .limit(por_pagina)
+        .all()
+    )
+    return JSONResponse({
+        "items": [
+            {
+                "id": it.id,
+                "tipo": "tombo" if it.tombo else "serie",
+                "numero": it.num_tombo_ou_serie or "",
+                "estado_id": it.estado_id,
+                "status": it.status or "Disponível",
+            }
+            for it in itens
+        ],
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "ultima_pagina": ((total + por_pagina - 1) // por_pagina) if total else 1,
+    })
+
+
+def _ler_alteracoes_itens(raw) -> tuple[dict, str | None]:
+    """
+    Lê o JSON enviado pelo sub-editor: {"alterados": [...], "novos": [...], "removidos": [ids]}.
+    Cada linha alterada/nova traz tipo, numero, estado_id e status (alteradas também o id).
+    """
+    try:
+        dados = json.loads(raw or "{}")
+    except ValueError:
+        return {}, "Não foi possível ler as alterações dos itens. Recarregue a página e tente novamente."
+    if not isinstance(dados, dict):
+        dados = {}
+
+    removidos = {i for i in (_parse_int(v) for v in dados.get("removidos") or []) if i}
+    alterados = {}
+    for linha in dados.get("alterados") or []:
+        item_id = _parse_int((linha or {}).get("id"))
+        if item_id and item_id not in removidos:
+            alterados[item_id] = linha
+    novos = [linha for linha in dados.get("novos") or [] if isinstance(linha, dict)]
+    return {"alterados": alterados, "novos": novos, "removidos": removidos}, None
+
+
+def _linha_item(linha: dict) -> tuple[dict | None, str | None]:
+    is_tombo = str(linha.get("tipo") or "tombo").lower() == "tombo"
+    num = _normalize_numero_item(is_tombo, str(linha.get("numero") or ""))
+    if num is None:
+        if not str(linha.get("numero") or "").strip():
+            return None, "Informe o número de tombo ou de série em todas as linhas."
+        return None, "Número do tombo inválido. Use o formato 000.000 (6 dígitos)."
+    return {
+        "tombo": is_tombo,
+        "num_tombo_ou_serie": num,
+        "estado_id": _parse_int(linha.get("estado_id")),
+        "status": linha.get("status") or "Disponível",
+    }, None
+
+
+def _salvar_itens_diff(db: Session, product: Product, alteracoes: dict, comuns: dict) -> str | None:
+    """
+    Salva apenas as linhas alteradas do sub-editor, em instruções em lote:
+    DELETE dos removidos, UPDATE dos alterados, UPDATE dos campos comuns só onde diferem
+    e INSERT dos novos. Retorna mensagem de erro ou None.
+    """
+    removidos = alteracoes["removidos"]
+    alterados = alteracoes["alterados"]
+    ids_informados = removidos | set(alterados)
+
+    atuais = {}
+    if ids_informados:
+        atuais = {
+            row.id: row
+            for row in db.query(
+                Item.id, Item.tombo, Item.num_tombo_ou_serie, Item.estado_id, Item.status
+            ).filter(Item.product_id == product.id, Item.id.in_(ids_informados))
+        }
+        if len(atuais) != len(ids_informados):
+            return "Há itens informados que não pertencem a este produto. Recarregue a página."
+
+    updates = []
+    for item_id, linha in alterados.items():
+        dados, err = _linha_item(linha)
+        if err:
+            return err
+        atual = atuais[item_id]
+        if (
+            dados["tombo"] == bool(atual.tombo)
+            and dados["num_tombo_ou_serie"] == atual.num_tombo_ou_serie
+            and dados["estado_id"] == atual.estado_id
+            and dados["status"] == atual.status
+        ):
+            continue
+        updates.append({"id": item_id, **dados})
+
+    novos = []
+    for linha in alteracoes["novos"]:
+        dados, err = _linha_item(linha)
+        if err:
+            return err
+        novos.append(dados)
+
+    # Itens com movimentações não podem ser removidos (FK de movements)
+    if removidos and db.query(Movement.id).filter(Movement.item_id.in_(removidos)).first():
+        return "Não é possível remover itens com movimentações registradas."
+
+    # Itens que trocam de número (o número antigo fica livre para outro item deste envio)
+    ids_troca = {
+        u["id"] for u in updates
+        if u["num_tombo_ou_serie"] != atuais[u["id"]].num_tombo_ou_serie
+    }
+
+    # Unicidade: repetidos no envio e números já usados por itens que não estão sendo removidos/renumerados
+    numeros_mudados = [
+        u["num_tombo_ou_serie"] for u in updates if u["id"] in ids_troca
+    ] + [n["num_tombo_ou_serie"] for n in novos]
+    vistos: set[str] = set()
+    for num in numeros_mudados:
+        if num in vistos:
+            return f'O número "{num}" está repetido neste cadastro.'
+        vistos.add(num)
+    if numeros_mudados:
+        q = db.query(Item.num_tombo_ou_serie).filter(Item.num_tombo_ou_serie.in_(numeros_mudados))
+        ids_liberados = removidos | ids_troca
+        if ids_liberados:
+            q = q.filter(~Item.id.in_(ids_liberados))
+        outro = q.first()
+        if outro:
+            return f'O número "{outro[0]}" já está cadastrado em outro item.'
+
+    total = db.query(func.count(Item.id)).filter(Item.product_id == product.id).scalar() or 0
+    if total - len(removidos) + len(novos) < 1:
+        return "Informe ao menos um número de tombo ou de série."
+
+    if removidos:
+        db.query(Item).filter(
+            Item.product_id == product.id, Item.id.in_(removidos)
+        ).delete(synchronize_session=False)
+
+    if updates:
+        # Libera os números antes de regravar (evita UniqueViolation ao trocar números entre itens)
+        if ids_troca:
+            db.execute(
+                update(Item)
+                .where(Item.id.in_(ids_troca))
+                .values(num_tombo_ou_serie=None)
+                .execution_options(synchronize_session=False)
+            )
+        db.bulk_update_mappings(Item, updates)
+
+    db.execute(
+        update(Item)
+        .where(
+            Item.product_id == product.id,
+            or_(*[getattr(Item, campo).is_distinct_from(valor) for campo, valor in comuns.items()]),
+        )
+        .values(**comuns)
+        .execution_options(synchronize_session=False)
+    )
+
+    if novos:
+        db.execute(
+            insert(Item),
+            [{"product_id": product.id, **comuns, **dados} for dados in novos],
+        )
+    return None
+
+
 # ----------------- EDIT FORM -----------------
 @router.get("/edit/{product_id}")
 def edit_product_form(product_id: int, request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
@@ -655,20 +956,19 @@ def edit_product_form(product_id: int, request: Request, db: Session = Depends(g
         return RedirectResponse("/login")
 
     product = db.query(Product).options(
+        undefer(Product.description),
         joinedload(Product.orgao).joinedload(Orgao.municipio).joinedload(Municipio.estado),
-        joinedload(Product.items),
         joinedload(Product.stocks),
     ).filter(Product.id == product_id).first()
     if not product:
         return RedirectResponse("/products")
+    # Itens com série são carregados sob demanda pelo sub-editor paginado (/products/{id}/itens)
+    total_itens = db.query(func.count(Item.id)).filter(Item.product_id == product.id).scalar() or 0
+    item = _primary_item(db, product_id)
     if product.controla_por_serie:
-        product_items = list(product.items) if product.items else []
         stock = None
-        item = product_items[0] if product_items else None
     else:
-        product_items = []
         stocks = _get_product_stocks(db, product_id)
-        item = _primary_item(db, product_id)
         stock = _primary_stock_row(stocks, item)
 
     is_master = getattr(user_obj, "perfil", None) == "master"
@@ -695,15 +995,16 @@ def edit_product_form(product_id: int, request: Request, db: Session = Depends(g
         .order_by(Unidade.nome)
         .all()
     )
-    estados_geograficos = db.query(Estado).order_by(Estado.nome).all() if is_master else []
-    if product.controla_por_serie and product_items:
-        default_unidade_id = product_items[0].unit_id
+    ref = get_reference_data(db)
+    estados_geograficos = ref.estados if is_master else []
+    if product.controla_por_serie and item:
+        default_unidade_id = item.unit_id
     else:
         default_unidade_id = (stock.unit_id if stock else None) or (item.unit_id if item else None)
 
-    categorias = db.query(Category).order_by(Category.nome).all()
-    tipos = db.query(EquipmentType).all()
-    estados = db.query(EquipmentState).all()
+    categorias = ref.categorias
+    tipos = ref.tipos
+    estados = ref.estados_fisicos
 
     return templates.TemplateResponse(
         "product_form.html",
@@ -720,7 +1021,8 @@ def edit_product_form(product_id: int, request: Request, db: Session = Depends(g
             "default_unidade_id": default_unidade_id,
             "product": product,
             "item": item,
-            "product_items": product_items,
+            "product_items": [],
+            "total_itens": total_itens,
             "stock": stock,
             "user": user,
             "hide_app_header": True,
@@ -811,71 +1113,36 @@ async def edit_product(
     status_val = status or "Disponível"
 
     if controla_por_serie:
-        numeros = form_data.getlist("numero[]") or form_data.getlist("numero")
-        tipo_numeros = form_data.getlist("tipo_numero[]") or form_data.getlist("tipo_numero")
-        estado_id_list = form_data.getlist("estado_id[]")
-        status_list = form_data.getlist("status[]")
-
         if not unit_id_int:
             return alert_back("Selecione a Unidade antes de salvar.")
 
-        existing_items = db.query(Item).filter(Item.product_id == product.id).order_by(Item.id).all()
-        pares = _coletar_pares_numero(numeros, tipo_numeros)
-        if not pares:
-            return alert_back("Informe ao menos um número de tombo ou de série.")
-        err_num = _validar_numeros_itens(db, pares, product_id=product.id)
-        if err_num:
-            return alert_back(err_num)
-
-        # Primeiro libera num_tombo_ou_serie nos itens existentes (evita UniqueViolation ao trocar ordem)
-        for idx in range(min(len(pares), len(existing_items))):
-            existing_items[idx].num_tombo_ou_serie = None
-        db.flush()
-
-        for idx, (is_tombo, num_str) in enumerate(pares):
-            num_norm = _normalize_numero_item(is_tombo, num_str)
-            if not num_norm:
-                return alert_back(
-                    "Número do tombo inválido. Use o formato 000.000 (6 dígitos)."
-                )
-            estado_idx = _parse_int(estado_id_list[idx]) if idx < len(estado_id_list) else estado_int
-            status_idx = (status_list[idx] or "Disponível") if idx < len(status_list) else status_val
-            if idx < len(existing_items):
-                it = existing_items[idx]
-                it.tombo = is_tombo
-                it.num_tombo_ou_serie = num_norm
-                it.unit_id = unit_id_int
-                it.municipio_id = product.municipio_id
-                it.orgao_id = product.orgao_id
-                it.estado_id = estado_idx
-                it.status = status_idx
-                it.data_aquisicao = data_aq
-                it.valor_aquisicao = valor_float
-                it.garantia_ate = garantia_dt
-                it.observacao = observacao or None
-                db.add(it)
-            else:
-                novo = Item(
-                    product_id=product.id,
-                    municipio_id=product.municipio_id,
-                    orgao_id=product.orgao_id,
-                    unit_id=unit_id_int,
-                    tombo=is_tombo,
-                    num_tombo_ou_serie=num_norm,
-                    estado_id=estado_idx,
-                    status=status_idx,
-                    data_aquisicao=data_aq,
-                    valor_aquisicao=valor_float,
-                    garantia_ate=garantia_dt,
-                    observacao=observacao or None,
+        alteracoes, err_num = _ler_alteracoes_itens(form_data.get("itens_alteracoes"))
+        try:
+            # DML do diff roda dentro de _salvar_itens_diff: violações de FK/unicidade aparecem ali
+            if not err_num:
+                err_num = _salvar_itens_diff(
+                    db,
+                    product,
+                    alteracoes,
+                    {
+                        "unit_id": unit_id_int,
+                        "municipio_id": product.municipio_id,
+                        "orgao_id": product.orgao_id,
+                        "data_aquisicao": data_aq,
+                        "valor_aquisicao": valor_float,
+                        "garantia_ate": garantia_dt,
+                        "observacao": observacao or None,
+                    },
                 )
-                db.add(novo)
-
-        if len(pares) < len(existing_items):
-            for it in existing_items[len(pares):]:
-                db.delete(it)
-
-        db.commit()
+            if err_num:
+                db.rollback()
+                return alert_back(err_num)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return alert_back(
+                "Não foi possível salvar os itens: número já cadastrado ou item removido com movimentações."
+            )
     else:
         item = db.query(Item).filter(Item.product_id == product.id).first()
         if not item:
@@ -942,41 +1209,39 @@ async def edit_product(
 
         db.commit()
 
+    invalidate_movement_products()
     registrar_log(db, usuario=user, acao=f"Editou produto: {product.name}", ip=request.client.host)
     return RedirectResponse("/products", status_code=HTTP_302_FOUND)
 
 @router.get("/tipos-por-categoria/{category_id}")
-def get_tipos_por_categoria(category_id: int, db: Session = Depends(get_db)):
-    """Retorna tipos de equipamento de uma categoria específica"""
-    tipos = (
-        db.query(EquipmentType)
-        .filter(EquipmentType.category_id == category_id)
-        .order_by(EquipmentType.nome)
-        .all()
+def get_tipos_por_categoria(category_id: int, request: Request, db: Session = Depends(get_db)):
+    """Retorna tipos de equipamento de uma categoria específica (cache de referência)."""
+    ref = get_reference_data(db)
+    return cached_json_response(
+        request,
+        ref.tipos_por_categoria.get(category_id, []),
+        etag=f"{ref.etag}-c{category_id}",
     )
 
-    return [{"id": t.id, "nome": t.nome} for t in tipos]
-
 
 @router.get("/marcas-por-tipo/{type_id}")
 def get_marcas_por_tipo(
     type_id: int,
+    request: Request,
     include_brand_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
 ):
-    """Retorna marcas vinculadas ao tipo de equipamento."""
-    marcas = (
-        db.query(Brand)
-        .filter(Brand.equipment_types.any(EquipmentType.id == type_id))
-        .order_by(Brand.nome)
-        .all()
+    """Retorna marcas vinculadas ao tipo de equipamento (cache de referência)."""
+    ref = get_reference_data(db)
+    marcas = ref.marcas_por_tipo.get(type_id, [])
+    extra = ref.marcas_por_id.get(include_brand_id) if include_brand_id else None
+    if extra and all(m["id"] != extra.id for m in marcas):
+        marcas = sorted(marcas + [{"id": extra.id, "nome": extra.nome}], key=lambda m: m["nome"].lower())
+    return cached_json_response(
+        request,
+        marcas,
+        etag=f"{ref.etag}-t{type_id}-b{include_brand_id or 0}",
     )
-    ids = {m.id for m in marcas}
-    if include_brand_id and include_brand_id not in ids:
-        extra = db.query(Brand).filter(Brand.id == include_brand_id).first()
-        if extra:
-            marcas = sorted(list(marcas) + [extra], key=lambda m: m.nome.lower())
-    return [{"id": m.id, "nome": m.nome} for m in marcas]
 
 
 # ----------------- DELETE -----------------
@@ -1028,6 +1293,7 @@ def delete_product(product_id: int, request: Request, db: Session = Depends(get_
         )
         db.delete(product)
         db.commit()
+        invalidate_movement_products()
     except IntegrityError:
         db.rollback()
         return JSONResponse({
@@ -1,12 +1,34 @@
-import re
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import RedirectResponse, JSONResponse
-from sqlalchemy.orm import Session, joinedload
+import tempfile
+
+from fastapi import APIRouter, Request, Depends, File, Form, Query, UploadFile
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload, undefer
 
 from database import get_db
 from dependencies import get_current_user, registrar_log
-from models import User, SegemItem, SegemItemProduto, Unidade, ProdutoSegem, PerfilEnum
+from models import User, SegemItem, SegemItemProduto, SegemTomboContador, Unidade, PerfilEnum
 from templating import templates
+from http_cache import cached_json_bytes_response
+from services.segem_catalogo import get_catalogo_segem, sugerir_produtos
+from services.segem_formatos import (
+    format_tombo as _format_tombo,
+    parse_tombo_to_int as _parse_tombo_to_int,
+    parse_valor as _parse_valor,
+    valor_fmt as _valor_fmt,
+)
+from services.segem_relatorio import DIMENSOES, exportar_xlsx, relatorio_segem
+from services.segem_importacao import ErroImportacao, ImportacaoInterrompida, importar_planilha, ler_planilha
+from services.segem_consulta import (
+    COLUNAS_ORDENACAO,
+    FiltrosSegem,
+    contar_segem,
+    get_segem_facetas,
+    invalidate_segem_facetas,
+    pagina_segem,
+    totais_segem,
+)
 
 router = APIRouter(prefix="/segem", tags=["SEGEM"])
 
@@ -32,37 +54,30 @@ def _user_obj(db: Session, user: str):
     return db.query(User).filter(User.email == user).first()
 
 
-def _query_segem(db: Session, user_obj: User):
-    q = db.query(SegemItem)
-    if not _is_master(user_obj):
-        q = q.filter(SegemItem.municipio_id == user_obj.municipio_id)
-    return q.order_by(SegemItem.id.desc())
+def _municipio_filtro(user_obj: User):
+    """Município usado nos filtros da listagem (None = master vê todos)."""
+    return None if _is_master(user_obj) else user_obj.municipio_id
 
 
-def _valor_fmt(val):
-    """Formata valor para exibição no campo R$ (pt-BR)."""
-    if val is None:
-        return ""
-    try:
-        return "R$ {:,.2f}".format(float(val)).replace(",", "X").replace(".", ",").replace("X", ".")
-    except (TypeError, ValueError):
-        return ""
+def _filtros(municipio_id, ano=(), local=(), situacao=(), empresa=(), classificacao=(), tombo="", descricao=""):
+    """FiltrosSegem a partir dos parâmetros da tela (valores vazios são ignorados)."""
+    return FiltrosSegem(
+        municipio_id=municipio_id,
+        anos=tuple(sorted(set(ano))),
+        locais=tuple(sorted({x for x in local if x})),
+        situacoes=tuple(sorted({x for x in situacao if x})),
+        tombo=(tombo or "").strip(),
+        descricao=(descricao or "").strip(),
+        empresas=tuple(sorted({x for x in empresa if x})),
+        classificacoes=tuple(sorted({x for x in classificacao if x})),
+    )
 
 
-def _parse_valor(v):
-    """Converte valor para float. Aceita: pt-BR (1.830,00) ou numérico (1830.00) enviado pelo form."""
-    if v is None or (isinstance(v, str) and not v.strip()):
-        return None
-    try:
-        s = str(v).replace("R$", "").replace(" ", "").strip()
-        if not s:
-            return None
-        if "," in s:
-            # Formato pt-BR: ponto = milhares, vírgula = decimal
-            s = s.replace(".", "").replace(",", ".")
-        return float(s) if s else None
-    except (TypeError, ValueError):
-        return None
+def _data_br(valor):
+    """'2024-03-15' -> '15/03/2024'; outros formatos voltam como estão."""
+    if valor and len(valor) >= 10:
+        return f"{valor[8:10]}/{valor[5:7]}/{valor[0:4]}"
+    return valor or ""
 
 
 def _build_produtos_list(item):
@@ -86,64 +101,110 @@ def _all_tombos(item):
     return ", ".join(tombos)
 
 
-# Nº TOMBO: intervalo 000.001 a 999.999 (ex.: 003.502). Próximo = max(DB + atuais) + 1.
-_TOMBO_PATTERN = re.compile(r"^\s*(\d{1,3})\.(\d{1,3})\s*$")
+def _linha_listagem(item):
+    """Linha da tabela SEGEM já formatada para exibição."""
+    return {
+        "id": item.id,
+        "ano": item.ano,
+        "codigo": item.codigo or "",
+        "tombos": _all_tombos(item),
+        "local": item.local or "",
+        "descricao": item.descricao or "",
+        "situacao": item.situacao or "",
+        "valor_rs": _valor_fmt(item.valor_rs),
+        "entrada_no_siga": _data_br(item.entrada_no_siga),
+        "nota_de_empenho": item.nota_de_empenho or "",
+        "valor_nota_empenho": _valor_fmt(item.valor_nota_empenho),
+        "num_nota_fiscal": item.num_nota_fiscal or "",
+        "nome_empresa": item.nome_empresa or "",
+        "classificacao_asi": item.classificacao_asi or "",
+    }
 
 
-def _parse_tombo_to_int(s):
-    """Converte '003.502' -> 3502 ou None se inválido."""
-    if not s or not isinstance(s, str):
-        return None
-    m = _TOMBO_PATTERN.match(s.strip())
-    if not m:
-        return None
-    a, b = int(m.group(1)), int(m.group(2))
-    if a > 999 or b > 999:
-        return None
-    return a * 1000 + b
+_TOMBO_BASE = 3502  # sem nenhum tombo, o primeiro sugerido é 003.503
+_TOMBO_MAX = 999999
+_RESERVA_MAX = 500
 
 
-def _format_tombo(n):
-    """Converte 3502 -> '003.502'."""
-    if n is None or n < 0:
-        return None
-    n = min(int(n), 999999)
-    return "{:03d}.{:03d}".format(n // 1000, n % 1000)
+def _maior_tombo_subqueries():
+    """MAX(tombo_num) de SegemItem e SegemItemProduto (índice em tombo_num); NULL se não houver tombos."""
+    return (
+        select(func.max(SegemItem.tombo_num)).scalar_subquery(),
+        select(func.max(SegemItemProduto.tombo_num)).scalar_subquery(),
+    )
 
 
 def _proximo_tombo(db: Session, atuais=None):
-    """Retorna o próximo Nº TOMBO (000.001–999.999). Considera SegemItem + SegemItemProduto e opcionalmente lista atuais."""
-    valores = []
-    for row in db.query(SegemItem.num_tombo_gcm).filter(SegemItem.num_tombo_gcm.isnot(None)):
-        v = _parse_tombo_to_int(row[0])
-        if v is not None:
-            valores.append(v)
-    for row in db.query(SegemItemProduto.num_tombo_gcm).filter(SegemItemProduto.num_tombo_gcm.isnot(None)):
-        v = _parse_tombo_to_int(row[0])
-        if v is not None:
-            valores.append(v)
-    if atuais:
-        for s in atuais:
-            v = _parse_tombo_to_int(s)
-            if v is not None:
-                valores.append(v)
-    proximo_int = (max(valores) + 1) if valores else 3503  # 003.502 + 1 = 003.503
-    return _format_tombo(min(proximo_int, 999999))
+    """Retorna o próximo Nº TOMBO (000.001–999.999). Considera SegemItem + SegemItemProduto, reservas e opcionalmente lista atuais."""
+    max_item, max_produto = _maior_tombo_subqueries()
+    reservado = select(func.max(SegemTomboContador.ultimo)).scalar_subquery()
+    # GREATEST ignora NULL: só é NULL quando não há tombo nem reserva
+    maior = db.query(func.greatest(max_item, max_produto, reservado)).scalar()
+    for s in atuais or []:
+        v = _parse_tombo_to_int(s)
+        if v is not None and (maior is None or v > maior):
+            maior = v
+    if maior is None:
+        maior = _TOMBO_BASE
+    return _format_tombo(min(maior + 1, _TOMBO_MAX))
+
+
+def _reservar_tombos(db: Session, quantidade: int):
+    """
+    Reserva `quantidade` Nº TOMBO consecutivos e retorna (primeiro, ultimo) como int.
+    O UPDATE na linha única do contador trava a linha até o commit, então
+    operadores simultâneos recebem faixas disjuntas.
+    """
+    db.execute(
+        pg_insert(SegemTomboContador)
+        .values(id=1, ultimo=0)
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    max_item, max_produto = _maior_tombo_subqueries()
+    maior = func.greatest(func.nullif(SegemTomboContador.ultimo, 0), max_item, max_produto)
+    ultimo = db.execute(
+        update(SegemTomboContador)
+        .where(SegemTomboContador.id == 1)
+        .values(ultimo=func.coalesce(maior, _TOMBO_BASE) + quantidade)
+        .returning(SegemTomboContador.ultimo)
+    ).scalar()
+    if ultimo > _TOMBO_MAX:
+        db.rollback()
+        return None
+    db.commit()
+    return ultimo - quantidade + 1, ultimo
 
 
 @router.get("/produtos")
 def segem_produtos_list(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Catálogo completo de produtos SEGEM (código + descrição), versionado (ETag) e comprimido."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return JSONResponse({"error": "Sem permissão"}, status_code=403)
+    cat = get_catalogo_segem(db)
+    return cached_json_bytes_response(request, cat.corpo, cat.etag, corpo_gzip=cat.corpo_gzip, max_age=3600)
+
+
+@router.get("/produtos/sugestoes")
+def segem_produtos_sugestoes(
+    q: str = "",
+    limite: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
 ):
-    """Lista todos os produtos SEGEM (código + descrição) para datalist/autocomplete."""
+    """Autocomplete por prefixo do código ou de palavras da descrição (sem diferenciar acentos)."""
     if not user:
         return JSONResponse({"error": "Não autenticado"}, status_code=401)
     user_obj = _user_obj(db, user)
     if not user_obj or not _pode_acessar_segem(user_obj):
         return JSONResponse({"error": "Sem permissão"}, status_code=403)
-    produtos = db.query(ProdutoSegem).order_by(ProdutoSegem.codigo).all()
-    return JSONResponse([{"codigo": p.codigo or "", "descricao": p.descricao or ""} for p in produtos])
+    return JSONResponse(sugerir_produtos(get_catalogo_segem(db), q, limite))
 
 
 @router.get("/produtos/busca")
@@ -161,10 +222,10 @@ def segem_produtos_busca(
     codigo = (codigo or "").strip()
     if not codigo:
         return JSONResponse({"codigo": "", "descricao": ""})
-    p = db.query(ProdutoSegem).filter(ProdutoSegem.codigo == codigo).first()
-    if not p:
+    descricao = get_catalogo_segem(db).por_codigo.get(codigo)
+    if descricao is None:
         return JSONResponse({"codigo": codigo, "descricao": ""})
-    return JSONResponse({"codigo": p.codigo, "descricao": p.descricao or ""})
+    return JSONResponse({"codigo": codigo, "descricao": descricao})
 
 
 @router.get("/proximo-tombo")
@@ -184,6 +245,39 @@ def segem_proximo_tombo(
     return JSONResponse({"proximo_tombo": proximo or "003.503"})
 
 
+@router.post("/tombos/reservar")
+def segem_reservar_tombos(
+    request: Request,
+    quantidade: int = Form(1),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Reserva N Nº TOMBO consecutivos para o operador (sem colisão entre usuários simultâneos)."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return JSONResponse({"error": "Sem permissão"}, status_code=403)
+    if quantidade < 1 or quantidade > _RESERVA_MAX:
+        return JSONResponse({"error": f"Quantidade deve estar entre 1 e {_RESERVA_MAX}."}, status_code=400)
+
+    faixa = _reservar_tombos(db, quantidade)
+    if not faixa:
+        return JSONResponse({"error": "Não há Nº TOMBO disponíveis até 999.999."}, status_code=409)
+    primeiro, ultimo = faixa
+    registrar_log(
+        db,
+        usuario=user,
+        acao=f"SEGEM: Reservou Nº TOMBO {_format_tombo(primeiro)} a {_format_tombo(ultimo)}",
+        ip=request.client.host,
+    )
+    return JSONResponse({
+        "inicio": _format_tombo(primeiro),
+        "fim": _format_tombo(ultimo),
+        "tombos": [_format_tombo(n) for n in range(primeiro, ultimo + 1)],
+    })
+
+
 @router.get("/")
 def segem_home(
     request: Request,
@@ -200,35 +294,187 @@ def segem_home(
     if not _pode_acessar_segem(user_obj):
         return RedirectResponse("/dashboard")
 
-    itens = (
-        _query_segem(db, user_obj)
-        .options(joinedload(SegemItem.produtos))
-        .all()
+    facetas = get_segem_facetas(db, _municipio_filtro(user_obj))
+
+    return templates.TemplateResponse(
+        "segem_list.html",
+        {
+            "request": request,
+            "user": user,
+            "anos": facetas["anos"],
+            "locais": facetas["locais"],
+            "situacoes": facetas["situacoes"],
+            "hide_app_header": True,
+        },
     )
-    unidades = db.query(Unidade).filter(Unidade.ativo == True).order_by(Unidade.nome).all()
 
-    # Valores únicos para filtros
-    anos = sorted({i.ano for i in itens if i.ano is not None})
-    locais = sorted({i.local for i in itens if i.local})
-    situacoes = sorted({i.situacao for i in itens if i.situacao})
 
+@router.get("/dados")
+def segem_dados(
+    draw: int = 0,
+    start: int = Query(0, ge=0),
+    length: int = Query(25, ge=1, le=200),
+    ordenar: str = "id",
+    direcao: str = "desc",
+    ano: list[int] = Query([]),
+    local: list[str] = Query([]),
+    situacao: list[str] = Query([]),
+    tombo: str = "",
+    descricao: str = "",
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """
+    Página da listagem SEGEM (formato DataTables server-side), com filtros,
+    ordenação e totais calculados no banco.
+    """
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return JSONResponse({"error": "Sem permissão"}, status_code=403)
+
+    municipio_id = _municipio_filtro(user_obj)
+    filtros = _filtros(municipio_id, ano, local, situacao, tombo=tombo, descricao=descricao)
+    if ordenar not in COLUNAS_ORDENACAO:
+        ordenar = "id"
+
+    totais = totais_segem(db, filtros)
+    if filtros == FiltrosSegem(municipio_id=municipio_id):
+        total_geral = totais["registros"]
+    else:
+        total_geral = contar_segem(db, FiltrosSegem(municipio_id=municipio_id))
+    itens = pagina_segem(db, filtros, ordenar, direcao, start, length)
+
+    return JSONResponse({
+        "draw": draw,
+        "recordsTotal": total_geral,
+        "recordsFiltered": totais["registros"],
+        "data": [_linha_listagem(i) for i in itens],
+        "totais": {
+            "valor_rs": totais["valor_rs"],
+            "valor_rs_fmt": _valor_fmt(totais["valor_rs"]),
+            "valor_nota_empenho": totais["valor_nota_empenho"],
+            "valor_nota_empenho_fmt": _valor_fmt(totais["valor_nota_empenho"]),
+        },
+    })
+
+
+@router.get("/relatorio")
+def segem_relatorio(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    if not user:
+        return RedirectResponse("/login")
+    user_obj = _user_obj(db, user)
+    if not user_obj:
+        return RedirectResponse("/login")
+    if not _pode_acessar_segem(user_obj):
+        return RedirectResponse("/dashboard")
     return templates.TemplateResponse(
-        "segem_list.html",
+        "segem_relatorio.html",
         {
             "request": request,
             "user": user,
-            "itens": itens,
-            "unidades": unidades,
-            "anos": anos,
-            "locais": locais,
-            "situacoes": situacoes,
-            "valor_fmt": _valor_fmt,
-            "all_tombos": _all_tombos,
+            "dimensoes": [(chave, d[1]) for chave, d in DIMENSOES.items()],
             "hide_app_header": True,
         },
     )
 
 
+@router.get("/relatorio/dados")
+def segem_relatorio_dados(
+    dimensao: str = "ano",
+    ano: list[int] = Query([]),
+    local: list[str] = Query([]),
+    situacao: list[str] = Query([]),
+    empresa: list[str] = Query([]),
+    classificacao: list[str] = Query([]),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Totais de valor_rs (registro + produtos) e da nota de empenho agrupados por `dimensao`."""
+    if not user:
+        return JSONResponse({"error": "Não autenticado"}, status_code=401)
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return JSONResponse({"error": "Sem permissão"}, status_code=403)
+    if dimensao not in DIMENSOES:
+        return JSONResponse({"error": "Dimensão inválida"}, status_code=400)
+
+    filtros = _filtros(_municipio_filtro(user_obj), ano, local, situacao, empresa, classificacao)
+    dados = relatorio_segem(db, dimensao, filtros)
+
+    def fmt(g):
+        return {
+            **g,
+            "valor_rs_fmt": _valor_fmt(g["valor_rs"]),
+            "valor_produtos_fmt": _valor_fmt(g["valor_produtos"]),
+            "valor_total_fmt": _valor_fmt(g["valor_total"]),
+            "valor_nota_empenho_fmt": _valor_fmt(g["valor_nota_empenho"]),
+        }
+
+    return JSONResponse({
+        "dimensao": dimensao,
+        "grupos": [fmt(g) for g in dados["grupos"]],
+        "totais": fmt(dados["totais"]),
+    })
+
+
+@router.get("/exportar.xlsx")
+def segem_exportar_xlsx(
+    request: Request,
+    ano: list[int] = Query([]),
+    local: list[str] = Query([]),
+    situacao: list[str] = Query([]),
+    empresa: list[str] = Query([]),
+    classificacao: list[str] = Query([]),
+    tombo: str = "",
+    descricao: str = "",
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """
+    Planilha dos registros filtrados. As linhas são lidas em lotes e escritas
+    em modo write_only num arquivo temporário, enviado em blocos.
+    """
+    if not user:
+        return RedirectResponse("/login")
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return RedirectResponse("/dashboard")
+
+    filtros = _filtros(
+        _municipio_filtro(user_obj), ano, local, situacao, empresa, classificacao, tombo, descricao
+    )
+    arquivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        exportar_xlsx(db, filtros, arquivo)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    registrar_log(db, usuario=user, acao="SEGEM: Exportou registros (XLSX)", ip=request.client.host)
+
+    def blocos():
+        try:
+            while True:
+                bloco = arquivo.read(64 * 1024)
+                if not bloco:
+                    break
+                yield bloco
+        finally:
+            arquivo.close()
+
+    return StreamingResponse(
+        blocos(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": 'attachment; filename="segem.xlsx"'},
+    )
+
+
 @router.get("/add")
 def segem_add_form(
     request: Request,
@@ -241,7 +487,6 @@ def segem_add_form(
     if not user_obj or not _pode_acessar_segem(user_obj):
         return RedirectResponse("/dashboard")
     unidades = db.query(Unidade).filter(Unidade.ativo == True).order_by(Unidade.nome).all()
-    produtos_segem = db.query(ProdutoSegem).order_by(ProdutoSegem.codigo).all()
     primeiro_tombo = _proximo_tombo(db)
     produtos_list = [{"tombo": primeiro_tombo, "valor_formatado": ""}]
     return templates.TemplateResponse(
@@ -252,7 +497,6 @@ def segem_add_form(
             "action": "add",
             "item": None,
             "unidades": unidades,
-            "produtos_segem": produtos_segem,
             "produtos_list": produtos_list,
         },
     )
@@ -305,10 +549,94 @@ async def segem_add_submit(
             db.add(SegemItemProduto(segem_item_id=item.id, num_tombo_gcm=t, valor_rs=v))
     db.commit()
     db.refresh(item)
+    invalidate_segem_facetas()
     registrar_log(db, usuario=user, acao=f"SEGEM: Cadastrou registro {item.id}", ip=request.client.host)
     return RedirectResponse("/segem", status_code=302)
 
 
+@router.get("/importar")
+def segem_importar_form(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    if not user:
+        return RedirectResponse("/login")
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return RedirectResponse("/dashboard")
+    return templates.TemplateResponse(
+        "segem_importar.html",
+        {"request": request, "user": user, "resultado": None, "erro": None, "hide_app_header": True},
+    )
+
+
+@router.post("/importar")
+def segem_importar_submit(
+    request: Request,
+    arquivo: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    user: str = Depends(get_current_user),
+):
+    """Importa planilha XLSX/CSV em lotes; linhas com erro voltam no relatório e não interrompem a carga."""
+    if not user:
+        return RedirectResponse("/login")
+    user_obj = _user_obj(db, user)
+    if not user_obj or not _pode_acessar_segem(user_obj):
+        return RedirectResponse("/dashboard")
+
+    resultado, erro = None, None
+    try:
+        resultado = importar_planilha(
+            db,
+            ler_planilha(arquivo.file, arquivo.filename),
+            municipio_id=user_obj.municipio_id,
+            orgao_id=user_obj.orgao_id,
+            created_by=user_obj.id,
+        )
+    except ErroImportacao as e:
+        db.rollback()
+        erro = str(e)
+    except ImportacaoInterrompida as e:
+        # Os lotes anteriores à falha já foram gravados: relatório parcial, cache e log como no sucesso
+        db.rollback()
+        resultado = e.relatorio
+        erro = (
+            f"Importação interrompida após {resultado['importados']} registro(s). "
+            "Confira o arquivo e importe novamente: os tombos já gravados serão ignorados."
+        )
+    except Exception:
+        db.rollback()
+        erro = "Não foi possível ler o arquivo. Confira se é uma planilha .xlsx ou .csv válida."
+    finally:
+        arquivo.file.close()
+
+    if resultado and resultado["importados"]:
+        invalidate_segem_facetas()
+        registrar_log(
+            db,
+            usuario=user,
+            acao=(
+                f"SEGEM: Importou {resultado['importados']} registro(s) de {arquivo.filename} "
+                f"({len(resultado['erros']) + resultado['erros_omitidos']} linha(s) com erro)"
+                + (" - importação interrompida" if erro else "")
+            ),
+            ip=request.client.host,
+        )
+
+    return templates.TemplateResponse(
+        "segem_importar.html",
+        {
+            "request": request,
+            "user": user,
+            "resultado": resultado,
+            "erro": erro,
+            "arquivo_nome": arquivo.filename,
+            "hide_app_header": True,
+        },
+    )
+
+
 @router.get("/edit/{item_id}")
 def segem_edit_form(
     item_id: int,
@@ -322,14 +650,14 @@ def segem_edit_form(
     if not user_obj or not _pode_acessar_segem(user_obj):
         return RedirectResponse("/dashboard")
     item = db.query(SegemItem).options(
-        joinedload(SegemItem.produtos)
+        undefer(SegemItem.descricao),
+        joinedload(SegemItem.produtos),
     ).filter(SegemItem.id == item_id).first()
     if not item:
         return RedirectResponse("/segem")
     if not _is_master(user_obj) and item.municipio_id != user_obj.municipio_id:
         return RedirectResponse("/segem")
     unidades = db.query(Unidade).filter(Unidade.ativo == True).order_by(Unidade.nome).all()
-    produtos_segem = db.query(ProdutoSegem).order_by(ProdutoSegem.codigo).all()
     produtos_list = _build_produtos_list(item)
     return templates.TemplateResponse(
         "segem_form.html",
@@ -339,7 +667,6 @@ def segem_edit_form(
             "action": "edit",
             "item": item,
             "unidades": unidades,
-            "produtos_segem": produtos_segem,
             "produtos_list": produtos_list,
         },
     )
@@ -359,14 +686,14 @@ def segem_view_form(
     if not user_obj or not _pode_acessar_segem(user_obj):
         return RedirectResponse("/dashboard")
     item = db.query(SegemItem).options(
-        joinedload(SegemItem.produtos)
+        undefer(SegemItem.descricao),
+        joinedload(SegemItem.produtos),
     ).filter(SegemItem.id == item_id).first()
     if not item:
         return RedirectResponse("/segem")
     if not _is_master(user_obj) and item.municipio_id != user_obj.municipio_id:
         return RedirectResponse("/segem")
     unidades = db.query(Unidade).filter(Unidade.ativo == True).order_by(Unidade.nome).all()
-    produtos_segem = db.query(ProdutoSegem).order_by(ProdutoSegem.codigo).all()
     produtos_list = _build_produtos_list(item)
     return templates.TemplateResponse(
         "segem_form.html",
@@ -376,7 +703,6 @@ def segem_view_form(
             "action": "view",
             "item": item,
             "unidades": unidades,
-            "produtos_segem": produtos_segem,
             "produtos_list": produtos_list,
         },
     )
@@ -431,6 +757,7 @@ async def segem_edit_submit(
             db.add(SegemItemProduto(segem_item_id=item.id, num_tombo_gcm=t, valor_rs=v))
     db.commit()
     db.refresh(item)
+    invalidate_segem_facetas()
     registrar_log(db, usuario=user, acao=f"SEGEM: Atualizou registro {item.id}", ip=request.client.host)
     return RedirectResponse("/segem", status_code=302)
 
@@ -447,7 +774,7 @@ def segem_get_item(
     if not user_obj or not _pode_acessar_segem(user_obj):
         return JSONResponse({"error": "Sem permissão"}, status_code=403)
 
-    item = db.query(SegemItem).filter(SegemItem.id == item_id).first()
+    item = db.query(SegemItem).options(undefer(SegemItem.descricao)).filter(SegemItem.id == item_id).first()
     if not item:
         return JSONResponse({"error": "Registro não encontrado"}, status_code=404)
     if not _is_master(user_obj) and item.municipio_id != user_obj.municipio_id:
@@ -527,6 +854,7 @@ def segem_save(
 
     db.commit()
     db.refresh(item)
+    invalidate_segem_facetas()
     registrar_log(db, usuario=user, acao=f"SEGEM: {'Atualizou' if id else 'Cadastrou'} registro {item.id}", ip=request.client.host)
     return JSONResponse({"success": True, "id": item.id})
 
@@ -552,5 +880,6 @@ def segem_delete(
 
     db.delete(item)
     db.commit()
+    invalidate_segem_facetas()
     registrar_log(db, usuario=user, acao=f"SEGEM: Excluiu registro {item_id}", ip=request.client.host)
     return JSONResponse({"success": True})
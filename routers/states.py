@@ -6,6 +6,7 @@ from database import get_db
 from dependencies import get_current_user, registrar_log
 from models import EquipmentState
 from templating import templates
+from services.reference_data import invalidate_reference_data
 
 router = APIRouter(prefix="/states", tags=["States"])
 
@@ -52,6 +53,7 @@ def add_state(
     db.add(novo_estado)
     db.commit()
     db.refresh(novo_estado)
+    invalidate_reference_data()
 
     registrar_log(db, usuario=user, acao=f"Cadastrou estado: {nome}", ip=ip)
     return RedirectResponse("/states", status_code=HTTP_302_FOUND)
@@ -95,6 +97,7 @@ def edit_state(
     if estado:
         estado.nome = nome
         db.commit()
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Editou estado ID {state_id}", ip=ip)
 
     return RedirectResponse("/states", status_code=HTTP_302_FOUND)
@@ -116,6 +119,7 @@ def delete_state(
     if estado:
         db.delete(estado)
         db.commit()
+        invalidate_reference_data()
         registrar_log(db, usuario=user, acao=f"Excluiu estado ID {state_id}", ip=ip)
 
     return RedirectResponse("/states", status_code=HTTP_302_FOUND)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from starlette.status import HTTP_302_FOUND
-from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy.orm import Session, aliased, joinedload, undefer
 from sqlalchemy import func, literal, Integer, case
 from services.audit_service import build_stock_audit
 from services.stock_alerts_service import build_stock_alerts
@@ -32,7 +32,6 @@ def list_stock(request: Request, db: Session = Depends(get_db),
             "stock": stock,
             "user": user,
             "hide_app_header": True,
-            "movement_products": movement_ctx["products"],
             "movement_units": movement_ctx["units"],
             "movement_categories": movement_ctx["categories"],
         },
@@ -369,7 +368,7 @@ def get_item_details(
     db: Session = Depends(get_db)
 ):
     """Retorna detalhes completos de um item para visualização"""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = db.query(Item).options(undefer(Item.observacao)).filter(Item.id == item_id).first()
     
     if not item:
         return {"error": "Item não encontrado"}
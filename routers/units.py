@@ -2,7 +2,7 @@ from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
 from starlette.status import HTTP_302_FOUND
 from sqlalchemy import text
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 import re
 
@@ -12,9 +12,6 @@ from models import (
     User,
     Unit,
     Unidade,
-    Orgao,
-    Municipio,
-    Estado,
     PerfilEnum,
     Stock,
     Item,
@@ -24,6 +21,9 @@ from models import (
     CircularDestinatario,
 )
 from templating import templates
+from services.escopo_organizacional import condicoes_unidades, preencher_escopo_unidade
+from services.hierarquia_geografica import get_hierarquia, invalidate_hierarquia
+from services.processo_pdf import invalidar_pdfs_processos
 from ui_alerts import alert_back
 
 router = APIRouter(prefix="/units", tags=["Unidades Administrativas"])
@@ -65,41 +65,47 @@ def _liberar_vinculos_unidade(db: Session, unit_id: int) -> None:
 @router.get("/")
 def list_units(
     request: Request,
+    estado_id: int | None = None,
+    municipio_id: int | None = None,
+    orgao_id: int | None = None,
     db: Session = Depends(get_db),
     user: str = Depends(get_current_user)
 ):
-    """Lista unidades com eager loading dos relacionamentos"""
+    """
+    Lista unidades, opcionalmente só as de um estado/município/órgão.
+    O filtro usa os ancestrais materializados em `unidades` e os nomes vêm do
+    cache da hierarquia, então a consulta não faz join com orgaos/municipios/estados.
+    """
     if not user:
         return RedirectResponse("/login")
-    
-    # ✅ Carrega unidades com todos os relacionamentos de uma vez (evita N+1 queries)
+
     unidades = (
-        db.query(Unidade)
-        .join(Orgao, Unidade.orgao_id == Orgao.id)
-        .join(Municipio, Orgao.municipio_id == Municipio.id)
-        .join(Estado, Municipio.estado_id == Estado.id)
-        .options(
-            joinedload(Unidade.orgao)
-            .joinedload(Orgao.municipio)
-            .joinedload(Municipio.estado)
+        db.query(
+            Unidade.id, Unidade.nome, Unidade.sigla, Unidade.ramal, Unidade.responsavel,
+            Unidade.orgao_id, Unidade.municipio_id, Unidade.estado_id,
         )
+        .filter(*condicoes_unidades(orgao_id, municipio_id, estado_id))
         .all()
     )
-    
-    # ✅ Prepara dados com campos diretos (evita problemas no template)
+
+    h = get_hierarquia(db)
+    nomes_estado = {e.id: e.nome for e in h.estados}
     units_data = []
     for u in unidades:
+        orgao = h.orgaos_por_id.get(u.orgao_id)
+        municipio = h.municipios_por_id.get(u.municipio_id or (orgao.municipio_id if orgao else None))
+        estado_id_u = u.estado_id or (municipio.estado_id if municipio else None)
         units_data.append({
             'id': u.id,
             'nome': u.nome,
             'sigla': u.sigla or '-',
             'ramal': u.ramal or '-',
             'responsavel': u.responsavel or '-',
-            'orgao': u.orgao.nome if u.orgao else '-',
-            'municipio': u.orgao.municipio.nome if u.orgao and u.orgao.municipio else '-',
-            'estado': u.orgao.municipio.estado.nome if u.orgao and u.orgao.municipio and u.orgao.municipio.estado else '-',
+            'orgao': orgao.nome if orgao else '-',
+            'municipio': municipio.nome if municipio else '-',
+            'estado': nomes_estado.get(estado_id_u, '-'),
         })
-    
+
     return templates.TemplateResponse(
         "units.html",
         {
@@ -162,9 +168,11 @@ def add_unit(
         ativo=True,
     )
 
+    preencher_escopo_unidade(db, nova_unidade)
     db.add(nova_unidade)
     db.commit()
     db.refresh(nova_unidade)
+    invalidate_hierarquia()
 
     registrar_log(
         db,
@@ -231,13 +239,17 @@ def edit_unit(
 
     unidade = db.query(Unidade).filter(Unidade.id == unit_id).first()
     if unidade:
+        if (unidade.nome, unidade.sigla) != (nome, sigla or None):
+            invalidar_pdfs_processos(db)
         unidade.nome = nome
         unidade.sigla = sigla or None
         unidade.responsavel = resp_clean or None
         unidade.ramal = ramal_clean or None
         unidade.orgao_id = orgao_id
+        preencher_escopo_unidade(db, unidade)
 
         db.commit()
+        invalidate_hierarquia()
 
         registrar_log(
             db,
@@ -326,7 +338,9 @@ def delete_unit(
     try:
         _liberar_vinculos_unidade(db, unit_id)
         db.delete(unidade)
+        invalidar_pdfs_processos(db)
         db.commit()
+        invalidate_hierarquia()
     except IntegrityError:
         db.rollback()
         return JSONResponse({
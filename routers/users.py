@@ -8,7 +8,6 @@ from database import get_db
 from dependencies import get_current_user, registrar_log
 from models import (
     User,
-    Municipio,
     Orgao,
     Unidade,
     PerfilEnum,
@@ -22,6 +21,8 @@ from models import (
     SegemItem,
 )
 from templating import templates
+from services.hierarquia_geografica import get_hierarquia
+from services.processo_pdf import invalidar_pdfs_processos
 from typing import Optional
 import re
 import hashlib
@@ -86,7 +87,7 @@ def _form_data_from_request(nome, cpf, email, municipio_id, orgao_id, unidade_id
     """Monta dict para reexibir o formulário com valores preenchidos."""
     estado_id = None
     if municipio_id and db:
-        m = db.query(Municipio).filter(Municipio.id == municipio_id).first()
+        m = get_hierarquia(db).municipios_por_id.get(municipio_id)
         if m:
             estado_id = m.estado_id
     return {
@@ -414,6 +415,10 @@ def edit_user(
                 "form_data": form_data, "errors": ["A senha deve ter no mínimo 6 caracteres."]
             })
     
+    # Nome e lotação aparecem nas assinaturas do PDF dos processos
+    if (user.nome, user.orgao_id, user.unidade_id) != (nome, orgao_id, unidade_id):
+        invalidar_pdfs_processos(db)
+
     # ✅ ATUALIZA CAMPOS
     user.nome = nome
     user.cpf = cpf_limpo
@@ -528,6 +533,7 @@ def delete_user(
     try:
         _liberar_vinculos_usuario(db, user_id)
         db.delete(user_to_delete)
+        invalidar_pdfs_processos(db)
         db.commit()
     except IntegrityError:
         db.rollback()
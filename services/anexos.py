@@ -0,0 +1,352 @@
+"""
+Anexos das tramitações: recepção em streaming e armazenamento por conteúdo.
+
+Recepção: o corpo multipart é lido da requisição em blocos e cada arquivo
+vai direto para um temporário em ANEXOS_DIR/tmp, calculando o SHA-256 no
+caminho (nenhum arquivo fica inteiro na memória). O tipo é conferido pelos
+primeiros bytes e o tamanho a cada bloco, então um upload inválido é
+interrompido sem ler o resto.
+
+Armazenamento: o arquivo fica em ANEXOS_DIR/<2 primeiros>/<sha256>; o mesmo
+conteúdo anexado de novo (em outro trâmite ou processo) reaproveita o
+arquivo existente. Cada anexo é uma linha de TramiteAnexo (nome original,
+hash, tamanho), e a cota do município soma os conteúdos distintos dos seus
+anexos.
+
+Download: FileResponse com Range/If-Range (e envio pelo próprio servidor
+ASGI quando ele suporta `http.response.pathsend`); com
+SIGEIN_ANEXOS_X_ACCEL, a resposta só indica o arquivo ao nginx
+(X-Accel-Redirect), que o envia com sendfile.
+
+Configuração por variável de ambiente:
+    SIGEIN_ANEXOS_DIR        diretório (padrão: dados/anexos)
+    SIGEIN_ANEXO_MAX_MB      tamanho máximo por arquivo em MB (padrão: 10)
+    SIGEIN_ANEXOS_POR_ENVIO  arquivos por tramitação (padrão: 20)
+    SIGEIN_ANEXOS_COTA_MB    cota padrão por município em MB (padrão: 2048);
+                             Municipio.cota_anexos_mb tem precedência
+    SIGEIN_ANEXOS_X_ACCEL    prefixo do location interno do nginx (ex.: /_anexos)
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import func, select
+from starlette.datastructures import FormData
+
+from http_cache import cached_file_response
+from models import Municipio, TramiteAnexo
+
+ANEXOS_DIR = os.getenv("SIGEIN_ANEXOS_DIR", os.path.join("dados", "anexos"))
+TAMANHO_MAXIMO = int(os.getenv("SIGEIN_ANEXO_MAX_MB", "10")) * 1024 * 1024
+MAX_ARQUIVOS = int(os.getenv("SIGEIN_ANEXOS_POR_ENVIO", "20"))
+COTA_PADRAO_MB = int(os.getenv("SIGEIN_ANEXOS_COTA_MB", "2048"))
+X_ACCEL_PREFIXO = os.getenv("SIGEIN_ANEXOS_X_ACCEL", "").rstrip("/")
+
+MAX_CAMPO = 1024 * 1024  # campos de texto (o despacho tem limite de 10.000 caracteres)
+
+# Assinatura (primeiros bytes) -> media type aceito
+TIPOS = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+)
+_TAMANHO_ASSINATURA = max(len(a) for a, _ in TIPOS)
+
+
+class AnexoInvalido(Exception):
+    """Upload recusado (tipo, tamanho, cota ou formulário malformado); a mensagem vai para o usuário."""
+
+    def __init__(self, mensagem: str, status_code: int = 400):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+class ArquivoRecebido(NamedTuple):
+    nome: str
+    sha256: str
+    tamanho: int
+    media_type: str
+    temporario: str  # removido por guardar() ou descartar()
+
+
+def caminho_blob(sha256: str) -> str:
+    return os.path.join(ANEXOS_DIR, sha256[:2], sha256)
+
+
+def caminho_miniatura(sha256: str) -> str:
+    """PNG da primeira página, gerado em segundo plano (services/anexos_tarefas.py)."""
+    return os.path.join(ANEXOS_DIR, "miniaturas", sha256[:2], f"{sha256}.png")
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB".replace(".", ",")
+
+
+# ------------------------------------------------------------
+# Recepção
+# ------------------------------------------------------------
+
+class _Parte:
+    def __init__(self):
+        self.cabecalho = b""
+        self.valor = b""
+        self.headers: dict[bytes, bytes] = {}
+        self.nome_campo = ""
+        self.e_arquivo = False
+        self.arquivo = None  # (nome, arquivo aberto, caminho temporário) nas partes de arquivo
+        self.hash = None
+        self.tamanho = 0
+        self.inicio = b""  # primeiros bytes, para reconhecer o tipo
+        self.media_type = None
+
+
+class _Recepcao:
+    """Callbacks do MultipartParser; os blocos dos arquivos são gravados fora do event loop."""
+
+    def __init__(self):
+        self.campos: list[tuple[str, str]] = []
+        self.arquivos: list[ArquivoRecebido] = []
+        self.abertos: list[str] = []  # temporários criados (para descartar em caso de erro)
+        self.pendentes: list[tuple] = []  # (arquivo aberto, bytes) a gravar
+        self.parte: _Parte | None = None
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._inicio_parte,
+            "on_header_field": self._campo_cabecalho,
+            "on_header_value": self._valor_cabecalho,
+            "on_header_end": self._fim_cabecalho,
+            "on_headers_finished": self._fim_cabecalhos,
+            "on_part_data": self._dados,
+            "on_part_end": self._fim_parte,
+        }
+
+    def _inicio_parte(self) -> None:
+        self.parte = _Parte()
+
+    def _campo_cabecalho(self, dados: bytes, inicio: int, fim: int) -> None:
+        self.parte.cabecalho += dados[inicio:fim]
+
+    def _valor_cabecalho(self, dados: bytes, inicio: int, fim: int) -> None:
+        self.parte.valor += dados[inicio:fim]
+
+    def _fim_cabecalho(self) -> None:
+        self.parte.headers[self.parte.cabecalho.lower()] = self.parte.valor
+        self.parte.cabecalho = self.parte.valor = b""
+
+    def _fim_cabecalhos(self) -> None:
+        parte = self.parte
+        _, opcoes = parse_options_header(parte.headers.get(b"content-disposition", b""))
+        parte.nome_campo = opcoes.get(b"name", b"").decode("utf-8", "replace")
+        parte.e_arquivo = b"filename" in opcoes
+        if not parte.e_arquivo:
+            parte.valor = b""
+            return
+        nome = opcoes[b"filename"].decode("utf-8", "replace")
+        nome = os.path.basename(nome.replace("\\", "/")).strip()[:255]
+        if not nome:
+            return  # campo de arquivo vazio (nenhum arquivo escolhido)
+        if len(self.arquivos) + 1 > MAX_ARQUIVOS:
+            raise AnexoInvalido(f"Envie no máximo {MAX_ARQUIVOS} anexos por tramitação")
+        os.makedirs(os.path.join(ANEXOS_DIR, "tmp"), exist_ok=True)
+        fd, caminho = tempfile.mkstemp(dir=os.path.join(ANEXOS_DIR, "tmp"), suffix=".part")
+        self.abertos.append(caminho)
+        parte.arquivo = (nome, os.fdopen(fd, "wb"), caminho)
+        parte.hash = hashlib.sha256()
+
+    def _dados(self, dados: bytes, inicio: int, fim: int) -> None:
+        parte = self.parte
+        bloco = dados[inicio:fim]
+        if parte.arquivo is None:
+            if parte.e_arquivo:
+                return  # campo de arquivo vazio
+            parte.valor += bloco
+            if len(parte.valor) > MAX_CAMPO:
+                raise AnexoInvalido("Campo do formulário muito grande", status_code=413)
+            return
+        nome = parte.arquivo[0]
+        parte.tamanho += len(bloco)
+        if parte.tamanho > TAMANHO_MAXIMO:
+            raise AnexoInvalido(
+                f"O anexo {nome} excede o tamanho máximo de {_mb(TAMANHO_MAXIMO)}", status_code=413
+            )
+        if parte.media_type is None:
+            parte.inicio += bloco[:_TAMANHO_ASSINATURA]
+            if len(parte.inicio) >= _TAMANHO_ASSINATURA:
+                parte.media_type = self._tipo(nome, parte.inicio)
+        parte.hash.update(bloco)
+        self.pendentes.append((parte.arquivo[1], bloco))
+
+    def _fim_parte(self) -> None:
+        parte = self.parte
+        if parte.arquivo is None:
+            if not parte.e_arquivo:
+                self.campos.append((parte.nome_campo, parte.valor.decode("utf-8", "replace")))
+            return
+        nome, arquivo, caminho = parte.arquivo
+        if parte.tamanho == 0:
+            raise AnexoInvalido(f"O anexo {nome} está vazio")
+        media_type = parte.media_type or self._tipo(nome, parte.inicio)
+        self.pendentes.append((arquivo, None))  # fecha depois da última gravação
+        self.arquivos.append(ArquivoRecebido(nome, parte.hash.hexdigest(), parte.tamanho, media_type, caminho))
+
+    @staticmethod
+    def _tipo(nome: str, inicio: bytes) -> str:
+        for assinatura, media_type in TIPOS:
+            if inicio.startswith(assinatura):
+                return media_type
+        raise AnexoInvalido(f"O anexo {nome} não é PDF, PNG ou JPEG", status_code=415)
+
+    def gravar_pendentes(self) -> None:
+        pendentes, self.pendentes = self.pendentes, []
+        for arquivo, bloco in pendentes:
+            if bloco is None:
+                arquivo.close()
+            else:
+                arquivo.write(bloco)
+
+    def descartar(self) -> None:
+        for arquivo, _ in self.pendentes:
+            arquivo.close()
+        if self.parte is not None and self.parte.arquivo is not None:
+            self.parte.arquivo[1].close()
+        for caminho in self.abertos:
+            _remover(caminho)
+
+
+async def receber_formulario(request: Request) -> tuple[FormData, list[ArquivoRecebido]]:
+    """
+    Campos de texto e anexos do formulário. Os anexos ficam em temporários até
+    `guardar()`; quem chama deve sempre chamar `descartar()` no fim (remove o
+    que não foi guardado). Formulário sem multipart é lido normalmente.
+    """
+    tipo, opcoes = parse_options_header(request.headers.get("content-type", ""))
+    if tipo != b"multipart/form-data":
+        return await request.form(), []
+    fronteira = opcoes.get(b"boundary")
+    if not fronteira:
+        raise AnexoInvalido("Formulário inválido")
+
+    recepcao = _Recepcao()
+    parser = MultipartParser(fronteira, recepcao.callbacks())
+    try:
+        async for bloco in request.stream():
+            parser.write(bloco)
+            if recepcao.pendentes:
+                await run_in_threadpool(recepcao.gravar_pendentes)
+        parser.finalize()
+        await run_in_threadpool(recepcao.gravar_pendentes)
+    except MultipartParseError:
+        recepcao.descartar()
+        raise AnexoInvalido("Formulário inválido")
+    except BaseException:
+        recepcao.descartar()
+        raise
+    return FormData(recepcao.campos), recepcao.arquivos
+
+
+def guardar(arquivo: ArquivoRecebido) -> str:
+    """Move o temporário para o endereço do conteúdo (ou o descarta, se o conteúdo já existe)."""
+    destino = caminho_blob(arquivo.sha256)
+    if os.path.exists(destino):
+        _remover(arquivo.temporario)
+        return destino
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.chmod(arquivo.temporario, 0o644)
+    try:
+        os.replace(arquivo.temporario, destino)  # atômico; conteúdo idêntico se outro worker gravou antes
+    except OSError:
+        if not os.path.exists(destino):  # no Windows o replace falha se o destino acabou de ser criado
+            raise
+        _remover(arquivo.temporario)
+    return destino
+
+
+def descartar(arquivos: list[ArquivoRecebido]) -> None:
+    """Remove os temporários que não foram guardados."""
+    for arquivo in arquivos:
+        _remover(arquivo.temporario)
+
+
+def _remover(caminho: str) -> None:
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+# ------------------------------------------------------------
+# Cota por município
+# ------------------------------------------------------------
+
+def cota_bytes(db, municipio_id: int) -> int:
+    mb = db.query(Municipio.cota_anexos_mb).filter(Municipio.id == municipio_id).scalar()
+    return (COTA_PADRAO_MB if mb is None else mb) * 1024 * 1024
+
+
+def uso_bytes(db, municipio_id: int) -> int:
+    """Soma dos conteúdos distintos anexados pelo município."""
+    distintos = (
+        select(TramiteAnexo.sha256, TramiteAnexo.tamanho)
+        .where(TramiteAnexo.municipio_id == municipio_id)
+        .distinct()
+        .subquery()
+    )
+    return db.execute(select(func.coalesce(func.sum(distintos.c.tamanho), 0))).scalar() or 0
+
+
+def verificar_cota(db, municipio_id: int, arquivos: list[ArquivoRecebido]) -> None:
+    """
+    Levanta AnexoInvalido se os conteúdos novos para o município não cabem na cota.
+    Trava a linha do município até o commit (envios simultâneos contam um de cada vez).
+    """
+    db.query(Municipio.id).filter(Municipio.id == municipio_id).with_for_update().first()
+    novos = {a.sha256: a.tamanho for a in arquivos}
+    if not novos:
+        return
+    existentes = {
+        sha for (sha,) in db.query(TramiteAnexo.sha256).filter(
+            TramiteAnexo.municipio_id == municipio_id, TramiteAnexo.sha256.in_(list(novos))
+        ).distinct()
+    }
+    acrescimo = sum(t for sha, t in novos.items() if sha not in existentes)
+    if not acrescimo:
+        return
+    cota = cota_bytes(db, municipio_id)
+    uso = uso_bytes(db, municipio_id)
+    if uso + acrescimo > cota:
+        raise AnexoInvalido(
+            f"Cota de anexos do município esgotada: {_mb(uso)} de {_mb(cota)} em uso, "
+            f"os anexos somam {_mb(acrescimo)}",
+            status_code=413,
+        )
+
+
+# ------------------------------------------------------------
+# Download
+# ------------------------------------------------------------
+
+def resposta_anexo(request: Request, anexo: TramiteAnexo, download: bool = False) -> Response:
+    """Envia o anexo com ETag = SHA-256 (conteúdo imutável) e suporte a Range."""
+    if X_ACCEL_PREFIXO:
+        disposicao = "attachment" if download else "inline"
+        headers = {
+            "X-Accel-Redirect": f"{X_ACCEL_PREFIXO}/{anexo.sha256[:2]}/{anexo.sha256}",
+            "Content-Type": anexo.media_type,
+            "Content-Disposition": f"{disposicao}; filename*=utf-8''{quote(anexo.nome)}",
+            "ETag": f'"{anexo.sha256}"',
+            "Cache-Control": "private, max-age=86400",
+        }
+        return Response(headers=headers)
+    return cached_file_response(
+        request, caminho_blob(anexo.sha256), anexo.sha256, anexo.media_type,
+        filename=anexo.nome if download else None, max_age=86400,
+    )
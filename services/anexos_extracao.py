@@ -0,0 +1,101 @@
+"""
+Miniatura da primeira página e texto dos anexos.
+
+Roda nos processos do pool de services/anexos_tarefas.py, nunca numa
+requisição: recebe dados simples (caminhos, media type) e devolve um dict.
+PDFs são abertos com PyMuPDF; imagens com Pillow (sem OCR: só miniatura).
+"""
+
+import os
+import tempfile
+
+import pymupdf
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+LIMITE_TEXTO = 500_000  # caracteres extraídos por anexo
+
+
+class ErroPermanente(Exception):
+    """Arquivo que nunca vai ser processado (corrompido, protegido por senha...): sem novas tentativas."""
+
+
+def processar_anexo(dados: dict) -> dict:
+    """
+    dados: {caminho, media_type, miniatura (caminho do PNG a gravar), largura}.
+    Devolve {"miniatura": bool, "texto": str}.
+    """
+    if dados["media_type"] == "application/pdf":
+        return _pdf(dados)
+    return _imagem(dados)
+
+
+def _pdf(dados: dict) -> dict:
+    try:
+        doc = pymupdf.open(dados["caminho"], filetype="pdf")
+    except (pymupdf.FileDataError, RuntimeError) as exc:
+        raise ErroPermanente("PDF ilegível ou corrompido") from exc
+    with doc:
+        if doc.needs_pass:
+            raise ErroPermanente("PDF protegido por senha")
+        if doc.page_count == 0:
+            raise ErroPermanente("PDF sem páginas")
+        pagina = doc[0]
+        escala = dados["largura"] / max(pagina.rect.width, 1)
+        png = pagina.get_pixmap(matrix=pymupdf.Matrix(escala, escala), alpha=False).tobytes("png")
+        _gravar(dados["miniatura"], png)
+
+        partes, total = [], 0
+        for pagina in doc:
+            trecho = pagina.get_text("text").replace("\x00", "").strip()  # NUL não entra em TEXT do PostgreSQL
+            if trecho:
+                partes.append(trecho)
+                total += len(trecho)
+                if total >= LIMITE_TEXTO:
+                    break
+    return {"miniatura": True, "texto": "\n".join(partes)[:LIMITE_TEXTO]}
+
+
+def _imagem(dados: dict) -> dict:
+    largura = dados["largura"]
+    try:
+        with Image.open(dados["caminho"]) as original:
+            original.draft("RGB", (largura, largura * 2))  # JPEG: decodifica já reduzido
+            img = ImageOps.exif_transpose(original)
+            img.thumbnail((largura, largura * 2))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise ErroPermanente("Imagem ilegível ou corrompida") from exc
+    tmp = _temporario(dados["miniatura"])
+    try:
+        img.save(tmp, format="PNG", optimize=True)
+        os.replace(tmp, dados["miniatura"])
+    except BaseException:
+        _remover(tmp)
+        raise
+    return {"miniatura": True, "texto": ""}
+
+
+def _temporario(destino: str) -> str:
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    os.close(fd)
+    return tmp
+
+
+def _gravar(destino: str, dados: bytes) -> None:
+    tmp = _temporario(destino)
+    try:
+        with open(tmp, "wb") as arq:
+            arq.write(dados)
+        os.replace(tmp, destino)
+    except BaseException:
+        _remover(tmp)
+        raise
+
+
+def _remover(caminho: str) -> None:
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
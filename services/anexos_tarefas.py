@@ -0,0 +1,343 @@
+"""
+Processamento em segundo plano dos anexos: miniatura da primeira página e
+texto para a busca de processos.
+
+A fila é a tabela tarefas_anexos (TarefaAnexo), gravada na mesma transação
+da tramitação que trouxe os anexos; nenhuma renderização acontece na
+requisição. Tipos de tarefa:
+- "extrair" (uma por conteúdo, chave = SHA-256): roda
+  services/anexos_extracao.py num pool de processos (spawn), grava a
+  miniatura em disco e o texto na tarefa e reindexa os processos que têm o
+  conteúdo;
+- "indexar" (chave = id do processo): junta o texto já extraído dos anexos
+  do processo em processos.texto_anexos (usado nas pesquisas da caixa).
+
+Cada worker da aplicação roda uma thread que busca tarefas vencidas com
+SELECT ... FOR UPDATE SKIP LOCKED (vários workers não pegam a mesma), marca
+como "processando" e executa. Falhas voltam para "pendente" com espera
+exponencial (INTERVALO_BASE * 2^(tentativas-1), até INTERVALO_MAXIMO) e
+viram "falhou" depois de MAX_TENTATIVAS ou quando o arquivo é inválido
+(ErroPermanente). Tarefas "processando" há mais de TEMPO_ABANDONO segundos
+(worker reiniciado no meio) são retomadas.
+
+Configuração por variável de ambiente:
+    SIGEIN_ANEXOS_TAREFAS     0 desliga a thread neste processo (padrão: 1);
+                              `python -m services.anexos_tarefas` roda só a fila
+    SIGEIN_ANEXOS_PROCESSOS   processos do pool (padrão: 1)
+    SIGEIN_ANEXOS_TIMEOUT     segundos por anexo (padrão: 120)
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import Processo, TarefaAnexo, Tramite, TramiteAnexo
+from services.anexos import caminho_blob, caminho_miniatura
+from services.anexos_extracao import ErroPermanente, processar_anexo
+
+logger = logging.getLogger(__name__)
+
+ATIVO = os.getenv("SIGEIN_ANEXOS_TAREFAS", "1") != "0"
+PROCESSOS = int(os.getenv("SIGEIN_ANEXOS_PROCESSOS", "1"))
+TIMEOUT_SEGUNDOS = float(os.getenv("SIGEIN_ANEXOS_TIMEOUT", "120"))
+
+LARGURA_MINIATURA = 240
+MAX_TENTATIVAS = 5
+INTERVALO_BASE = 30  # segundos até a 2ª tentativa
+INTERVALO_MAXIMO = 3600
+TEMPO_ABANDONO = 600
+INTERVALO_CONSULTA = 10  # segundos entre consultas à fila quando não há aviso
+LIMITE_TEXTO_PROCESSO = 1_000_000  # caracteres em processos.texto_anexos
+LOTE_INDEXACAO = 200
+
+
+# ------------------------------------------------------------
+# Enfileirar (na transação da requisição)
+# ------------------------------------------------------------
+
+def _inserir(db, tarefa: TarefaAnexo) -> bool:
+    """Insere a tarefa num savepoint; False se outra requisição já criou a mesma (tipo, chave)."""
+    try:
+        with db.begin_nested():
+            db.add(tarefa)
+        return True
+    except IntegrityError:
+        return False
+
+
+def _agendar(db, tipo: str, chave: str, media_type: str | None = None) -> None:
+    tarefa = db.query(TarefaAnexo).filter(TarefaAnexo.tipo == tipo, TarefaAnexo.chave == chave).first()
+    if tarefa is None:
+        if _inserir(db, TarefaAnexo(tipo=tipo, chave=chave, media_type=media_type)):
+            return
+        tarefa = db.query(TarefaAnexo).filter(TarefaAnexo.tipo == tipo, TarefaAnexo.chave == chave).first()
+    if tipo == "indexar" and tarefa.status != "pendente":
+        # Reagenda (inclusive se está "processando": a execução em curso não a conclui)
+        tarefa.status = "pendente"
+        tarefa.tentativas = 0
+        tarefa.erro = None
+        tarefa.proxima_tentativa_at = datetime.utcnow()
+
+
+def enfileirar(db, processo_id: int, arquivos) -> None:
+    """
+    Tarefas dos anexos recém-recebidos (services/anexos.ArquivoRecebido): extração
+    de cada conteúdo ainda não conhecido e indexação do processo. Chamar antes do
+    commit da tramitação; a fila é avisada com `avisar()` depois do commit.
+    """
+    if not arquivos:
+        return
+    for arquivo in {a.sha256: a for a in arquivos}.values():
+        _agendar(db, "extrair", arquivo.sha256, arquivo.media_type)
+    _agendar(db, "indexar", str(processo_id))
+
+
+# ------------------------------------------------------------
+# Pool de processos
+# ------------------------------------------------------------
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESSOS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ------------------------------------------------------------
+# Execução
+# ------------------------------------------------------------
+
+def _reservar(db, limite: int) -> list[TarefaAnexo]:
+    """Tarefas vencidas (ou abandonadas), marcadas como "processando" e já confirmadas."""
+    agora = datetime.utcnow()
+    tarefas = (
+        db.query(TarefaAnexo)
+        .filter(or_(
+            and_(TarefaAnexo.status == "pendente", TarefaAnexo.proxima_tentativa_at <= agora),
+            and_(
+                TarefaAnexo.status == "processando",
+                TarefaAnexo.iniciada_at < agora - timedelta(seconds=TEMPO_ABANDONO),
+            ),
+        ))
+        .order_by(TarefaAnexo.proxima_tentativa_at, TarefaAnexo.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for tarefa in tarefas:
+        tarefa.status = "processando"
+        tarefa.iniciada_at = agora
+        tarefa.tentativas = (tarefa.tentativas or 0) + 1
+    db.commit()
+    return tarefas
+
+
+def _finalizar(db, tarefa: TarefaAnexo, **campos) -> bool:
+    """Aplica `campos` se a tarefa ainda está na execução reservada (não foi reagendada)."""
+    return db.query(TarefaAnexo).filter(
+        TarefaAnexo.id == tarefa.id,
+        TarefaAnexo.status == "processando",
+        TarefaAnexo.iniciada_at == tarefa.iniciada_at,
+    ).update(campos, synchronize_session=False) > 0
+
+
+def _falhou(db, tarefa: TarefaAnexo, erro: Exception) -> None:
+    mensagem = (str(erro) or erro.__class__.__name__)[:500]
+    if isinstance(erro, ErroPermanente) or tarefa.tentativas >= MAX_TENTATIVAS:
+        _finalizar(db, tarefa, status="falhou", erro=mensagem, concluida_at=datetime.utcnow())
+    else:
+        espera = min(INTERVALO_BASE * 2 ** (tarefa.tentativas - 1), INTERVALO_MAXIMO)
+        _finalizar(
+            db, tarefa, status="pendente", erro=mensagem,
+            proxima_tentativa_at=datetime.utcnow() + timedelta(seconds=espera),
+        )
+    db.commit()
+    logger.warning("Tarefa de anexo %s %s falhou (tentativa %s): %s", tarefa.tipo, tarefa.chave, tarefa.tentativas, mensagem)
+
+
+def _indexar_processos(db, processo_ids: list[int]) -> None:
+    """processos.texto_anexos = texto extraído dos anexos de cada processo (conteúdos distintos, em ordem)."""
+    for inicio in range(0, len(processo_ids), LOTE_INDEXACAO):
+        lote = processo_ids[inicio:inicio + LOTE_INDEXACAO]
+        linhas = (
+            db.query(Tramite.processo_id, TramiteAnexo.sha256, TarefaAnexo.texto)
+            .join(TramiteAnexo, TramiteAnexo.tramite_id == Tramite.id)
+            .join(TarefaAnexo, and_(TarefaAnexo.tipo == "extrair", TarefaAnexo.chave == TramiteAnexo.sha256))
+            .filter(Tramite.processo_id.in_(lote), TarefaAnexo.status == "concluido")
+            .order_by(Tramite.processo_id, Tramite.created_at, TramiteAnexo.ordem)
+            .all()
+        )
+        textos: dict[int, list[str]] = {pid: [] for pid in lote}
+        vistos = set()
+        for pid, sha256, texto in linhas:
+            if texto and (pid, sha256) not in vistos:
+                vistos.add((pid, sha256))
+                textos[pid].append(texto)
+        for pid, partes in textos.items():
+            db.query(Processo).filter(Processo.id == pid).update(
+                {Processo.texto_anexos: "\n".join(partes)[:LIMITE_TEXTO_PROCESSO] or None},
+                synchronize_session=False,
+            )
+
+
+def _processos_com_conteudo(db, sha256: str) -> list[int]:
+    return [
+        pid for (pid,) in db.query(Tramite.processo_id)
+        .join(TramiteAnexo, TramiteAnexo.tramite_id == Tramite.id)
+        .filter(TramiteAnexo.sha256 == sha256)
+        .distinct()
+    ]
+
+
+def _executar_extracoes(db, tarefas: list[TarefaAnexo]) -> None:
+    futuros = []
+    for tarefa in tarefas:
+        dados = {
+            "caminho": caminho_blob(tarefa.chave),
+            "media_type": tarefa.media_type,
+            "miniatura": caminho_miniatura(tarefa.chave),
+            "largura": LARGURA_MINIATURA,
+        }
+        if not os.path.exists(dados["caminho"]):
+            _falhou(db, tarefa, ErroPermanente("Arquivo do anexo não encontrado"))
+            continue
+        try:
+            futuros.append((tarefa, _get_pool().submit(processar_anexo, dados)))
+        except (BrokenProcessPool, RuntimeError) as exc:
+            _descartar_pool()
+            _falhou(db, tarefa, exc)
+
+    for tarefa, futuro in futuros:
+        try:
+            resultado = futuro.result(timeout=TIMEOUT_SEGUNDOS)
+        except FuturesTimeout:
+            futuro.cancel()
+            _descartar_pool()  # o processo travado não volta a receber tarefas
+            _falhou(db, tarefa, TimeoutError(f"Tempo esgotado ({TIMEOUT_SEGUNDOS:.0f}s)"))
+            continue
+        except BrokenProcessPool as exc:
+            _descartar_pool()
+            _falhou(db, tarefa, exc)
+            continue
+        except Exception as exc:
+            _falhou(db, tarefa, exc)
+            continue
+        if _finalizar(
+            db, tarefa, status="concluido", erro=None, concluida_at=datetime.utcnow(),
+            tem_miniatura=resultado["miniatura"], texto=resultado["texto"] or None,
+        ):
+            db.flush()
+            _indexar_processos(db, _processos_com_conteudo(db, tarefa.chave))
+        db.commit()
+
+
+def _executar_indexacao(db, tarefa: TarefaAnexo) -> None:
+    try:
+        _indexar_processos(db, [int(tarefa.chave)])
+        _finalizar(db, tarefa, status="concluido", erro=None, concluida_at=datetime.utcnow())
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        _falhou(db, tarefa, exc)
+
+
+def executar_pendentes(limite: int | None = None) -> int:
+    """Reserva e executa um lote de tarefas vencidas; retorna quantas foram reservadas."""
+    db = SessionLocal()
+    try:
+        tarefas = _reservar(db, limite or max(PROCESSOS * 2, 4))
+        extracoes = [t for t in tarefas if t.tipo == "extrair"]
+        if extracoes:
+            _executar_extracoes(db, extracoes)
+        for tarefa in tarefas:
+            if tarefa.tipo == "indexar":
+                _executar_indexacao(db, tarefa)
+        return len(tarefas)
+    finally:
+        db.close()
+
+
+# ------------------------------------------------------------
+# Thread da fila
+# ------------------------------------------------------------
+
+_aviso = threading.Event()
+_parar = threading.Event()
+_thread: threading.Thread | None = None
+
+
+def _laco() -> None:
+    while not _parar.is_set():
+        try:
+            if executar_pendentes():
+                continue  # pode haver mais: consulta de novo sem esperar
+        except Exception:
+            logger.exception("Falha na fila de processamento de anexos")
+        _aviso.wait(INTERVALO_CONSULTA)
+        _aviso.clear()
+
+
+def iniciar() -> None:
+    """Inicia a thread da fila neste processo (startup da aplicação), se SIGEIN_ANEXOS_TAREFAS permitir."""
+    global _thread
+    if not ATIVO:
+        return
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _parar.clear()
+            _thread = threading.Thread(target=_laco, name="anexos-tarefas", daemon=True)
+            _thread.start()
+
+
+def avisar() -> None:
+    """Acorda a thread deste processo (tarefas novas); os outros workers acham na próxima consulta."""
+    _aviso.set()
+
+
+def encerrar() -> None:
+    """Para a thread e o pool (shutdown da aplicação)."""
+    _parar.set()
+    _aviso.set()
+    _descartar_pool()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    print("Fila de processamento de anexos em execução (Ctrl+C para sair).")
+    try:
+        while True:
+            if not executar_pendentes():
+                time.sleep(INTERVALO_CONSULTA)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _descartar_pool()
+
+
+if __name__ == "__main__":
+    main()
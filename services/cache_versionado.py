@@ -0,0 +1,57 @@
+"""
+Snapshot em memória com versão e TTL, para dados que mudam raramente.
+
+Cada cache guarda um único snapshot, montado por uma função de carga. As
+rotas que gravam os dados chamam `invalidar()`, o que incrementa a versão e
+força a recarga na próxima leitura; o TTL cobre gravações feitas por outro
+processo (deploy com vários workers).
+"""
+
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+TTL_PADRAO = 300  # segundos
+
+
+class CacheVersionado(Generic[T]):
+    """`carregar(db, versao)` monta o snapshot; a versão é a deste processo no início da carga."""
+
+    def __init__(self, carregar: Callable[[Session, int], T], ttl: float = TTL_PADRAO):
+        self._carregar = carregar
+        self._ttl = ttl
+        self._lock = threading.Lock()  # uma carga por vez
+        self._lock_versao = threading.Lock()  # invalidar não espera a carga em andamento
+        self._versao = 0
+        self._entrada: tuple[int, float, T] | None = None  # (versao, carregado_em, snapshot)
+
+    @property
+    def versao(self) -> int:
+        return self._versao
+
+    def _valida(self, entrada) -> bool:
+        return (
+            entrada is not None
+            and entrada[0] == self._versao
+            and time.monotonic() - entrada[1] < self._ttl
+        )
+
+    def obter(self, db: Session) -> T:
+        """Snapshot atual, recarregado se invalidado ou vencido."""
+        entrada = self._entrada
+        if self._valida(entrada):
+            return entrada[2]
+        with self._lock:
+            if not self._valida(self._entrada):
+                # Versão lida antes da consulta: uma invalidação durante a carga força nova recarga
+                versao = self._versao
+                self._entrada = (versao, time.monotonic(), self._carregar(db, versao))
+            return self._entrada[2]
+
+    def invalidar(self) -> None:
+        with self._lock_versao:
+            self._versao += 1
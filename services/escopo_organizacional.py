@@ -0,0 +1,68 @@
+"""
+Escopo organizacional: ancestrais materializados de órgãos e unidades.
+
+A hierarquia administrativa tem profundidade fixa (Estado → Município →
+Órgão → Unidade), então em vez de uma tabela de fechamento cada nó guarda
+os ids dos seus ancestrais em colunas indexadas (orgaos.estado_id;
+unidades.municipio_id e unidades.estado_id). "Todas as unidades do órgão X /
+município Y / estado Z" vira um único filtro indexado em `unidades`, sem
+join com orgaos e municipios.
+
+Os routers de órgãos e unidades chamam `preencher_escopo_unidade()` e
+`propagar_escopo_orgao()` antes do commit; migrate_escopo_organizacional.py
+preenche as linhas já existentes.
+"""
+
+from sqlalchemy.orm import Session
+
+from models import Municipio, Orgao, Unidade
+
+
+def _estado_do_municipio(db: Session, municipio_id: int | None) -> int | None:
+    if not municipio_id:
+        return None
+    return db.query(Municipio.estado_id).filter(Municipio.id == municipio_id).scalar()
+
+
+def preencher_escopo_unidade(db: Session, unidade: Unidade) -> None:
+    """Copia município e estado do órgão da unidade (cadastro ou troca de órgão)."""
+    row = (
+        db.query(Orgao.municipio_id, Orgao.estado_id)
+        .filter(Orgao.id == unidade.orgao_id)
+        .first()
+    )
+    municipio_id, estado_id = row if row else (None, None)
+    unidade.municipio_id = municipio_id
+    unidade.estado_id = estado_id or _estado_do_municipio(db, municipio_id)
+
+
+def propagar_escopo_orgao(db: Session, orgao: Orgao) -> None:
+    """Atualiza o estado do órgão e os ancestrais de todas as suas unidades (um UPDATE)."""
+    orgao.estado_id = _estado_do_municipio(db, orgao.municipio_id)
+    if orgao.id is None:
+        return  # órgão novo ainda não tem unidades
+    db.query(Unidade).filter(Unidade.orgao_id == orgao.id).update(
+        {Unidade.municipio_id: orgao.municipio_id, Unidade.estado_id: orgao.estado_id},
+        synchronize_session=False,
+    )
+
+
+# ------------------------------------------------------------
+# Filtros hierárquicos para as consultas dos routers
+# ------------------------------------------------------------
+
+def condicoes_unidades(
+    orgao_id: int | None = None,
+    municipio_id: int | None = None,
+    estado_id: int | None = None,
+) -> list:
+    """Condições sobre `unidades` para o escopo informado (níveis vazios são ignorados)."""
+    conds = []
+    if orgao_id:
+        conds.append(Unidade.orgao_id == orgao_id)
+    if municipio_id:
+        conds.append(Unidade.municipio_id == municipio_id)
+    if estado_id:
+        conds.append(Unidade.estado_id == estado_id)
+    return conds
+
@@ -0,0 +1,224 @@
+"""
+Eventos da caixa do e-Protocolo em tempo real (Server-Sent Events).
+
+As rotas que mudam a caixa de uma unidade publicam, depois do commit, um
+evento para cada unidade afetada; a tela da caixa mantém um EventSource em
+/eprotocolo/processos/caixa/eventos e, a cada evento, atualiza só os badges
+(/eprotocolo/processos/caixa/contadores) e a lista, sem recarregar a página.
+
+Tipos de evento:
+- "processo_chegou": processo entrou na caixa (criado, tramitado para a unidade, desarquivado);
+- "processo_saiu": processo saiu da caixa (tramitado para outra unidade, arquivado);
+- "contadores": só os badges mudaram (urgência etc.);
+- "recarregar": o cliente ficou para trás e perdeu eventos (fila cheia).
+
+Broker (SIGEIN_EVENTOS_BROKER):
+- "memoria" (padrão): entrega no próprio processo; para um único worker e
+  para uso local/testes;
+- "postgres": NOTIFY no canal CANAL do banco da aplicação; cada worker
+  escuta o canal (LISTEN) numa thread e entrega aos seus assinantes, então
+  vale para vários workers do uvicorn/gunicorn.
+Outro broker pode ser instalado com `definir_broker()` (mesma interface de BrokerMemoria).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CANAL = "sigein_caixa"
+LIMITE_FILA = 100  # eventos pendentes por conexão antes de pedir "recarregar"
+INTERVALO_PING = 25  # segundos; mantém a conexão viva em proxies
+
+
+class Assinatura:
+    """Fila de eventos de uma conexão SSE (vive no event loop que a criou)."""
+
+    def __init__(self, unidade_id: int, loop: asyncio.AbstractEventLoop):
+        self.unidade_id = unidade_id
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=LIMITE_FILA)
+        self._loop = loop
+
+    def entregar(self, evento: dict) -> None:
+        """Chamado de qualquer thread (rotas síncronas, listener do broker)."""
+        try:
+            self._loop.call_soon_threadsafe(self._por, evento)
+        except RuntimeError:
+            pass  # loop encerrado: a conexão já terminou
+
+    def _por(self, evento: dict) -> None:
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: descarta o que está pendente e pede recarga completa
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait({"tipo": "recarregar"})
+
+
+class BrokerMemoria:
+    """Entrega no próprio processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes: dict[int, set[Assinatura]] = {}
+
+    def assinar(self, unidade_id: int) -> Assinatura:
+        assinatura = Assinatura(unidade_id, asyncio.get_running_loop())
+        with self._lock:
+            self._assinantes.setdefault(unidade_id, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura) -> None:
+        with self._lock:
+            assinantes = self._assinantes.get(assinatura.unidade_id)
+            if assinantes is not None:
+                assinantes.discard(assinatura)
+                if not assinantes:
+                    del self._assinantes[assinatura.unidade_id]
+
+    def publicar(self, unidade_id: int, evento: dict) -> None:
+        self._entregar(unidade_id, evento)
+
+    def _entregar(self, unidade_id: int, evento: dict) -> None:
+        with self._lock:
+            alvos = list(self._assinantes.get(unidade_id, ()))
+        for assinatura in alvos:
+            assinatura.entregar(evento)
+
+    def encerrar(self) -> None:
+        pass
+
+
+class BrokerPostgres(BrokerMemoria):
+    """NOTIFY/LISTEN no PostgreSQL: o evento chega a todos os workers, inclusive o que publicou."""
+
+    def __init__(self, engine):
+        super().__init__()
+        self._engine = engine
+        self._parar = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def assinar(self, unidade_id: int) -> Assinatura:
+        self._iniciar()
+        return super().assinar(unidade_id)
+
+    def publicar(self, unidade_id: int, evento: dict) -> None:
+        payload = json.dumps({"unidade_id": unidade_id, "evento": evento}, ensure_ascii=False)
+        with self._engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL, "payload": payload})
+            conn.commit()
+
+    def encerrar(self) -> None:
+        self._parar.set()
+
+    def _iniciar(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._parar.clear()
+                self._thread = threading.Thread(target=self._escutar, name="eventos-caixa", daemon=True)
+                self._thread.start()
+
+    def _escutar(self) -> None:
+        while not self._parar.is_set():
+            bruta = None
+            try:
+                bruta = self._engine.raw_connection()
+                conn = getattr(bruta, "driver_connection", None) or bruta.connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CANAL}")
+                while not self._parar.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        try:
+                            dados = json.loads(aviso.payload)
+                            self._entregar(int(dados["unidade_id"]), dados["evento"])
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning("Evento da caixa inválido: %r", aviso.payload)
+            except Exception:
+                logger.exception("Listener de eventos da caixa caiu; reconectando")
+                time.sleep(2)
+            finally:
+                if bruta is not None:
+                    bruta.invalidate()  # autocommit/LISTEN: não devolve ao pool
+
+
+_lock = threading.Lock()
+_broker = None
+
+
+def get_broker():
+    global _broker
+    with _lock:
+        if _broker is None:
+            if os.getenv("SIGEIN_EVENTOS_BROKER", "memoria") == "postgres":
+                from database import engine
+
+                _broker = BrokerPostgres(engine)
+            else:
+                _broker = BrokerMemoria()
+        return _broker
+
+
+def definir_broker(broker) -> None:
+    """Instala outro broker (ex.: um substituto local em testes)."""
+    global _broker
+    with _lock:
+        anterior, _broker = _broker, broker
+    if anterior is not None:
+        anterior.encerrar()
+
+
+def encerrar() -> None:
+    """Para o listener do broker (shutdown da aplicação)."""
+    with _lock:
+        broker = _broker
+    if broker is not None:
+        broker.encerrar()
+
+
+def publicar(unidades, tipo: str, **dados) -> None:
+    """
+    Publica o evento `tipo` para cada unidade de `unidades` (ignora None e repetidas).
+    Chamar depois do commit; falhas de publicação só vão para o log.
+    """
+    evento = {"tipo": tipo, **dados}
+    for unidade_id in {u for u in unidades if u}:
+        try:
+            get_broker().publicar(unidade_id, evento)
+        except Exception:
+            logger.exception("Falha ao publicar evento da caixa (unidade %s)", unidade_id)
+
+
+async def fluxo_sse(unidade_id: int, desconectado):
+    """
+    Corpo text/event-stream da caixa de `unidade_id`; `desconectado` é o
+    `request.is_disconnected` da conexão.
+    """
+    broker = get_broker()
+    assinatura = broker.assinar(unidade_id)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                evento = await asyncio.wait_for(assinatura.fila.get(), INTERVALO_PING)
+            except asyncio.TimeoutError:
+                if await desconectado():
+                    break
+                yield ": ping\n\n"
+                continue
+            dados = json.dumps(evento, ensure_ascii=False)
+            yield f"event: {evento['tipo']}\ndata: {dados}\n\n"
+    finally:
+        broker.cancelar(assinatura)
@@ -0,0 +1,193 @@
+"""
+Cache em processo da hierarquia Estado → Município → Órgão → Unidade.
+
+As listas em cascata dos formulários (API /api/*, criação e consulta de
+processos, cadastro de usuários) são respondidas a partir deste snapshot,
+carregado com uma consulta por tabela. routers/orgaos.py e routers/units.py
+chamam `invalidate_hierarquia()` após gravar; estados e municípios não são
+editados pela aplicação (carga direta no banco). O TTL de
+services/cache_versionado.py cobre essas cargas e gravações de outro processo.
+
+Municípios, órgãos e unidades inativos ficam no snapshot (com `ativo`), mas
+as listas das cascatas só trazem os ativos.
+"""
+
+import hashlib
+import json
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from models import Estado, Municipio, Orgao, Unidade
+from services.cache_versionado import CacheVersionado
+
+
+class EstadoGeo(NamedTuple):
+    id: int
+    nome: str
+    uf: str
+
+
+class MunicipioGeo(NamedTuple):
+    id: int
+    nome: str
+    estado_id: int
+    ativo: bool
+
+
+class OrgaoGeo(NamedTuple):
+    id: int
+    nome: str
+    sigla: str | None
+    municipio_id: int
+    ativo: bool
+
+
+class UnidadeGeo(NamedTuple):
+    id: int
+    nome: str
+    sigla: str | None
+    orgao_id: int
+    ativo: bool
+
+
+class Hierarquia(NamedTuple):
+    versao: int
+    etag: str
+    estados: list  # EstadoGeo, por nome
+    municipios_por_id: dict
+    orgaos_por_id: dict
+    unidades_por_id: dict
+    municipios_do_estado: dict  # estado_id -> [MunicipioGeo ativos, por nome]
+    orgaos_do_municipio: dict  # municipio_id -> [OrgaoGeo ativos, por nome]
+    unidades_do_orgao: dict  # orgao_id -> [UnidadeGeo ativas, por nome]
+
+
+def _agrupar(itens, chave) -> dict:
+    grupos: dict[int, list] = {}
+    for item in itens:  # já em ordem de nome
+        if item.ativo:
+            grupos.setdefault(getattr(item, chave), []).append(item)
+    return grupos
+
+
+def _carregar(db: Session, versao: int) -> Hierarquia:
+    estados = [
+        EstadoGeo(*r)
+        for r in db.query(Estado.id, Estado.nome, Estado.uf).order_by(Estado.nome)
+    ]
+    municipios = [
+        MunicipioGeo(r[0], r[1], r[2], r[3] is True)
+        for r in db.query(Municipio.id, Municipio.nome, Municipio.estado_id, Municipio.ativo)
+        .order_by(Municipio.nome)
+    ]
+    orgaos = [
+        OrgaoGeo(r[0], r[1], r[2], r[3], r[4] is True)
+        for r in db.query(Orgao.id, Orgao.nome, Orgao.sigla, Orgao.municipio_id, Orgao.ativo)
+        .order_by(Orgao.nome)
+    ]
+    unidades = [
+        UnidadeGeo(r[0], r[1], r[2], r[3], r[4] is True)
+        for r in db.query(Unidade.id, Unidade.nome, Unidade.sigla, Unidade.orgao_id, Unidade.ativo)
+        .order_by(Unidade.nome)
+    ]
+
+    # ETag pelo conteúdo (igual entre workers que carregaram os mesmos dados)
+    digest = hashlib.sha1(
+        json.dumps([estados, municipios, orgaos, unidades], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:16]
+
+    return Hierarquia(
+        versao=versao,
+        etag=digest,
+        estados=estados,
+        municipios_por_id={m.id: m for m in municipios},
+        orgaos_por_id={o.id: o for o in orgaos},
+        unidades_por_id={u.id: u for u in unidades},
+        municipios_do_estado=_agrupar(municipios, "estado_id"),
+        orgaos_do_municipio=_agrupar(orgaos, "municipio_id"),
+        unidades_do_orgao=_agrupar(unidades, "orgao_id"),
+    )
+
+
+_cache = CacheVersionado(_carregar)
+
+
+def get_hierarquia(db: Session) -> Hierarquia:
+    """Retorna o snapshot atual da hierarquia, recarregando se invalidado."""
+    return _cache.obter(db)
+
+
+def invalidate_hierarquia() -> None:
+    """Chamado por routers/orgaos.py e routers/units.py após gravar órgãos e unidades."""
+    _cache.invalidar()
+
+
+# ------------------------------------------------------------
+# Listas prontas para as APIs/templates
+# ------------------------------------------------------------
+
+def estados_json(h: Hierarquia) -> list[dict]:
+    return [{"id": e.id, "nome": e.nome, "uf": e.uf} for e in h.estados]
+
+
+def municipios_json(h: Hierarquia, estado_id: int | None) -> list[dict]:
+    return [{"id": m.id, "nome": m.nome} for m in h.municipios_do_estado.get(estado_id, [])]
+
+
+def orgaos_json(h: Hierarquia, municipio_id: int | None) -> list[dict]:
+    return [{"id": o.id, "nome": o.nome, "sigla": o.sigla} for o in h.orgaos_do_municipio.get(municipio_id, [])]
+
+
+def unidades_json(h: Hierarquia, orgao_id: int | None) -> list[dict]:
+    return [{"id": u.id, "nome": u.nome, "sigla": u.sigla} for u in h.unidades_do_orgao.get(orgao_id, [])]
+
+
+def resolver_caminho(
+    h: Hierarquia,
+    estado_id: int | None = None,
+    municipio_id: int | None = None,
+    orgao_id: int | None = None,
+    unidade_id: int | None = None,
+) -> dict:
+    """Completa os níveis acima do mais profundo informado (ex.: só unidade_id -> órgão, município e estado)."""
+    unidade = h.unidades_por_id.get(unidade_id) if unidade_id else None
+    if unidade:
+        orgao_id = unidade.orgao_id
+    orgao = h.orgaos_por_id.get(orgao_id) if orgao_id else None
+    if orgao:
+        municipio_id = orgao.municipio_id
+    municipio = h.municipios_por_id.get(municipio_id) if municipio_id else None
+    if municipio:
+        estado_id = municipio.estado_id
+    return {
+        "estado_id": estado_id,
+        "municipio_id": municipio.id if municipio else None,
+        "orgao_id": orgao.id if orgao else None,
+        "unidade_id": unidade.id if unidade else None,
+    }
+
+
+def subarvore(h: Hierarquia, caminho: dict) -> list[dict]:
+    """Filhos ativos do nó mais profundo do caminho, aninhados até as unidades ({id, nome, filhos})."""
+    def unidades(orgao_id):
+        return [{"id": u.id, "nome": u.nome} for u in h.unidades_do_orgao.get(orgao_id, [])]
+
+    def orgaos(municipio_id):
+        return [
+            {"id": o.id, "nome": o.nome, "filhos": unidades(o.id)}
+            for o in h.orgaos_do_municipio.get(municipio_id, [])
+        ]
+
+    if caminho["unidade_id"]:
+        return []
+    if caminho["orgao_id"]:
+        return unidades(caminho["orgao_id"])
+    if caminho["municipio_id"]:
+        return orgaos(caminho["municipio_id"])
+    if caminho["estado_id"]:
+        return [
+            {"id": m.id, "nome": m.nome, "filhos": orgaos(m.id)}
+            for m in h.municipios_do_estado.get(caminho["estado_id"], [])
+        ]
+    return []
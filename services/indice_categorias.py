@@ -0,0 +1,172 @@
+"""
+Índice em memória da árvore de categorias do protocolo (Grupo > Assunto > Subassunto).
+
+A busca do formulário de processo roda a cada tecla; em vez de três ILIKE no
+banco, consulta um índice de palavras normalizadas (sem acento, minúsculas)
+de cada caminho, ordenado para busca por prefixo com bisect. Cada palavra
+digitada precisa ser prefixo de alguma palavra do caminho
+("saude fer" encontra "Saúde > Pessoal > Férias").
+
+As rotas de administração de grupos, assuntos e subassuntos chamam
+`invalidate_indice_categorias()` após gravar (services/cache_versionado.py).
+"""
+
+import bisect
+import heapq
+import re
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from models import Assunto, Grupo, Subassunto
+from services.cache_versionado import CacheVersionado
+from services.texto import normalizar
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+class NoCategoria(NamedTuple):
+    label: str  # "Grupo > Assunto > Subassunto"
+    nome_norm: str  # nome do próprio nó, normalizado
+    nivel: int  # 0 = grupo, 1 = assunto, 2 = subassunto
+    grupo_id: int
+    assunto_id: int | None
+    subassunto_id: int | None
+    palavras_proprias: frozenset
+
+
+class IndiceCategorias(NamedTuple):
+    versao: int
+    nos: list  # NoCategoria ativos, na ordem do label
+    chaves: list  # palavras normalizadas, ordenadas
+    posicoes: list  # posição em `nos` de cada chave
+    assuntos_do_grupo: dict  # grupo_id -> [{"id", "nome"}] ativos
+    subassuntos_do_assunto: dict  # assunto_id -> [{"id", "nome"}] ativos
+    grupos: list  # [{"id", "nome"}] ativos
+
+
+def _palavras(texto: str) -> list[str]:
+    return _PALAVRA.findall(normalizar(texto))
+
+
+def _carregar(db: Session, versao: int) -> IndiceCategorias:
+    grupos = [
+        (r[0], r[1])
+        for r in db.query(Grupo.id, Grupo.nome).filter(Grupo.ativo == True).order_by(Grupo.nome)
+    ]
+    nomes_grupo = dict(grupos)
+    assuntos = [
+        (r[0], r[1], r[2])
+        for r in db.query(Assunto.id, Assunto.grupo_id, Assunto.nome)
+        .filter(Assunto.ativo == True)
+        .order_by(Assunto.nome)
+        if r[1] in nomes_grupo
+    ]
+    assunto_por_id = {a[0]: a for a in assuntos}
+    subassuntos = [
+        (r[0], r[1], r[2])
+        for r in db.query(Subassunto.id, Subassunto.assunto_id, Subassunto.nome)
+        .filter(Subassunto.ativo == True)
+        .order_by(Subassunto.nome)
+        if r[1] in assunto_por_id
+    ]
+
+    nos = []
+    for gid, gnome in grupos:
+        nos.append(NoCategoria(gnome, normalizar(gnome), 0, gid, None, None, frozenset(_palavras(gnome))))
+    for aid, gid, anome in assuntos:
+        nos.append(NoCategoria(
+            f"{nomes_grupo[gid]} > {anome}", normalizar(anome), 1, gid, aid, None, frozenset(_palavras(anome)),
+        ))
+    for sid, aid, snome in subassuntos:
+        _, gid, anome = assunto_por_id[aid]
+        nos.append(NoCategoria(
+            f"{nomes_grupo[gid]} > {anome} > {snome}", normalizar(snome), 2, gid, aid, sid,
+            frozenset(_palavras(snome)),
+        ))
+    nos.sort(key=lambda n: (normalizar(n.label), n.nivel))
+
+    entradas = sorted(
+        (palavra, pos)
+        for pos, no in enumerate(nos)
+        for palavra in set(_palavras(no.label))
+    )
+
+    assuntos_do_grupo: dict[int, list] = {}
+    for aid, gid, anome in assuntos:
+        assuntos_do_grupo.setdefault(gid, []).append({"id": aid, "nome": anome})
+    subassuntos_do_assunto: dict[int, list] = {}
+    for sid, aid, snome in subassuntos:
+        subassuntos_do_assunto.setdefault(aid, []).append({"id": sid, "nome": snome})
+
+    return IndiceCategorias(
+        versao=versao,
+        nos=nos,
+        chaves=[e[0] for e in entradas],
+        posicoes=[e[1] for e in entradas],
+        assuntos_do_grupo=assuntos_do_grupo,
+        subassuntos_do_assunto=subassuntos_do_assunto,
+        grupos=[{"id": gid, "nome": gnome} for gid, gnome in grupos],
+    )
+
+
+_cache = CacheVersionado(_carregar)
+
+
+def get_indice_categorias(db: Session) -> IndiceCategorias:
+    """Retorna o índice atual, recarregando se invalidado."""
+    return _cache.obter(db)
+
+
+def invalidate_indice_categorias() -> None:
+    """Chamado pelas rotas de administração de grupos, assuntos e subassuntos após gravar."""
+    _cache.invalidar()
+
+
+def _com_prefixo(idx: IndiceCategorias, prefixo: str) -> set[int]:
+    posicoes = set()
+    i = bisect.bisect_left(idx.chaves, prefixo)
+    while i < len(idx.chaves) and idx.chaves[i].startswith(prefixo):
+        posicoes.add(idx.posicoes[i])
+        i += 1
+    return posicoes
+
+
+def buscar_categorias(idx: IndiceCategorias, termo: str, limite: int = 30) -> list[dict]:
+    """
+    Caminhos cujas palavras começam com cada palavra de `termo`, ordenados por:
+    nome do próprio nó começando pelo termo, todas as palavras no próprio nó,
+    demais (casadas em ancestrais); depois nível e label.
+    """
+    consulta = normalizar(termo)
+    palavras = _PALAVRA.findall(consulta)
+    if not palavras:
+        return []
+
+    candidatos = None
+    for palavra in sorted(set(palavras), key=len, reverse=True):
+        achados = _com_prefixo(idx, palavra)
+        candidatos = achados if candidatos is None else candidatos & achados
+        if not candidatos:
+            return []
+
+    def rank(pos):
+        no = idx.nos[pos]
+        if no.nome_norm.startswith(consulta):
+            faixa = 0
+        elif all(any(p.startswith(q) for p in no.palavras_proprias) for q in palavras):
+            faixa = 1
+        else:
+            faixa = 2
+        return (faixa, no.nivel, pos)
+
+    resultado = []
+    for pos in heapq.nsmallest(limite, candidatos, key=rank):
+        no = idx.nos[pos]
+        resultado.append({
+            "label": no.label,
+            "grupo_id": no.grupo_id,
+            "assunto_id": no.assunto_id,
+            "subassunto_id": no.subassunto_id,
+        })
+    return resultado
@@ -0,0 +1,185 @@
+"""
+Busca de itens por número de tombo / série.
+
+Usa a coluna gerada `Item.busca_numero` (só dígitos para tombo, maiúsculas
+sem pontuação para série), com índice de prefixo e, quando instalado,
+índice trigram (migrate_items_busca_numero.py). A ordem de tentativa é:
+igualdade exata (retorna direto), prefixo e, por fim, trecho.
+"""
+
+import re
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import Item, Product, Unidade
+
+LIMITE_CODIGOS_LOTE = 500
+_MIN_TRECHO = 3  # abaixo disso o trigram não ajuda e o LIKE '%x%' varre a tabela
+
+_SEPARADORES_LOTE = re.compile(r"[\s,;]+")
+
+
+def chave_tombo(raw: str | None) -> str:
+    return re.sub(r"\D", "", raw or "")
+
+
+def chave_serie(raw: str | None) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "", raw or "").upper()
+
+
+def chaves_busca(raw: str | None, is_tombo: bool | None = None) -> list[tuple[bool, str]]:
+    """
+    Pares (é_tombo, chave) para o texto digitado/lido; sem tipo, tenta os dois.
+    A chave de tombo só é comparada com itens de tombo e vice-versa.
+    """
+    pares = []
+    if is_tombo is not False:
+        pares.append((True, chave_tombo(raw)))
+    if is_tombo is not True:
+        pares.append((False, chave_serie(raw)))
+    return [(t, c) for t, c in pares if c]
+
+
+def _condicao(pares: list[tuple[bool, str]], padrao: str = "{}"):
+    """OR de (tipo do item AND chave); `padrao` monta o LIKE ('{}%', '%{}%') ou igualdade."""
+    termos = []
+    for tombo, chave in pares:
+        filtro_tipo = Item.tombo.is_(True) if tombo else Item.tombo.isnot(True)
+        if padrao == "{}":
+            termos.append(and_(filtro_tipo, Item.busca_numero == chave))
+        else:
+            termos.append(and_(filtro_tipo, Item.busca_numero.like(padrao.format(chave))))
+    return or_(*termos)
+
+
+def separar_codigos(texto: str | None) -> list[str]:
+    """Quebra o texto do leitor (linhas, vírgulas, ponto e vírgula) em códigos, sem repetir."""
+    codigos = [c for c in _SEPARADORES_LOTE.split(texto or "") if c]
+    return list(dict.fromkeys(codigos))
+
+
+def _consulta(db: Session, product_id: int | None, is_tombo: bool | None):
+    q = (
+        db.query(
+            Item.id,
+            Item.product_id,
+            Product.name,
+            Item.tombo,
+            Item.num_tombo_ou_serie,
+            Item.busca_numero,
+            Item.unit_id,
+            Unidade.nome,
+        )
+        .join(Product, Product.id == Item.product_id)
+        .outerjoin(Unidade, Unidade.id == Item.unit_id)
+    )
+    if product_id:
+        q = q.filter(Item.product_id == product_id)
+    if is_tombo is not None:
+        q = q.filter(Item.tombo == is_tombo)
+    return q
+
+
+def _linha(row) -> dict:
+    return {
+        "id": row[0],
+        "product_id": row[1],
+        "product_name": row[2],
+        "tombo": row[3],
+        "num": row[4],
+        "unit_id": row[6],
+        "unit_name": row[7],
+    }
+
+
+def buscar_itens(
+    db: Session,
+    termo: str | None,
+    product_id: int | None = None,
+    is_tombo: bool | None = None,
+    limite: int = 20,
+) -> list[dict]:
+    pares = chaves_busca(termo, is_tombo)
+    if not pares:
+        rows = _consulta(db, product_id, is_tombo).order_by(Item.busca_numero, Item.id).limit(limite).all()
+        return [_linha(r) for r in rows]
+
+    exatos = (
+        _consulta(db, product_id, is_tombo)
+        .filter(_condicao(pares))
+        .order_by(Item.busca_numero, Item.id)
+        .limit(limite)
+        .all()
+    )
+    if exatos:
+        return [_linha(r) for r in exatos]
+
+    encontrados = (
+        _consulta(db, product_id, is_tombo)
+        .filter(_condicao(pares, "{}%"))
+        .order_by(Item.busca_numero, Item.id)
+        .limit(limite)
+        .all()
+    )
+
+    trechos = [(t, c) for t, c in pares if len(c) >= _MIN_TRECHO]
+    if len(encontrados) < limite and trechos:
+        q = _consulta(db, product_id, is_tombo).filter(_condicao(trechos, "%{}%"))
+        if encontrados:
+            q = q.filter(~Item.id.in_([r[0] for r in encontrados]))
+        encontrados += (
+            q.order_by(Item.busca_numero, Item.id)
+            .limit(limite - len(encontrados))
+            .all()
+        )
+
+    return [_linha(r) for r in encontrados]
+
+
+def resolver_codigos(
+    db: Session,
+    codigos: list[str],
+    is_tombo: bool | None = None,
+) -> tuple[list[dict], list[str]]:
+    """
+    Resolve vários códigos lidos de uma vez (uma consulta por igualdade na chave).
+    Retorna (encontrados, nao_encontrados); cada encontrado traz o `codigo` lido.
+    """
+    codigos = codigos[:LIMITE_CODIGOS_LOTE]
+    pares_do_codigo = {c: chaves_busca(c, is_tombo) for c in codigos}
+    chaves_tombo = {k for pares in pares_do_codigo.values() for t, k in pares if t}
+    chaves_serie = {k for pares in pares_do_codigo.values() for t, k in pares if not t}
+    if not chaves_tombo and not chaves_serie:
+        return [], list(codigos)
+
+    condicoes = []
+    if chaves_tombo:
+        condicoes.append(and_(Item.tombo.is_(True), Item.busca_numero.in_(chaves_tombo)))
+    if chaves_serie:
+        condicoes.append(and_(Item.tombo.isnot(True), Item.busca_numero.in_(chaves_serie)))
+
+    por_chave: dict[tuple[bool, str], list] = {}
+    rows = (
+        _consulta(db, None, is_tombo)
+        .filter(or_(*condicoes))
+        .order_by(Item.id)
+        .all()
+    )
+    for r in rows:
+        por_chave.setdefault((bool(r[3]), r[5]), []).append(r)
+
+    encontrados, nao_encontrados = [], []
+    for codigo, pares in pares_do_codigo.items():
+        vistos = set()
+        achou = False
+        for par in pares:
+            for r in por_chave.get(par, []):
+                if r[0] in vistos:
+                    continue
+                vistos.add(r[0])
+                achou = True
+                encontrados.append({"codigo": codigo, **_linha(r)})
+        if not achou:
+            nao_encontrados.append(codigo)
+    return encontrados, nao_encontrados
@@ -1,56 +1,116 @@
-"""Dados compartilhados para o formulário de movimentação (página e modal)."""
+"""
+Dados compartilhados para o formulário de movimentação (página e modal).
 
+A página recebe só as listas pequenas (unidades e categorias). O esqueleto
+produto/tipo/categoria é servido à parte como JSON versionado (ETag) e as
+unidades de origem são buscadas sob demanda, por tipo selecionado.
+
+O esqueleto fica em memória (services/cache_versionado.py): o router de
+produtos chama `invalidate_movement_products()` após gravar, e os nomes dos
+tipos vêm do snapshot de services/reference_data.py — se ele mudar, o
+esqueleto é remontado.
+"""
+
+import hashlib
+import json
+
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 
-from models import Product, Stock, Item, Category, Unidade
+from models import Item, Product, Stock, Unidade
+from services.cache_versionado import CacheVersionado
+from services.reference_data import get_reference_data
 
 
 def build_movement_form_context(db: Session) -> dict:
-    products = db.query(Product).all()
     units = db.query(Unidade).order_by(Unidade.nome).all()
-    categories = db.query(Category).all()
-
-    products_js = []
-    for p in products:
-        units_options = []
-        units_set = set()
-
-        if p.controla_por_serie:
-            for item in p.items:
-                if item.unit_id and item.unit_id not in units_set and item.unit:
-                    units_options.append({
-                        "unit_id": item.unit.id,
-                        "unit_name": item.unit.nome,
-                    })
-                    units_set.add(item.unit_id)
-        else:
-            stocks = (
-                db.query(Stock)
-                .filter(Stock.product_id == p.id, Stock.quantidade > 0)
-                .all()
-            )
-            for s in stocks:
-                if s.unit_id and s.unit_id not in units_set and s.unit:
-                    units_options.append({"unit_id": s.unit.id, "unit_name": s.unit.nome})
-                    units_set.add(s.unit_id)
-            items = db.query(Item).filter(Item.product_id == p.id).all()
-            for i in items:
-                if i.unit_id and i.unit_id not in units_set and i.unit:
-                    units_options.append({"unit_id": i.unit.id, "unit_name": i.unit.nome})
-                    units_set.add(i.unit_id)
-
-        products_js.append({
-            "id": p.id,
-            "name": p.name,
-            "type_id": p.type_id,
-            "type_name": p.type.nome if p.type else None,
-            "category_id": p.category_id,
-            "controla_por_serie": p.controla_por_serie,
-            "units_options": units_options,
-        })
-
+    categories = get_reference_data(db).categorias
     return {
-        "products": products_js,
         "units": units,
         "categories": categories,
     }
+
+
+def _carregar_esqueleto(db: Session, versao: int) -> dict:
+    """Lista produto -> tipo -> categoria numa única consulta (nomes dos tipos do reference_data)."""
+    ref = get_reference_data(db)
+    rows = (
+        db.query(
+            Product.id,
+            Product.name,
+            Product.type_id,
+            Product.category_id,
+            Product.controla_por_serie,
+        )
+        .order_by(Product.id)
+        .all()
+    )
+    products = [
+        {
+            "id": r[0],
+            "name": r[1],
+            "type_id": r[2],
+            "type_name": ref.tipos_por_id[r[2]].nome if r[2] in ref.tipos_por_id else None,
+            "category_id": r[3],
+            "controla_por_serie": r[4],
+        }
+        for r in rows
+    ]
+    etag = hashlib.sha1(
+        json.dumps(products, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:16]
+    return {"ref_etag": ref.etag, "payload": {"versao": etag, "products": products}}
+
+
+_cache_esqueleto = CacheVersionado(_carregar_esqueleto)
+
+
+def build_movement_products_skeleton(db: Session) -> dict:
+    """
+    Esqueleto {versao, products} em cache; `versao` é um hash do conteúdo e
+    serve de ETag para o navegador (igual entre workers com os mesmos dados).
+    """
+    esqueleto = _cache_esqueleto.obter(db)
+    if esqueleto["ref_etag"] != get_reference_data(db).etag:  # tipo renomeado depois da carga
+        _cache_esqueleto.invalidar()
+        esqueleto = _cache_esqueleto.obter(db)
+    return esqueleto["payload"]
+
+
+def invalidate_movement_products() -> None:
+    """Chamado pelo router de produtos após cadastrar, editar ou excluir."""
+    _cache_esqueleto.invalidar()
+
+
+def build_unit_options(db: Session, type_id: int, product_id: int | None = None) -> list[dict]:
+    """
+    Unidades de origem possíveis para o tipo (ou só para um produto):
+    onde há itens físicos ou, para produtos sem série, saldo positivo.
+    """
+    filtro_produto = [Product.type_id == type_id]
+    if product_id:
+        filtro_produto.append(Product.id == product_id)
+
+    com_itens = (
+        db.query(Item.unit_id)
+        .join(Product, Product.id == Item.product_id)
+        .filter(*filtro_produto)
+    )
+    com_saldo = (
+        db.query(Stock.unit_id)
+        .join(Product, Product.id == Stock.product_id)
+        .filter(
+            *filtro_produto,
+            or_(Product.controla_por_serie.is_(False), Product.controla_por_serie.is_(None)),
+            Stock.quantidade > 0,
+        )
+    )
+    unit_ids = com_itens.union(com_saldo).subquery()
+
+    rows = (
+        db.query(Unidade.id, Unidade.nome)
+        .filter(Unidade.id.in_(select(unit_ids.c[0])))
+        .order_by(Unidade.nome)
+        .all()
+    )
+    return [{"unit_id": r[0], "unit_name": r[1]} for r in rows]
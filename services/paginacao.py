@@ -0,0 +1,165 @@
+"""
+Paginação por cursor (keyset) das listas do e-Protocolo.
+
+Em vez de OFFSET (que lê e descarta todas as linhas anteriores), cada página
+parte da chave de ordenação (data, id) do último/primeiro item da página
+vizinha: `(chave, id) < (cursor)` para avançar e `>` para voltar, sempre
+pelo índice. As primeiras PAGINAS_NUMERADAS páginas continuam acessíveis
+por número (OFFSET pequeno); "última" lê do fim da ordenação.
+
+O total vem dos contadores que a tela já calcula (badges da caixa) ou de uma
+contagem limitada a LIMITE_CONTAGEM linhas; acima disso a tela mostra
+"mais de N".
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+from sqlalchemy import func, select, tuple_
+
+PAGINAS_NUMERADAS = 5
+LIMITE_CONTAGEM = 10000
+
+
+class Pagina(NamedTuple):
+    itens: list
+    numero: int | None  # None quando a posição não é conhecida
+    por_pagina: int
+    primeiro: str | None  # cursor do primeiro item (para voltar)
+    ultimo: str | None  # cursor do último item (para avançar)
+    tem_anterior: bool
+    tem_proxima: bool
+
+
+def _cursor(valor, id_) -> str:
+    v = valor.isoformat() if isinstance(valor, datetime) else valor
+    bruto = json.dumps([v, id_], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii").rstrip("=")
+
+
+def _ler_cursor(cursor: str | None):
+    """(valor, id) do cursor, ou None se ausente/inválido (a tela volta à primeira página)."""
+    if not cursor:
+        return None
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, id_ = json.loads(bruto)
+        if isinstance(valor, str):
+            valor = datetime.fromisoformat(valor)
+        return valor, int(id_)
+    except (ValueError, TypeError):
+        return None
+
+
+def paginar(
+    q,
+    chave,
+    coluna_id,
+    por_pagina: int,
+    pagina: int | None = None,
+    apos: str | None = None,
+    antes: str | None = None,
+    ultima: bool = False,
+    total: int | None = None,
+) -> Pagina:
+    """
+    Página de `q` em ordem decrescente de (chave, id).
+
+    - `apos`: página seguinte ao cursor; `antes`: página anterior ao cursor;
+    - `ultima`: última página (com `total` exato, alinhada às páginas numeradas);
+    - sem cursor: página `pagina` por OFFSET (usado nas primeiras páginas).
+    Com cursor, `pagina` é só o número exibido (None quando desconhecido).
+    """
+    q = q.add_columns(chave.label("_chave"), coluna_id.label("_id"))
+    desc = (chave.desc(), coluna_id.desc())
+    asc = (chave.asc(), coluna_id.asc())
+
+    pos_apos, pos_antes = _ler_cursor(apos), _ler_cursor(antes)
+    if pos_apos:
+        rows = q.filter(tuple_(chave, coluna_id) < tuple_(*pos_apos)).order_by(*desc).limit(por_pagina + 1).all()
+        tem_anterior, tem_proxima = True, len(rows) > por_pagina
+        rows = rows[:por_pagina]
+        numero = pagina
+    elif pos_antes or ultima:
+        tamanho = por_pagina
+        if ultima:
+            if total:
+                tamanho = total % por_pagina or por_pagina
+            rows = q.order_by(*asc).limit(tamanho + 1).all()
+        else:
+            rows = q.filter(tuple_(chave, coluna_id) > tuple_(*pos_antes)).order_by(*asc).limit(tamanho + 1).all()
+        tem_anterior, tem_proxima = len(rows) > tamanho, not ultima
+        rows = list(reversed(rows[:tamanho]))
+        if ultima:
+            numero = ((total + por_pagina - 1) // por_pagina) if total else None
+        else:
+            numero = pagina
+        if not tem_anterior:
+            numero = 1
+    else:
+        pagina = pagina or 1
+        rows = q.order_by(*desc).offset((pagina - 1) * por_pagina).limit(por_pagina + 1).all()
+        tem_anterior, tem_proxima = pagina > 1, len(rows) > por_pagina
+        rows = rows[:por_pagina]
+        numero = pagina
+
+    return Pagina(
+        itens=[r[0] for r in rows],
+        numero=numero,
+        por_pagina=por_pagina,
+        primeiro=_cursor(rows[0]._chave, rows[0]._id) if rows else None,
+        ultimo=_cursor(rows[-1]._chave, rows[-1]._id) if rows else None,
+        tem_anterior=tem_anterior,
+        tem_proxima=tem_proxima,
+    )
+
+
+def contar_limitado(q, limite: int = LIMITE_CONTAGEM) -> tuple[int, bool]:
+    """(total, exato): conta no máximo `limite` + 1 linhas; acima disso o total é só um piso."""
+    sub = q.with_entities(q.column_descriptions[0]["expr"]).order_by(None).limit(limite + 1).subquery()
+    n = q.session.execute(select(func.count()).select_from(sub)).scalar() or 0
+    return (min(n, limite), n <= limite)
+
+
+def navegacao(pag: Pagina, total: int, exato: bool, params: dict) -> dict:
+    """
+    URLs e textos da barra de paginação: primeira/anterior/próxima/última,
+    páginas numeradas iniciais e o "mostrando de X até Y de Z".
+    `params` são os demais parâmetros da tela (aba, pesquisa, por_pagina...).
+    """
+    base = {k: v for k, v in params.items() if v not in (None, "")}
+
+    def url(**extra) -> str:
+        return "?" + urlencode({**base, **extra})
+
+    ultima_pagina = ((total + pag.por_pagina - 1) // pag.por_pagina or 1) if exato else None
+    numero = pag.numero
+    if pag.tem_anterior:
+        if numero and numero - 1 <= PAGINAS_NUMERADAS:
+            anterior = url(pagina=numero - 1)
+        else:
+            anterior = url(antes=pag.primeiro, **({"pagina": numero - 1} if numero else {}))
+    else:
+        anterior = None
+    proxima = url(apos=pag.ultimo, **({"pagina": numero + 1} if numero else {})) if pag.tem_proxima else None
+
+    limite_numeradas = min(PAGINAS_NUMERADAS, ultima_pagina or PAGINAS_NUMERADAS)
+    if numero and not exato and not pag.tem_proxima:
+        limite_numeradas = min(limite_numeradas, numero)
+
+    inicio = ((numero - 1) * pag.por_pagina + 1) if numero and pag.itens else 0
+    return {
+        "primeira": url(pagina=1) if pag.tem_anterior else None,
+        "anterior": anterior,
+        "proxima": proxima,
+        "ultima": url(ultima=1) if pag.tem_proxima else None,
+        "paginas": [(n, url(pagina=n)) for n in range(1, limite_numeradas + 1)],
+        "numero": numero,
+        "ultima_pagina": ultima_pagina,
+        "inicio": inicio,
+        "fim": (inicio + len(pag.itens) - 1) if inicio else len(pag.itens),
+        "total": total if exato else f"mais de {total}",
+    }
@@ -0,0 +1,106 @@
+"""
+Cache em disco de PDFs gerados, com limite de tamanho e descarte LRU.
+
+Cada entrada é um arquivo `<prefixo>_<hash da chave>.pdf` no diretório do
+cache; o mtime do arquivo marca o último uso (atualizado a cada leitura),
+então o descarte remove os menos usados até o total caber no limite. A
+gravação é atômica (arquivo temporário + os.replace), o que permite vários
+workers compartilharem o mesmo diretório.
+
+Configuração por variável de ambiente:
+    SIGEIN_PDF_CACHE_DIR  diretório (padrão: cache/pdf)
+    SIGEIN_PDF_CACHE_MB   tamanho máximo em MB (padrão: 256)
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.getenv("SIGEIN_PDF_CACHE_DIR", os.path.join("cache", "pdf"))
+LIMITE_BYTES = int(os.getenv("SIGEIN_PDF_CACHE_MB", "256")) * 1024 * 1024
+
+_lock = threading.Lock()
+
+
+def etag_da_chave(chave: tuple) -> str:
+    """Hash estável da chave (também usado como ETag da resposta)."""
+    return hashlib.sha1(repr(chave).encode("utf-8")).hexdigest()[:20]
+
+
+def _caminho(prefixo: str, chave: tuple) -> str:
+    return os.path.join(CACHE_DIR, f"{prefixo}_{etag_da_chave(chave)}.pdf")
+
+
+def obter(prefixo: str, chave: tuple) -> str | None:
+    """Caminho do PDF em cache para a chave, ou None; marca o arquivo como usado."""
+    caminho = _caminho(prefixo, chave)
+    try:
+        os.utime(caminho)
+    except FileNotFoundError:
+        return None
+    return caminho
+
+
+def gravar(prefixo: str, chave: tuple, dados: bytes) -> str:
+    """
+    Grava o PDF da chave e remove as versões anteriores do mesmo prefixo
+    (ex.: o PDF do processo antes da última tramitação). Retorna o caminho.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho = _caminho(prefixo, chave)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as arq:
+            arq.write(dados)
+        os.replace(tmp, caminho)
+    except BaseException:
+        _remover(tmp)
+        raise
+
+    nome = os.path.basename(caminho)
+    for entrada in os.scandir(CACHE_DIR):
+        if entrada.name.startswith(f"{prefixo}_") and entrada.name != nome and entrada.name.endswith(".pdf"):
+            _remover(entrada.path)
+    podar()
+    return caminho
+
+
+def _remover(caminho: str) -> None:
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def podar(limite_bytes: int | None = None) -> int:
+    """Remove os arquivos menos usados até o cache caber no limite; retorna quantos removeu."""
+    limite = LIMITE_BYTES if limite_bytes is None else limite_bytes
+    with _lock:
+        try:
+            entradas = [e for e in os.scandir(CACHE_DIR) if e.is_file()]
+        except FileNotFoundError:
+            return 0
+        arquivos = []
+        agora = time.time()
+        for e in entradas:
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            if e.name.endswith(".tmp"):
+                if agora - st.st_mtime > 3600:  # sobra de gravação interrompida
+                    _remover(e.path)
+                continue
+            arquivos.append((st.st_mtime, st.st_size, e.path))
+
+        total = sum(a[1] for a in arquivos)
+        removidos = 0
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= limite:
+                break
+            _remover(caminho)
+            total -= tamanho
+            removidos += 1
+        return removidos
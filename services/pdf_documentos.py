@@ -0,0 +1,167 @@
+"""
+Documentos PDF do sistema (ReportLab), gerados a partir de dados simples.
+
+As funções deste módulo recebem só dicts/listas/strings e devolvem bytes,
+porque rodam nos processos de services/pdf_render.py: nada de objetos ORM,
+sessão ou importação de models/database aqui (o processo filho importa
+apenas este módulo).
+"""
+
+import re
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+def _html_para_texto(raw: str) -> str:
+    """Converte HTML para texto seguro para Paragraph do ReportLab."""
+    texto = raw or ""
+    texto = re.sub(r"<[^>]+>", " ", texto).replace("&nbsp;", " ").strip()
+    texto = texto.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return texto.replace("\n", "<br/>") if texto else "-"
+
+
+def _quadro_cabecalho(linhas, styles) -> Table:
+    """Retorna uma Table com borda contendo campos rotulo:valor em linhas."""
+    data = [[Paragraph(f"<b>{r}</b>", styles["Normal"]), Paragraph(v or "-", styles["Normal"])] for r, v in linhas]
+    t = Table(data, colWidths=[4*cm, None])
+    t.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#495057")),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#dee2e6")),
+        ("BACKGROUND", (0, 0), (0, -1), colors.HexColor("#e9ecef")),
+        ("PADDING", (0, 0), (-1, -1), 8),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+    ]))
+    return t
+
+
+def _quadro_conteudo(texto: str, styles) -> Table:
+    """Retorna uma Table com borda para bloco de conteúdo/despacho."""
+    p = Paragraph(texto, styles["Normal"])
+    t = Table([[p]], colWidths=[None])
+    t.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#495057")),
+        ("PADDING", (0, 0), (-1, -1), 12),
+        ("BACKGROUND", (0, 0), (-1, -1), colors.white),
+    ]))
+    return t
+
+
+def _bloco_assinatura(assinatura: dict, styles) -> list:
+    """Retorna elementos do bloco de assinatura eletrônica ({nome, cargo, data_hora})."""
+    nome_upper = (assinatura.get("nome") or "-").upper()
+    cargo_upper = (assinatura.get("cargo") or "-").upper()
+    data_hora = assinatura.get("data_hora")
+    # Formato: Assinatura eletrônica: DD/MM/YYYY HH:MM:SS
+    assinatura_str = f"Assinatura eletrônica: {data_hora}" if data_hora else "Assinatura eletrônica: -"
+    return [
+        Spacer(1, 16),
+        Paragraph(f"<b>{nome_upper}</b>", ParagraphStyle(
+            name="AssinaturaNome", parent=styles["Normal"], fontSize=11, spaceAfter=4
+        )),
+        Paragraph(f"<b>{cargo_upper}</b>", ParagraphStyle(
+            name="AssinaturaCargo", parent=styles["Normal"], fontSize=11, spaceAfter=4
+        )),
+        Paragraph(assinatura_str, ParagraphStyle(
+            name="AssinaturaData", parent=styles["Normal"], fontSize=9, textColor="gray"
+        )),
+    ]
+
+
+def documento_processo(dados: dict) -> bytes:
+    """
+    PDF do processo: cada movimentação em sua própria página, com cabeçalho e
+    campos em quadros. `dados` vem de services/processo_pdf.dados_pdf_processo().
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4,
+        rightMargin=1.5*cm, leftMargin=1.5*cm,
+        topMargin=1.5*cm, bottomMargin=1.5*cm,
+        invariant=True,  # mesmos dados -> mesmos bytes (ETag forte, Range)
+    )
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="BoxTitle", parent=styles["Heading2"], fontSize=11, spaceAfter=6))
+    normal = styles["Normal"]
+    numero = dados["numero"]
+    criacao = dados["criacao"]
+
+    story = []
+
+    # ---------- PÁGINA 1: CRIAÇÃO ----------
+    story.append(Paragraph(f"<b>PROCESSO {numero}</b> — Criação", ParagraphStyle(
+        name="TituloPag", parent=normal, fontSize=14, spaceAfter=12, alignment=1
+    )))
+    story.append(Spacer(1, 8))
+
+    cab_criacao = [
+        ("Assunto", dados.get("assunto") or "Sem assunto"),
+        ("Requerente", dados.get("requerente") or "-"),
+        ("Origem", criacao["origem"]),
+        ("Destino", criacao["origem"]),  # na criação, destino = origem
+        ("Data/Hora", criacao["data"]),
+        ("Por", criacao["por"]),
+    ]
+    story.append(_quadro_cabecalho(cab_criacao, styles))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph("<b>Conteúdo</b>", normal))
+    story.append(Spacer(1, 4))
+    story.append(_quadro_conteudo(_html_para_texto(dados.get("conteudo") or "Sem conteúdo."), styles))
+    story.extend(_bloco_assinatura(criacao["assinatura"], styles))
+
+    # ---------- PÁGINAS 2+: TRAMITAÇÕES ----------
+    for tram in dados["tramites"]:
+        story.append(PageBreak())
+        story.append(Paragraph(
+            f"<b>PROCESSO {numero}</b> — Tramitação",
+            ParagraphStyle(name="TituloTram", parent=normal, fontSize=14, spaceAfter=12, alignment=1)
+        ))
+        story.append(Spacer(1, 8))
+
+        cab_tram = [
+            ("Origem", tram["origem"]),
+            ("Destino", tram["destino"]),
+            ("Data/Hora", tram["data"]),
+            ("Por", tram["por"]),
+        ]
+        story.append(_quadro_cabecalho(cab_tram, styles))
+        story.append(Spacer(1, 12))
+        story.append(Paragraph("<b>Despacho</b>", normal))
+        story.append(Spacer(1, 4))
+        story.append(_quadro_conteudo(_html_para_texto(tram.get("despacho") or "-"), styles))
+        story.extend(_bloco_assinatura(tram["assinatura"], styles))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def documento_logs(dados: dict) -> bytes:
+    """Relatório de auditoria: {"usuario": exportado por, "linhas": [cabeçalho, *linhas]}."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    elements.append(Paragraph("Auditoria do Sistema — SIGEIN", styles["Title"]))
+    elements.append(Paragraph(f"Exportado por: {dados['usuario']}", styles["Normal"]))
+    elements.append(Paragraph("<br/>", styles["Normal"]))
+
+    table = Table(dados["linhas"], colWidths=[110, 90, 70, 70, 200])
+    table.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e8eef5")),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, 0), 9),
+                ("FONTSIZE", (0, 1), (-1, -1), 8),
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ]
+        )
+    )
+    elements.append(table)
+    doc.build(elements)
+    return buffer.getvalue()
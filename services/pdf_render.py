@@ -0,0 +1,105 @@
+"""
+Renderização de PDFs num pool de processos.
+
+As rotas são `def` síncronas e rodam no threadpool do AnyIO; gerar um PDF
+com ReportLab é CPU pura e, numa thread, segura o GIL e atrasa todas as
+outras requisições do worker. Aqui a geração vai para um
+ProcessPoolExecutor: a thread da requisição só espera o resultado.
+
+As funções de geração ficam em services/pdf_documentos.py e recebem dados
+simples (dict/list/str), nunca objetos ORM, e devolvem bytes.
+
+A fila é limitada (SIGEIN_PDF_FILA renderizações em andamento ou na fila,
+por worker da aplicação) e cada espera tem timeout (SIGEIN_PDF_TIMEOUT
+segundos); nos dois casos a chamada levanta `RenderizacaoIndisponivel`.
+O número de processos vem de SIGEIN_PDF_PROCESSOS (padrão: núcleos, até 4).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+PROCESSOS = int(os.getenv("SIGEIN_PDF_PROCESSOS", str(min(4, os.cpu_count() or 1))))
+LIMITE_FILA = int(os.getenv("SIGEIN_PDF_FILA", "32"))
+TIMEOUT_SEGUNDOS = float(os.getenv("SIGEIN_PDF_TIMEOUT", "60"))
+
+
+class RenderizacaoIndisponivel(Exception):
+    """Fila de renderização cheia, tempo esgotado ou pool indisponível."""
+
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_vagas = threading.BoundedSemaphore(LIMITE_FILA)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: o filho não herda conexões do banco nem threads do servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESSOS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submeter(funcao, dados, timeout: float | None = None) -> Future:
+    """
+    Enfileira `funcao(dados)` (função de services/pdf_documentos.py) no pool e
+    devolve o Future; espera por vaga na fila até `timeout`.
+    """
+    limite = TIMEOUT_SEGUNDOS if timeout is None else timeout
+    if not _vagas.acquire(timeout=limite):
+        raise RenderizacaoIndisponivel("Fila de geração de PDF cheia")
+    pool = _get_pool()
+    try:
+        futuro = pool.submit(funcao, dados)
+    except (BrokenProcessPool, RuntimeError) as exc:
+        _vagas.release()
+        _descartar_pool(pool)
+        raise RenderizacaoIndisponivel("Pool de geração de PDF indisponível") from exc
+    # A vaga só volta quando o processo termina (mesmo após timeout)
+    futuro.add_done_callback(lambda _: _vagas.release())
+    return futuro
+
+
+def aguardar(futuro: Future, timeout: float | None = None) -> bytes:
+    """Bytes do PDF de um Future de `submeter()`."""
+    limite = TIMEOUT_SEGUNDOS if timeout is None else timeout
+    try:
+        return futuro.result(timeout=limite)
+    except FuturesTimeout as exc:
+        futuro.cancel()
+        raise RenderizacaoIndisponivel("Tempo esgotado ao gerar PDF") from exc
+    except BrokenProcessPool as exc:
+        with _lock:
+            pool = _pool
+        if pool is not None:
+            _descartar_pool(pool)
+        raise RenderizacaoIndisponivel("Pool de geração de PDF indisponível") from exc
+
+
+def renderizar(funcao, dados, timeout: float | None = None) -> bytes:
+    """Executa `funcao(dados)` num processo do pool e devolve os bytes do PDF."""
+    return aguardar(submeter(funcao, dados, timeout), timeout)
+
+
+def encerrar() -> None:
+    """Encerra o pool (shutdown da aplicação)."""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,201 @@
+"""
+Exportação em lote dos PDFs de processos num ZIP gerado em streaming.
+
+Os processos são lidos em lotes (uma consulta de chaves do cache e, para os
+que não estão no cache de PDFs, poucas consultas selectinload por lote); os
+PDFs que faltam vão para o pool de processos de services/pdf_render.py com
+algumas renderizações em andamento ao mesmo tempo, e cada PDF pronto entra
+no ZIP e é enviado. O ZIP começa com `processos.csv` (índice), então os
+primeiros bytes saem antes de qualquer PDF ser gerado.
+
+O progresso de cada exportação fica em memória por `token` (informado pela
+tela) e é consultado por /eprotocolo/processos/exportar/progresso/{token};
+vale para o worker que está gerando o ZIP.
+"""
+
+import csv
+import io
+import threading
+import time
+import zipfile
+from collections import deque
+
+from database import SessionLocal
+from models import Processo
+from services import pdf_render
+from services.pdf_documentos import documento_processo
+from services.processo_pdf import (
+    carregar_processos_pdf,
+    chaves_pdf_processos,
+    dados_pdf_processo,
+    guardar_pdf,
+    pdf_em_cache,
+)
+
+TAMANHO_LOTE = 50
+LIMITE_PROCESSOS = 2000
+_PROGRESSO_TTL = 3600
+
+
+class _SaidaZip:
+    """Destino não pesquisável do ZipFile: acumula os bytes até serem retirados."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados) -> int:
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self) -> None:
+        pass
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+# ------------------------------------------------------------
+# Progresso
+# ------------------------------------------------------------
+
+_lock = threading.Lock()
+_progresso: dict[str, dict] = {}
+
+
+def _atualizar_progresso(token: str | None, **campos) -> None:
+    if not token:
+        return
+    agora = time.monotonic()
+    with _lock:
+        for t in [t for t, p in _progresso.items() if agora - p["atualizado_em"] > _PROGRESSO_TTL]:
+            del _progresso[t]
+        p = _progresso.setdefault(token, {"total": 0, "gerados": 0, "concluido": False, "erro": None})
+        p.update(campos, atualizado_em=agora)
+
+
+def progresso_exportacao(token: str) -> dict | None:
+    """{total, gerados, concluido, erro} da exportação, ou None se desconhecida."""
+    with _lock:
+        p = _progresso.get(token)
+        return {k: v for k, v in p.items() if k != "atualizado_em"} if p else None
+
+
+# ------------------------------------------------------------
+# ZIP
+# ------------------------------------------------------------
+
+def _nome_arquivo(processo_id: int, numero: str | None) -> str:
+    return f"processo_{(numero or str(processo_id)).replace('/', '_')}.pdf"
+
+
+def _indice_csv(db, ids: list[int]) -> bytes:
+    saida = io.StringIO()
+    w = csv.writer(saida, delimiter=";")
+    w.writerow(["id", "numero", "assunto", "requerente", "status", "criado_em", "arquivo"])
+    for inicio in range(0, len(ids), 500):
+        lote = ids[inicio:inicio + 500]
+        por_id = {
+            r.id: r
+            for r in db.query(
+                Processo.id, Processo.numero, Processo.assunto,
+                Processo.requerente, Processo.status, Processo.created_at,
+            ).filter(Processo.id.in_(lote))
+        }
+        for pid in lote:
+            r = por_id.get(pid)
+            if r:
+                w.writerow([
+                    r.id, r.numero, r.assunto, r.requerente, r.status,
+                    r.created_at.strftime("%d/%m/%Y %H:%M") if r.created_at else "",
+                    _nome_arquivo(r.id, r.numero),
+                ])
+    return ("\ufeff" + saida.getvalue()).encode("utf-8")  # BOM: Excel abre com acentos
+
+
+def _tarefas(db, ids: list[int]):
+    """
+    (processo_id, número, chave, pdf em bytes ou None, dados para renderizar ou None),
+    na ordem de `ids`, lote a lote.
+    """
+    for inicio in range(0, len(ids), TAMANHO_LOTE):
+        lote = ids[inicio:inicio + TAMANHO_LOTE]
+        chaves = chaves_pdf_processos(db, lote)
+        em_cache = {}
+        for pid, (_, chave) in chaves.items():
+            caminho = pdf_em_cache(pid, chave)
+            if caminho:
+                try:
+                    with open(caminho, "rb") as arq:
+                        em_cache[pid] = arq.read()
+                except FileNotFoundError:
+                    pass  # descartado pelo LRU entre obter e abrir
+        faltam = [pid for pid in lote if pid in chaves and pid not in em_cache]
+        dados = {p.id: dados_pdf_processo(p) for p in carregar_processos_pdf(db, faltam)} if faltam else {}
+        db.expunge_all()
+        for pid in lote:
+            if pid not in chaves:
+                continue
+            numero, chave = chaves[pid]
+            if pid in em_cache:
+                yield pid, numero, chave, em_cache[pid], None
+            elif pid in dados:
+                yield pid, numero, chave, None, dados[pid]
+
+
+def _escrever(zf: zipfile.ZipFile, entrada) -> None:
+    pid, numero, chave, item = entrada
+    if not isinstance(item, bytes):
+        item = pdf_render.aguardar(item)
+        guardar_pdf(pid, chave, item)
+    zf.writestr(_nome_arquivo(pid, numero), item)
+
+
+def _pronto(item) -> bool:
+    return isinstance(item, bytes) or item.done()
+
+
+def gerar_zip(ids: list[int], token: str | None = None):
+    """
+    Gera o ZIP em pedaços (bytes) com o índice e o PDF de cada processo de `ids`.
+    Abre a própria sessão: o gerador roda depois que a rota já retornou.
+    """
+    db = SessionLocal()
+    saida = _SaidaZip()
+    em_andamento = deque()  # (pid, número, chave, bytes ou Future), na ordem do ZIP
+    janela = max(2, pdf_render.PROCESSOS * 2)
+    gerados = 0
+    _atualizar_progresso(token, total=len(ids), gerados=0, concluido=False, erro=None)
+    try:
+        with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("processos.csv", _indice_csv(db, ids))
+            yield saida.retirar()
+
+            tarefas = _tarefas(db, ids)
+            while True:
+                tarefa = next(tarefas, None)
+                if tarefa is not None:
+                    pid, numero, chave, pdf, dados = tarefa
+                    item = pdf if pdf is not None else pdf_render.submeter(documento_processo, dados)
+                    em_andamento.append((pid, numero, chave, item))
+                # Escreve em ordem os que já estão prontos; espera quando a janela enche ou no fim
+                while em_andamento and (
+                    tarefa is None or len(em_andamento) >= janela or _pronto(em_andamento[0][3])
+                ):
+                    _escrever(zf, em_andamento.popleft())
+                    gerados += 1
+                    _atualizar_progresso(token, gerados=gerados)
+                    yield saida.retirar()
+                if tarefa is None:
+                    break
+        yield saida.retirar()  # diretório central
+        _atualizar_progresso(token, concluido=True)
+    except Exception as exc:
+        _atualizar_progresso(token, concluido=True, erro=str(exc) or exc.__class__.__name__)
+        raise
+    finally:
+        for *_, item in em_andamento:
+            if not isinstance(item, bytes):
+                item.cancel()
+        db.close()
@@ -0,0 +1,257 @@
+"""
+PDF do processo (eProtocolo): dados do documento e cache em disco.
+
+O layout fica em services/pdf_documentos.py e a geração roda no pool de
+processos de services/pdf_render.py. Gerar o documento custa uma página por
+tramitação; como processos antigos são reabertos com frequência, o PDF fica
+em services/pdf_cache.py com chave (processo, nº de trâmites, última
+tramitação, geração dos cadastros, versão do layout). O conteúdo do processo
+não é editável depois de criado, mas o documento também traz nomes e siglas
+de usuários, órgãos e unidades: os routers desses cadastros chamam
+`invalidar_pdfs_processos()` ao editar ou excluir, o que incrementa a geração
+em catalogo_versoes e faz todos os PDFs serem gerados de novo na próxima
+abertura. Ao alterar o layout, incremente VERSAO_LAYOUT.
+
+Após cada tramitação o router chama `agendar_pdf_processo()`, que gera o
+novo PDF em segundo plano para a próxima abertura já encontrá-lo pronto.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+
+from database import SessionLocal
+from models import CatalogoVersao, Processo, Tramite, User
+from services import pdf_cache
+from services.pdf_documentos import documento_processo
+from services.pdf_render import renderizar
+
+VERSAO_LAYOUT = 1
+NOME_GERACAO = "pdf_processos"  # linha de catalogo_versoes com a geração dos cadastros
+
+logger = logging.getLogger(__name__)
+
+
+class PdfProcesso(NamedTuple):
+    numero: str
+    caminho: str
+    etag: str
+
+
+def _local(orgao, unidade) -> str:
+    return f"{(orgao.sigla or orgao.nome) if orgao else '-'} / {(unidade.sigla or unidade.nome) if unidade else '-'}"
+
+
+def _cargo(usuario) -> str:
+    if not usuario:
+        return "-"
+    if usuario.unidade:
+        return usuario.unidade.nome or (usuario.orgao.nome if usuario.orgao else "-")
+    if usuario.orgao:
+        return usuario.orgao.nome
+    return "-"
+
+
+def _assinatura(usuario, quando) -> dict:
+    return {
+        "nome": usuario.nome if usuario else "-",
+        "cargo": _cargo(usuario),
+        "data_hora": quando.strftime("%d/%m/%Y %H:%M:%S") if quando else "",
+    }
+
+
+def dados_pdf_processo(processo) -> dict:
+    """Converte o processo e seus trâmites (ORM) nos dados simples de pdf_documentos.documento_processo."""
+    tramites = sorted(processo.tramites, key=lambda t: t.created_at or datetime.min)
+    return {
+        "numero": processo.numero,
+        "assunto": processo.assunto,
+        "requerente": processo.requerente,
+        "conteudo": processo.conteudo,
+        "criacao": {
+            "origem": _local(processo.orgao_origem, processo.unidade_origem),
+            "data": processo.created_at.strftime("%d/%m/%Y %H:%M") if processo.created_at else "-",
+            "por": processo.creator.nome if processo.creator else "-",
+            "assinatura": _assinatura(processo.creator, processo.created_at),
+        },
+        "tramites": [
+            {
+                "origem": _local(t.orgao_origem, t.unidade_origem),
+                "destino": _local(t.orgao_destino, t.unidade_destino),
+                "data": t.created_at.strftime("%d/%m/%Y %H:%M") if t.created_at else "-",
+                "por": t.usuario.nome if t.usuario else "-",
+                "despacho": t.despacho,
+                "assinatura": _assinatura(t.usuario, t.created_at),
+            }
+            for t in tramites
+        ],
+    }
+
+
+# ------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------
+
+def _prefixo(processo_id: int) -> str:
+    return f"processo_{processo_id}"
+
+
+def invalidar_pdfs_processos(db: Session) -> None:
+    """
+    Incrementa a geração dos cadastros usados no PDF (usuários, órgãos, unidades).
+    Chamado pelos routers antes do commit da edição ou exclusão.
+    """
+    atualizados = (
+        db.query(CatalogoVersao)
+        .filter(CatalogoVersao.nome == NOME_GERACAO)
+        .update(
+            {CatalogoVersao.versao: CatalogoVersao.versao + 1, CatalogoVersao.atualizado_em: datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not atualizados:
+        db.add(CatalogoVersao(nome=NOME_GERACAO, versao=1, atualizado_em=datetime.utcnow()))
+
+
+def chaves_pdf_processos(db: Session, ids) -> dict:
+    """processo_id -> (número, chave do cache) para vários processos numa única consulta."""
+    geracao = select(CatalogoVersao.versao).where(CatalogoVersao.nome == NOME_GERACAO).scalar_subquery()
+    rows = (
+        db.query(Processo.id, Processo.numero, Processo.qtd_tramites, Processo.ultima_tramitacao_at, geracao)
+        .filter(Processo.id.in_(list(ids)))
+    )
+    return {
+        pid: (numero, (pid, qtd_tramites or 0, ultima.isoformat() if ultima else None, gen or 0, VERSAO_LAYOUT))
+        for pid, numero, qtd_tramites, ultima, gen in rows
+    }
+
+
+def chave_pdf_processo(db: Session, processo_id: int):
+    """(número, chave do cache) do processo, ou None se não existe."""
+    return chaves_pdf_processos(db, [processo_id]).get(processo_id)
+
+
+def carregar_processo_pdf(db: Session, processo_id: int):
+    """Processo com tudo que o PDF usa carregado de uma vez."""
+    return (
+        db.query(Processo)
+        .options(
+            undefer(Processo.conteudo),
+            joinedload(Processo.creator).options(
+                joinedload(User.orgao),
+                joinedload(User.unidade),
+            ),
+            joinedload(Processo.orgao_origem), joinedload(Processo.unidade_origem),
+            joinedload(Processo.tramites).options(
+                undefer(Tramite.despacho),
+                joinedload(Tramite.usuario).options(
+                    joinedload(User.orgao),
+                    joinedload(User.unidade),
+                ),
+                joinedload(Tramite.orgao_origem),
+                joinedload(Tramite.unidade_origem),
+                joinedload(Tramite.orgao_destino),
+                joinedload(Tramite.unidade_destino),
+            ),
+        )
+        .filter(Processo.id == processo_id)
+        .first()
+    )
+
+
+def carregar_processos_pdf(db: Session, ids) -> list:
+    """
+    Vários processos com o que o PDF usa, em poucas consultas por lote
+    (selectinload: uma consulta por relacionamento, não por processo).
+    """
+    return (
+        db.query(Processo)
+        .options(
+            undefer(Processo.conteudo),
+            selectinload(Processo.creator).options(
+                selectinload(User.orgao),
+                selectinload(User.unidade),
+            ),
+            selectinload(Processo.orgao_origem), selectinload(Processo.unidade_origem),
+            selectinload(Processo.tramites).options(
+                undefer(Tramite.despacho),
+                selectinload(Tramite.usuario).options(
+                    selectinload(User.orgao),
+                    selectinload(User.unidade),
+                ),
+                selectinload(Tramite.orgao_origem),
+                selectinload(Tramite.unidade_origem),
+                selectinload(Tramite.orgao_destino),
+                selectinload(Tramite.unidade_destino),
+            ),
+        )
+        .filter(Processo.id.in_(list(ids)))
+        .all()
+    )
+
+
+def pdf_em_cache(processo_id: int, chave: tuple) -> str | None:
+    """Caminho do PDF do processo no cache para a chave, ou None."""
+    return pdf_cache.obter(_prefixo(processo_id), chave)
+
+
+def guardar_pdf(processo_id: int, chave: tuple, pdf: bytes) -> str:
+    """Grava o PDF no cache (substituindo versões anteriores do processo)."""
+    return pdf_cache.gravar(_prefixo(processo_id), chave, pdf)
+
+
+def _renderizar(db: Session, processo_id: int, chave: tuple) -> str | None:
+    processo = carregar_processo_pdf(db, processo_id)
+    if not processo:
+        return None
+    return guardar_pdf(processo_id, chave, renderizar(documento_processo, dados_pdf_processo(processo)))
+
+
+def pdf_processo(db: Session, processo_id: int) -> PdfProcesso | None:
+    """PDF atual do processo (do cache, ou gerado agora e gravado nele)."""
+    info = chave_pdf_processo(db, processo_id)
+    if not info:
+        return None
+    numero, chave = info
+    caminho = pdf_em_cache(processo_id, chave) or _renderizar(db, processo_id, chave)
+    if not caminho:
+        return None
+    return PdfProcesso(numero, caminho, pdf_cache.etag_da_chave(chave))
+
+
+# ------------------------------------------------------------
+# Pré-geração em segundo plano
+# ------------------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-processo")
+_lock = threading.Lock()
+_pendentes: set[int] = set()
+
+
+def agendar_pdf_processo(processo_id: int) -> None:
+    """Agenda a geração do PDF atual do processo (chamado após cada tramitação)."""
+    with _lock:
+        if processo_id in _pendentes:
+            return
+        _pendentes.add(processo_id)
+    _executor.submit(_pre_gerar, processo_id)
+
+
+def _pre_gerar(processo_id: int) -> None:
+    with _lock:
+        # Sai da fila antes de ler o banco: uma tramitação durante a geração agenda de novo
+        _pendentes.discard(processo_id)
+    db = SessionLocal()
+    try:
+        info = chave_pdf_processo(db, processo_id)
+        if info and not pdf_em_cache(processo_id, info[1]):
+            _renderizar(db, processo_id, info[1])
+    except Exception:
+        logger.exception("Falha ao pré-gerar PDF do processo %s", processo_id)
+    finally:
+        db.close()
@@ -0,0 +1,138 @@
+"""
+Cache em processo das tabelas de referência dos formulários
+(categorias, tipos de equipamento, marcas, estados físicos e estados/UF).
+
+Essas tabelas mudam raramente; os routers de cadastro chamam
+`invalidate_reference_data()` após cada gravação, o que incrementa a versão
+e força a recarga na próxima leitura (services/cache_versionado.py).
+"""
+
+import hashlib
+import json
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from models import Brand, Category, EquipmentState, EquipmentType, Estado, brand_equipment_types
+from services.cache_versionado import CacheVersionado
+
+
+class TipoRef(NamedTuple):
+    id: int
+    nome: str
+    category_id: int
+
+
+class CategoriaRef(NamedTuple):
+    id: int
+    nome: str
+    descricao: str | None
+    ativo: bool
+    equipment_types: tuple  # TipoRef da categoria, ordenados por nome
+
+
+class MarcaRef(NamedTuple):
+    id: int
+    nome: str
+    type_ids: tuple
+
+
+class EstadoFisicoRef(NamedTuple):
+    id: int
+    nome: str
+
+
+class EstadoRef(NamedTuple):
+    id: int
+    nome: str
+    uf: str
+
+
+class ReferenceData(NamedTuple):
+    versao: int
+    etag: str
+    categorias: list  # CategoriaRef, por nome
+    tipos: list  # TipoRef, por nome
+    marcas: list  # MarcaRef, por nome
+    estados_fisicos: list  # EstadoFisicoRef, por nome
+    estados: list  # EstadoRef, por nome
+    tipos_por_id: dict
+    marcas_por_id: dict
+    tipos_por_categoria: dict  # category_id -> [{"id", "nome"}]
+    marcas_por_tipo: dict  # type_id -> [{"id", "nome"}]
+
+
+def _carregar(db: Session, versao: int) -> ReferenceData:
+    tipos = [
+        TipoRef(t.id, t.nome, t.category_id)
+        for t in db.query(EquipmentType).order_by(EquipmentType.nome).all()
+    ]
+    tipos_da_categoria: dict[int, list[TipoRef]] = {}
+    for t in tipos:
+        tipos_da_categoria.setdefault(t.category_id, []).append(t)
+
+    categorias = [
+        CategoriaRef(c.id, c.nome, c.descricao, bool(c.ativo), tuple(tipos_da_categoria.get(c.id, [])))
+        for c in db.query(Category).order_by(Category.nome).all()
+    ]
+
+    type_ids_da_marca: dict[int, list[int]] = {}
+    for brand_id, type_id in db.query(brand_equipment_types.c.brand_id, brand_equipment_types.c.type_id):
+        type_ids_da_marca.setdefault(brand_id, []).append(type_id)
+    marcas = [
+        MarcaRef(b.id, b.nome, tuple(sorted(type_ids_da_marca.get(b.id, []))))
+        for b in db.query(Brand.id, Brand.nome).order_by(Brand.nome).all()
+    ]
+
+    estados_fisicos = [
+        EstadoFisicoRef(e.id, e.nome)
+        for e in db.query(EquipmentState.id, EquipmentState.nome).order_by(EquipmentState.nome).all()
+    ]
+    estados = [
+        EstadoRef(e.id, e.nome, e.uf)
+        for e in db.query(Estado.id, Estado.nome, Estado.uf).order_by(Estado.nome).all()
+    ]
+
+    tipos_por_categoria = {
+        category_id: [{"id": t.id, "nome": t.nome} for t in lista]
+        for category_id, lista in tipos_da_categoria.items()
+    }
+    marcas_por_tipo: dict[int, list[dict]] = {}
+    for m in marcas:  # já em ordem de nome
+        for type_id in m.type_ids:
+            marcas_por_tipo.setdefault(type_id, []).append({"id": m.id, "nome": m.nome})
+
+    # ETag pelo conteúdo (igual entre workers que carregaram os mesmos dados)
+    digest = hashlib.sha1(
+        json.dumps(
+            [categorias, tipos, marcas, estados_fisicos, estados],
+            ensure_ascii=False,
+        ).encode("utf-8")
+    ).hexdigest()[:16]
+
+    return ReferenceData(
+        versao=versao,
+        etag=digest,
+        categorias=categorias,
+        tipos=tipos,
+        marcas=marcas,
+        estados_fisicos=estados_fisicos,
+        estados=estados,
+        tipos_por_id={t.id: t for t in tipos},
+        marcas_por_id={m.id: m for m in marcas},
+        tipos_por_categoria=tipos_por_categoria,
+        marcas_por_tipo=marcas_por_tipo,
+    )
+
+
+_cache = CacheVersionado(_carregar)
+
+
+def get_reference_data(db: Session) -> ReferenceData:
+    """Retorna o snapshot atual das tabelas de referência, recarregando se invalidado."""
+    return _cache.obter(db)
+
+
+def invalidate_reference_data() -> None:
+    """Chamado pelos routers de categorias, tipos, marcas e estados após gravar."""
+    _cache.invalidar()
@@ -0,0 +1,141 @@
+"""
+Catálogo de produtos SEGEM (produtos_segem) em memória.
+
+O catálogo só muda quando carga_produtos_segem.py roda; o script chama
+`registrar_alteracao_catalogo()`, que incrementa a versão em catalogo_versoes.
+Cada worker confere essa versão (uma leitura por chave primária, no máximo a
+cada _VERIFICAR_A_CADA segundos) e, se mudou, recarrega:
+
+- o documento JSON completo, já serializado e comprimido (gzip), com ETag;
+- um índice ordenado de chaves normalizadas (sem acento, minúsculas) para
+  autocomplete por prefixo de código ou de palavras da descrição.
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from models import CatalogoVersao, ProdutoSegem
+from services.texto import normalizar
+
+NOME_CATALOGO = "produtos_segem"
+_VERIFICAR_A_CADA = 15  # segundos
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+class CatalogoSegem(NamedTuple):
+    versao: int
+    etag: str
+    corpo: bytes
+    corpo_gzip: bytes
+    por_codigo: dict  # codigo -> descricao
+    produtos: list  # [(codigo, descricao)], por código
+    chaves: list  # chaves normalizadas, ordenadas
+    posicoes: list  # posição em `produtos` de cada chave
+
+
+def _chaves_do_produto(codigo: str, descricao: str) -> set[str]:
+    """Código (com e sem pontuação), descrição inteira e cada trecho a partir de uma palavra."""
+    chaves = {normalizar(codigo), re.sub(r"[^a-z0-9]", "", normalizar(codigo))}
+    desc = normalizar(descricao)
+    if desc:
+        for m in _PALAVRA.finditer(desc):
+            chaves.add(desc[m.start():])
+    return {c for c in chaves if c}
+
+
+def _carregar(db: Session, versao: int) -> CatalogoSegem:
+    produtos = [
+        (r[0] or "", r[1] or "")
+        for r in db.query(ProdutoSegem.codigo, ProdutoSegem.descricao).order_by(ProdutoSegem.codigo)
+    ]
+    corpo = json.dumps(
+        [{"codigo": c, "descricao": d} for c, d in produtos],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    entradas = sorted(
+        (chave, pos)
+        for pos, (codigo, descricao) in enumerate(produtos)
+        for chave in _chaves_do_produto(codigo, descricao)
+    )
+    return CatalogoSegem(
+        versao=versao,
+        etag=f"segem-catalogo-{versao}-{hashlib.sha1(corpo).hexdigest()[:12]}",
+        corpo=corpo,
+        corpo_gzip=gzip.compress(corpo, compresslevel=6),
+        por_codigo=dict(produtos),
+        produtos=produtos,
+        chaves=[e[0] for e in entradas],
+        posicoes=[e[1] for e in entradas],
+    )
+
+
+_lock = threading.Lock()
+_catalogo: CatalogoSegem | None = None
+_verificado_em = 0.0
+
+
+def _versao_atual(db: Session) -> int:
+    row = db.query(CatalogoVersao.versao).filter(CatalogoVersao.nome == NOME_CATALOGO).first()
+    return row[0] if row else 0
+
+
+def get_catalogo_segem(db: Session) -> CatalogoSegem:
+    global _catalogo, _verificado_em
+    cat = _catalogo
+    if cat is not None and time.monotonic() - _verificado_em < _VERIFICAR_A_CADA:
+        return cat
+    with _lock:
+        if _catalogo is None or time.monotonic() - _verificado_em >= _VERIFICAR_A_CADA:
+            versao = _versao_atual(db)
+            if _catalogo is None or _catalogo.versao != versao:
+                _catalogo = _carregar(db, versao)
+            _verificado_em = time.monotonic()
+        return _catalogo
+
+
+def sugerir_produtos(cat: CatalogoSegem, termo: str, limite: int = 10) -> list[dict]:
+    """Produtos cujo código ou alguma palavra da descrição começa com `termo` (sem acento)."""
+    prefixo = normalizar(termo)
+    if not prefixo:
+        return []
+    resultado, vistos = [], set()
+    for prefixo_busca in dict.fromkeys([prefixo, re.sub(r"[^a-z0-9]", "", prefixo)]):
+        if not prefixo_busca:
+            continue
+        i = bisect.bisect_left(cat.chaves, prefixo_busca)
+        while i < len(cat.chaves) and cat.chaves[i].startswith(prefixo_busca):
+            pos = cat.posicoes[i]
+            if pos not in vistos:
+                vistos.add(pos)
+                codigo, descricao = cat.produtos[pos]
+                resultado.append({"codigo": codigo, "descricao": descricao})
+                if len(resultado) >= limite:
+                    return resultado
+            i += 1
+    return resultado
+
+
+def registrar_alteracao_catalogo(db: Session) -> None:
+    """Incrementa a versão do catálogo (chamado pelo script de carga após gravar)."""
+    atualizados = (
+        db.query(CatalogoVersao)
+        .filter(CatalogoVersao.nome == NOME_CATALOGO)
+        .update(
+            {CatalogoVersao.versao: CatalogoVersao.versao + 1, CatalogoVersao.atualizado_em: datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not atualizados:
+        db.add(CatalogoVersao(nome=NOME_CATALOGO, versao=1, atualizado_em=datetime.utcnow()))
+    db.commit()
@@ -0,0 +1,179 @@
+"""
+Consultas da listagem SEGEM: filtros, ordenação, paginação e totais no banco,
+além das listas de valores dos filtros (anos, locais, situações) em cache.
+
+O cache de facetas segue o mesmo esquema de services/reference_data.py:
+versão incrementada por `invalidate_segem_facetas()` após cada gravação e
+TTL curto para gravações de outros processos.
+"""
+
+import threading
+import time
+from typing import NamedTuple
+
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import Session, selectinload, undefer
+
+from models import SegemItem, SegemItemProduto
+
+_TTL_SEGUNDOS = 300
+
+
+class FiltrosSegem(NamedTuple):
+    municipio_id: int | None  # None = todos (perfil master)
+    anos: tuple = ()
+    locais: tuple = ()
+    situacoes: tuple = ()
+    tombo: str = ""
+    descricao: str = ""
+    empresas: tuple = ()
+    classificacoes: tuple = ()
+
+
+# Colunas ordenáveis (chave enviada pela tela -> expressão SQL)
+COLUNAS_ORDENACAO = {
+    "ano": SegemItem.ano,
+    "codigo": SegemItem.codigo,
+    "tombo": SegemItem.tombo_num,
+    "local": SegemItem.local,
+    "descricao": SegemItem.descricao,
+    "situacao": SegemItem.situacao,
+    "valor_rs": SegemItem.valor_rs,
+    "entrada_no_siga": SegemItem.entrada_no_siga,
+    "nota_de_empenho": SegemItem.nota_de_empenho,
+    "valor_nota_empenho": SegemItem.valor_nota_empenho,
+    "num_nota_fiscal": SegemItem.num_nota_fiscal,
+    "nome_empresa": SegemItem.nome_empresa,
+    "classificacao_asi": SegemItem.classificacao_asi,
+}
+
+
+def condicoes_segem(f: FiltrosSegem) -> list:
+    """Condições WHERE sobre SegemItem para os filtros informados."""
+    conds = []
+    if f.municipio_id is not None:
+        conds.append(SegemItem.municipio_id == f.municipio_id)
+    if f.anos:
+        conds.append(SegemItem.ano.in_(f.anos))
+    if f.locais:
+        conds.append(SegemItem.local.in_(f.locais))
+    if f.situacoes:
+        conds.append(SegemItem.situacao.in_(f.situacoes))
+    if f.empresas:
+        conds.append(SegemItem.nome_empresa.in_(f.empresas))
+    if f.classificacoes:
+        conds.append(SegemItem.classificacao_asi.in_(f.classificacoes))
+    if f.tombo:
+        like = f"%{f.tombo}%"
+        conds.append(or_(
+            SegemItem.num_tombo_gcm.ilike(like),
+            exists().where(and_(
+                SegemItemProduto.segem_item_id == SegemItem.id,
+                SegemItemProduto.num_tombo_gcm.ilike(like),
+            )),
+        ))
+    if f.descricao:
+        conds.append(SegemItem.descricao.ilike(f"%{f.descricao}%"))
+    return conds
+
+
+def contar_segem(db: Session, f: FiltrosSegem) -> int:
+    return db.query(func.count(SegemItem.id)).filter(*condicoes_segem(f)).scalar() or 0
+
+
+def totais_segem(db: Session, f: FiltrosSegem) -> dict:
+    """Soma de valor_rs (registro + produtos filhos) e da nota de empenho para o filtro."""
+    conds = condicoes_segem(f)
+    qtd, soma_itens, soma_nota = (
+        db.query(
+            func.count(SegemItem.id),
+            func.coalesce(func.sum(SegemItem.valor_rs), 0),
+            func.coalesce(func.sum(SegemItem.valor_nota_empenho), 0),
+        )
+        .filter(*conds)
+        .one()
+    )
+    ids_filtrados = select(SegemItem.id).where(*conds) if conds else select(SegemItem.id)
+    soma_produtos = (
+        db.query(func.coalesce(func.sum(SegemItemProduto.valor_rs), 0))
+        .filter(SegemItemProduto.segem_item_id.in_(ids_filtrados))
+        .scalar()
+    )
+    return {
+        "registros": qtd or 0,
+        "valor_rs": float(soma_itens or 0) + float(soma_produtos or 0),
+        "valor_nota_empenho": float(soma_nota or 0),
+    }
+
+
+def pagina_segem(
+    db: Session,
+    f: FiltrosSegem,
+    ordenar: str = "id",
+    direcao: str = "desc",
+    inicio: int = 0,
+    limite: int = 25,
+) -> list[SegemItem]:
+    """Uma página de registros, com os produtos filhos carregados em uma consulta extra."""
+    coluna = COLUNAS_ORDENACAO.get(ordenar, SegemItem.id)
+    ordem = coluna.asc() if direcao == "asc" else coluna.desc()
+    return (
+        db.query(SegemItem)
+        .options(undefer(SegemItem.descricao), selectinload(SegemItem.produtos))
+        .filter(*condicoes_segem(f))
+        .order_by(ordem.nullslast(), SegemItem.id.desc())
+        .offset(max(0, inicio))
+        .limit(limite)
+        .all()
+    )
+
+
+# ------------------------------------------------------------
+# Facetas (valores distintos para os filtros), em cache por município
+# ------------------------------------------------------------
+
+_lock = threading.Lock()
+_versao = 0
+_facetas: dict = {}  # municipio_id -> (versao, carregado_em, dict)
+
+
+def _carregar_facetas(db: Session, municipio_id: int | None) -> dict:
+    base = FiltrosSegem(municipio_id=municipio_id)
+    conds = condicoes_segem(base)
+
+    def distintos(coluna):
+        return [
+            r[0]
+            for r in db.query(coluna).filter(*conds, coluna.isnot(None)).distinct().order_by(coluna)
+            if r[0] not in (None, "")
+        ]
+
+    return {
+        "anos": distintos(SegemItem.ano),
+        "locais": distintos(SegemItem.local),
+        "situacoes": distintos(SegemItem.situacao),
+    }
+
+
+def get_segem_facetas(db: Session, municipio_id: int | None) -> dict:
+    entrada = _facetas.get(municipio_id)
+    if entrada and entrada[0] == _versao and time.monotonic() - entrada[1] < _TTL_SEGUNDOS:
+        return entrada[2]
+    with _lock:
+        versao = _versao
+        dados = _carregar_facetas(db, municipio_id)
+        _facetas[municipio_id] = (versao, time.monotonic(), dados)
+        return dados
+
+
+def versao_segem() -> int:
+    """Versão dos dados SEGEM neste processo (outros caches derivados a comparam)."""
+    return _versao
+
+
+def invalidate_segem_facetas() -> None:
+    """Chamado pelo router SEGEM (e cargas em lote) após gravar registros; vale também para o relatório."""
+    global _versao
+    with _lock:
+        _versao += 1
+        _facetas.clear()
@@ -0,0 +1,54 @@
+"""Conversões de valores do módulo SEGEM (R$ pt-BR e Nº TOMBO 000.000)."""
+
+import re
+
+
+def valor_fmt(val):
+    """Formata valor para exibição no campo R$ (pt-BR)."""
+    if val is None:
+        return ""
+    try:
+        return "R$ {:,.2f}".format(float(val)).replace(",", "X").replace(".", ",").replace("X", ".")
+    except (TypeError, ValueError):
+        return ""
+
+
+def parse_valor(v):
+    """Converte valor para float. Aceita: pt-BR (1.830,00) ou numérico (1830.00) enviado pelo form."""
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return None
+    try:
+        s = str(v).replace("R$", "").replace(" ", "").strip()
+        if not s:
+            return None
+        if "," in s:
+            # Formato pt-BR: ponto = milhares, vírgula = decimal
+            s = s.replace(".", "").replace(",", ".")
+        return float(s) if s else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Nº TOMBO: intervalo 000.001 a 999.999 (ex.: 003.502). Próximo = max(DB + atuais) + 1.
+TOMBO_PATTERN = re.compile(r"^\s*(\d{1,3})\.(\d{1,3})\s*$")
+
+
+def parse_tombo_to_int(s):
+    """Converte '003.502' -> 3502 ou None se inválido."""
+    if not s or not isinstance(s, str):
+        return None
+    m = TOMBO_PATTERN.match(s.strip())
+    if not m:
+        return None
+    a, b = int(m.group(1)), int(m.group(2))
+    if a > 999 or b > 999:
+        return None
+    return a * 1000 + b
+
+
+def format_tombo(n):
+    """Converte 3502 -> '003.502'."""
+    if n is None or n < 0:
+        return None
+    n = min(int(n), 999999)
+    return "{:03d}.{:03d}".format(n // 1000, n % 1000)
@@ -0,0 +1,390 @@
+"""
+Importação de planilhas SEGEM (XLSX ou CSV) para segem_itens.
+
+As linhas são lidas sob demanda (openpyxl em modo read_only / csv.reader) e
+gravadas em lotes: por lote, uma única consulta confere quais Nº TOMBO já
+existem em segem_itens ou segem_itens_produtos (coluna tombo_num) e os
+registros válidos são inseridos com seus produtos filhos num só flush/commit.
+
+Colunas reconhecidas (cabeçalho sem acento/maiúsculas, em qualquer ordem):
+ANO, Nº TOMBO (GCM), LOCAL, CÓDIGO, DESCRIÇÃO, SITUAÇÃO, VALOR R$,
+ENTRADA NO SIGA, NOTA DE EMPENHO, VALOR DA NOTA DE EMPENHO, N° NOTA FISCAL,
+NOME DA EMPRESA, CLASSIFICAÇÃO ASI.
+
+Uma célula de tombo com vários números (separados por vírgula, ponto e
+vírgula ou quebra de linha) gera o registro com o primeiro e um produto
+filho para cada um dos demais; VALOR R$ pode trazer os valores na mesma
+ordem, separados por ponto e vírgula ou quebra de linha.
+"""
+
+import csv
+import io
+import re
+import unicodedata
+from datetime import date, datetime
+from itertools import islice
+from typing import NamedTuple
+
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from models import SegemItem, SegemItemProduto
+from services.segem_formatos import format_tombo, parse_tombo_to_int, parse_valor
+
+TAMANHO_LOTE = 500
+LIMITE_ERROS = 1000  # o relatório para de detalhar depois disso (só conta)
+
+_SEPARADOR_TOMBOS = re.compile(r"[,;\n]+")
+_SEPARADOR_VALORES = re.compile(r"[;\n]+")
+_DATA_BR = re.compile(r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})\s*$")
+
+# Cabeçalho normalizado -> atributo de SegemItem
+COLUNAS = {
+    "ANO": "ano",
+    "N TOMBO (GCM)": "num_tombo_gcm",
+    "N TOMBO GCM": "num_tombo_gcm",
+    "N TOMBO": "num_tombo_gcm",
+    "TOMBO": "num_tombo_gcm",
+    "LOCAL": "local",
+    "CODIGO": "codigo",
+    "DESCRICAO": "descricao",
+    "SITUACAO": "situacao",
+    "VALOR R$": "valor_rs",
+    "VALOR": "valor_rs",
+    "ENTRADA NO SIGA": "entrada_no_siga",
+    "NOTA DE EMPENHO": "nota_de_empenho",
+    "VALOR DA NOTA DE EMPENHO": "valor_nota_empenho",
+    "N NOTA FISCAL": "num_nota_fiscal",
+    "NOTA FISCAL": "num_nota_fiscal",
+    "NOME DA EMPRESA": "nome_empresa",
+    "EMPRESA": "nome_empresa",
+    "CLASSIFICACAO ASI": "classificacao_asi",
+}
+
+# Limites de tamanho das colunas String de SegemItem
+_TAMANHOS = {
+    "num_tombo_gcm": 50,
+    "local": 200,
+    "codigo": 100,
+    "situacao": 100,
+    "entrada_no_siga": 100,
+    "nota_de_empenho": 100,
+    "num_nota_fiscal": 100,
+    "nome_empresa": 200,
+    "classificacao_asi": 100,
+}
+
+
+class ErroImportacao(Exception):
+    """Arquivo ilegível ou sem cabeçalho reconhecível (nenhuma linha é gravada)."""
+
+
+class ImportacaoInterrompida(Exception):
+    """Falha no meio da carga; `relatorio` traz o que os lotes já confirmados gravaram."""
+
+    def __init__(self, relatorio: dict):
+        super().__init__(f"Importação interrompida após {relatorio['importados']} registro(s)")
+        self.relatorio = relatorio
+
+
+class LinhaSegem(NamedTuple):
+    linha: int  # número da linha na planilha (cabeçalho = 1)
+    campos: dict  # atributos de SegemItem
+    tombos: list  # [(texto '000.000', número)]
+    valores: list  # valores R$ na mesma ordem dos tombos
+
+
+def normalizar_cabecalho(texto) -> str:
+    """'Nº TOMBO (GCM)' -> 'N TOMBO (GCM)'; sem acentos, maiúsculas, espaços simples."""
+    s = str(texto or "").replace("º", "").replace("°", "").replace("ª", "")
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.upper().replace("N.", "N ").split())
+
+
+def _mapear_cabecalho(cabecalho) -> dict:
+    """Índice da coluna -> atributo; exige ao menos a coluna de tombo ou de código."""
+    mapa = {}
+    for i, nome in enumerate(cabecalho):
+        attr = COLUNAS.get(normalizar_cabecalho(nome))
+        if attr and attr not in mapa.values():
+            mapa[i] = attr
+    if not {"num_tombo_gcm", "codigo"} & set(mapa.values()):
+        raise ErroImportacao(
+            "Cabeçalho não reconhecido: a planilha deve ter ao menos as colunas Nº TOMBO (GCM) e CÓDIGO."
+        )
+    return mapa
+
+
+# ------------------------------------------------------------
+# Leitura (XLSX / CSV), linha a linha
+# ------------------------------------------------------------
+
+def _linhas_xlsx(arquivo):
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(arquivo, read_only=True, data_only=True)
+    except Exception as e:
+        raise ErroImportacao(f"Não foi possível abrir a planilha XLSX: {e}")
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _linhas_csv(arquivo):
+    inicio = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    try:
+        inicio.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Só troca para latin-1 se o erro não for um caractere cortado no fim do trecho
+        encoding = "utf-8-sig" if e.start >= len(inicio) - 3 else "latin-1"
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, newline="")
+    primeira = texto.readline()
+    if not primeira:
+        return
+    delim = ";" if primeira.count(";") >= primeira.count(",") and ";" in primeira else ","
+    yield next(csv.reader([primeira], delimiter=delim))
+    yield from csv.reader(texto, delimiter=delim)
+
+
+def ler_planilha(arquivo, nome_arquivo: str):
+    """Gera as linhas (tuplas de células) do arquivo; a primeira é o cabeçalho."""
+    nome = (nome_arquivo or "").lower()
+    if nome.endswith(".xlsx") or nome.endswith(".xlsm"):
+        return _linhas_xlsx(arquivo)
+    if nome.endswith(".csv") or nome.endswith(".txt"):
+        return _linhas_csv(arquivo)
+    raise ErroImportacao("Formato não suportado: envie um arquivo .xlsx ou .csv.")
+
+
+# ------------------------------------------------------------
+# Conversão de células
+# ------------------------------------------------------------
+
+def _texto(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def _ano(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, (datetime, date)):
+        return v.year
+    try:
+        ano = int(float(str(v).strip().replace(",", ".")))
+    except ValueError:
+        raise ValueError(f"ANO inválido: {_texto(v)}")
+    if not 1900 <= ano <= 2100:
+        raise ValueError(f"ANO fora do intervalo: {ano}")
+    return ano
+
+
+def _data(v):
+    """Datas da planilha (célula de data ou dd/mm/aaaa) -> 'aaaa-mm-dd', como grava o formulário."""
+    if isinstance(v, (datetime, date)):
+        return v.strftime("%Y-%m-%d")
+    s = _texto(v)
+    m = _DATA_BR.match(s)
+    if m:
+        d, mes, a = (int(x) for x in m.groups())
+        try:
+            return date(a, mes, d).strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"ENTRADA NO SIGA inválida: {s}")
+    return s or None
+
+
+def _valor(v, coluna: str):
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    valor = parse_valor(v)
+    if valor is None:
+        raise ValueError(f"{coluna} inválido: {_texto(v)}")
+    return valor
+
+
+def _tombo(v):
+    """Normaliza para '000.000'; células numéricas (3502 ou 3.502) também são aceitas."""
+    if isinstance(v, int):
+        n = v
+    elif isinstance(v, float):
+        n = round(v * 1000) if not v.is_integer() else int(v)
+    else:
+        n = parse_tombo_to_int(v)
+        if n is None and isinstance(v, str) and v.strip().isdigit():
+            n = int(v.strip())
+    if n is None or not 1 <= n <= 999999:
+        raise ValueError(f"Nº TOMBO inválido: {_texto(v)}")
+    return format_tombo(n), n
+
+
+def converter_linha(numero: int, celulas, mapa: dict) -> LinhaSegem | None:
+    """Monta a LinhaSegem da linha; None para linha vazia; ValueError com a mensagem do problema."""
+    brutos = {attr: (celulas[i] if i < len(celulas) else None) for i, attr in mapa.items()}
+    if all(_texto(v) == "" for v in brutos.values()):
+        return None
+
+    campos = {}
+    for attr, v in brutos.items():
+        if attr in ("num_tombo_gcm", "valor_rs"):
+            continue
+        if attr == "ano":
+            campos[attr] = _ano(v)
+        elif attr == "valor_nota_empenho":
+            campos[attr] = _valor(v, "VALOR DA NOTA DE EMPENHO")
+        elif attr == "entrada_no_siga":
+            campos[attr] = _data(v)
+        else:
+            campos[attr] = _texto(v) or None
+        limite = _TAMANHOS.get(attr)
+        if limite and campos[attr] and len(campos[attr]) > limite:
+            raise ValueError(f"{attr.upper()} excede {limite} caracteres")
+
+    bruto_tombo = brutos.get("num_tombo_gcm")
+    if isinstance(bruto_tombo, (int, float)):
+        tombos = [_tombo(bruto_tombo)]
+    else:
+        tombos = [_tombo(t) for t in _SEPARADOR_TOMBOS.split(_texto(bruto_tombo)) if t.strip()]
+    if len({n for _, n in tombos}) != len(tombos):
+        raise ValueError("Nº TOMBO repetido na mesma linha")
+
+    bruto_valor = brutos.get("valor_rs")
+    if isinstance(bruto_valor, (int, float)):
+        valores = [float(bruto_valor)]
+    else:
+        valores = [_valor(v, "VALOR R$") for v in _SEPARADOR_VALORES.split(_texto(bruto_valor)) if v.strip()]
+    if len(valores) > max(len(tombos), 1):
+        raise ValueError("VALOR R$ tem mais valores que Nº TOMBO")
+
+    if not tombos and not campos.get("codigo"):
+        raise ValueError("Linha sem Nº TOMBO e sem CÓDIGO")
+    return LinhaSegem(numero, campos, tombos, valores)
+
+
+# ------------------------------------------------------------
+# Gravação em lotes
+# ------------------------------------------------------------
+
+def tombos_existentes(db: Session, numeros) -> set[int]:
+    """Quais dos números já estão em segem_itens ou segem_itens_produtos (uma consulta)."""
+    if not numeros:
+        return set()
+    numeros = list(numeros)
+    consulta = union_all(
+        select(SegemItem.tombo_num).where(SegemItem.tombo_num.in_(numeros)),
+        select(SegemItemProduto.tombo_num).where(SegemItemProduto.tombo_num.in_(numeros)),
+    )
+    return {r[0] for r in db.execute(consulta)}
+
+
+def _novo_item(linha: LinhaSegem, municipio_id, orgao_id, created_by) -> SegemItem:
+    valores = linha.valores + [None] * (len(linha.tombos) - len(linha.valores))
+    item = SegemItem(
+        municipio_id=municipio_id,
+        orgao_id=orgao_id,
+        created_by=created_by,
+        num_tombo_gcm=linha.tombos[0][0] if linha.tombos else None,
+        valor_rs=valores[0] if valores else None,
+        **linha.campos,
+    )
+    if "valor_nota_empenho" not in linha.campos:
+        # Como no formulário: valor da nota = soma dos valores dos produtos
+        soma = sum(v for v in valores if v is not None)
+        item.valor_nota_empenho = soma or None
+    item.produtos = [
+        SegemItemProduto(num_tombo_gcm=texto, valor_rs=valores[i])
+        for i, (texto, _) in enumerate(linha.tombos[1:], start=1)
+    ]
+    return item
+
+
+def importar_planilha(
+    db: Session,
+    linhas,
+    municipio_id: int,
+    orgao_id: int,
+    created_by: int | None = None,
+    tamanho_lote: int = TAMANHO_LOTE,
+) -> dict:
+    """
+    Importa as linhas (a primeira é o cabeçalho) e retorna o relatório:
+    {lidas, importados, produtos, ignoradas, erros: [{linha, tombo, mensagem}], erros_omitidos}.
+    Uma linha com erro (inclusive tombo já cadastrado ou repetido no arquivo)
+    é pulada; as demais do lote são gravadas normalmente. Uma falha depois do
+    cabeçalho (arquivo truncado, erro do banco) levanta ImportacaoInterrompida
+    com o relatório dos lotes já confirmados.
+    """
+    it = iter(linhas)
+    cabecalho = next(it, None)
+    if cabecalho is None:
+        raise ErroImportacao("Arquivo vazio.")
+    mapa = _mapear_cabecalho(cabecalho)
+
+    rel = {"lidas": 0, "importados": 0, "produtos": 0, "ignoradas": 0, "erros": [], "erros_omitidos": 0}
+
+    def erro(numero, mensagem, tombo=None):
+        if len(rel["erros"]) < LIMITE_ERROS:
+            rel["erros"].append({"linha": numero, "tombo": tombo, "mensagem": mensagem})
+        else:
+            rel["erros_omitidos"] += 1
+
+    vistos_no_arquivo: dict[int, int] = {}  # tombo -> linha em que apareceu
+    numeradas = enumerate(it, start=2)
+    try:
+        while True:
+            bloco = list(islice(numeradas, tamanho_lote))
+            if not bloco:
+                break
+
+            candidatas = []
+            for numero, celulas in bloco:
+                try:
+                    linha = converter_linha(numero, celulas or (), mapa)
+                except ValueError as e:
+                    rel["lidas"] += 1
+                    erro(numero, str(e))
+                    continue
+                if linha is None:
+                    rel["ignoradas"] += 1
+                    continue
+                rel["lidas"] += 1
+                candidatas.append(linha)
+
+            existentes = tombos_existentes(db, {n for linha in candidatas for _, n in linha.tombos})
+
+            novos = []
+            for linha in candidatas:
+                conflito = next(
+                    ((t, n) for t, n in linha.tombos if n in existentes or n in vistos_no_arquivo), None
+                )
+                if conflito:
+                    texto, n = conflito
+                    if n in existentes:
+                        erro(linha.linha, "Nº TOMBO já cadastrado", texto)
+                    else:
+                        erro(linha.linha, f"Nº TOMBO repetido (linha {vistos_no_arquivo[n]})", texto)
+                    continue
+                for _, n in linha.tombos:
+                    vistos_no_arquivo[n] = linha.linha
+                novos.append(_novo_item(linha, municipio_id, orgao_id, created_by))
+
+            if novos:
+                produtos = sum(len(item.produtos) for item in novos)
+                db.add_all(novos)
+                db.commit()
+                # Contados só depois do commit: o relatório de uma carga interrompida fica exato
+                rel["importados"] += len(novos)
+                rel["produtos"] += produtos
+    except Exception as exc:
+        raise ImportacaoInterrompida(rel) from exc
+    return rel
@@ -0,0 +1,184 @@
+"""
+Relatório de valores SEGEM: totais agrupados por ano, local, situação,
+empresa ou classificação ASI, calculados no banco e somando também o
+valor_rs dos produtos filhos (segem_itens_produtos).
+
+Os resultados ficam em cache por (dimensão, filtros — que incluem o município) e valem
+enquanto a versão de services/segem_consulta.py não mudar; o router SEGEM a
+incrementa (`invalidate_segem_facetas()`) a cada cadastro, edição, exclusão
+ou importação.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from openpyxl import Workbook
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, undefer
+
+from models import SegemItem, SegemItemProduto
+from services.segem_consulta import FiltrosSegem, condicoes_segem, versao_segem
+
+_TTL_SEGUNDOS = 300
+_MAX_ENTRADAS = 256
+LOTE_EXPORTACAO = 1000
+
+# Dimensão (parâmetro da tela) -> (coluna, rótulo, campo de FiltrosSegem usado no drill-down)
+DIMENSOES = {
+    "ano": (SegemItem.ano, "Ano", "anos"),
+    "local": (SegemItem.local, "Local", "locais"),
+    "situacao": (SegemItem.situacao, "Situação", "situacoes"),
+    "empresa": (SegemItem.nome_empresa, "Empresa", "empresas"),
+    "classificacao": (SegemItem.classificacao_asi, "Classificação ASI", "classificacoes"),
+}
+
+
+def _somas_produtos():
+    """Subconsulta segem_item_id -> soma do valor_rs dos produtos filhos."""
+    return (
+        select(
+            SegemItemProduto.segem_item_id.label("segem_item_id"),
+            func.sum(SegemItemProduto.valor_rs).label("valor"),
+        )
+        .group_by(SegemItemProduto.segem_item_id)
+        .subquery()
+    )
+
+
+def _agrupar(db: Session, dimensao: str, f: FiltrosSegem) -> dict:
+    coluna = DIMENSOES[dimensao][0]
+    produtos = _somas_produtos()
+    rows = (
+        db.query(
+            coluna,
+            func.count(SegemItem.id),
+            func.coalesce(func.sum(SegemItem.valor_rs), 0),
+            func.coalesce(func.sum(produtos.c.valor), 0),
+            func.coalesce(func.sum(SegemItem.valor_nota_empenho), 0),
+        )
+        .outerjoin(produtos, produtos.c.segem_item_id == SegemItem.id)
+        .filter(*condicoes_segem(f))
+        .group_by(coluna)
+        .order_by(coluna.asc().nullslast())
+        .all()
+    )
+
+    campos = ("registros", "valor_rs", "valor_produtos", "valor_total", "valor_nota_empenho")
+    por_valor: dict = {}
+    for valor, qtd, soma_itens, soma_produtos, soma_nota in rows:
+        if isinstance(valor, str) and not valor.strip():
+            valor = None  # NULL e '' formam o mesmo grupo "não informado"
+        g = por_valor.setdefault(valor, dict.fromkeys(campos, 0) | {"valor": valor})
+        g["registros"] += qtd or 0
+        g["valor_rs"] += float(soma_itens or 0)
+        g["valor_produtos"] += float(soma_produtos or 0)
+        g["valor_nota_empenho"] += float(soma_nota or 0)
+        g["valor_total"] = g["valor_rs"] + g["valor_produtos"]
+
+    grupos = sorted(por_valor.values(), key=lambda g: g["valor"] is None)
+    totais = {k: sum(g[k] for g in grupos) for k in campos}
+    return {"dimensao": dimensao, "grupos": grupos, "totais": totais}
+
+
+_lock = threading.Lock()
+_cache: dict = {}  # (dimensao, filtros) -> (versao, carregado_em, dados)
+
+
+def relatorio_segem(db: Session, dimensao: str, f: FiltrosSegem) -> dict:
+    """Totais agrupados por `dimensao` para os filtros (resultado em cache)."""
+    if dimensao not in DIMENSOES:
+        raise ValueError(f"Dimensão inválida: {dimensao}")
+    chave = (dimensao, f)
+    entrada = _cache.get(chave)
+    versao = versao_segem()
+    if entrada and entrada[0] == versao and time.monotonic() - entrada[1] < _TTL_SEGUNDOS:
+        return entrada[2]
+    dados = _agrupar(db, dimensao, f)
+    with _lock:
+        if len(_cache) >= _MAX_ENTRADAS or any(e[0] != versao for e in _cache.values()):
+            _cache.clear()
+        _cache[chave] = (versao, time.monotonic(), dados)
+    return dados
+
+
+# ------------------------------------------------------------
+# Exportação XLSX dos registros filtrados
+# ------------------------------------------------------------
+
+CABECALHO_EXPORTACAO = [
+    "ANO", "Nº TOMBO (GCM)", "LOCAL", "CÓDIGO", "DESCRIÇÃO", "SITUAÇÃO", "VALOR R$",
+    "ENTRADA NO SIGA", "NOTA DE EMPENHO", "VALOR DA NOTA DE EMPENHO", "N° NOTA FISCAL",
+    "NOME DA EMPRESA", "CLASSIFICAÇÃO ASI", "TOMBOS DOS PRODUTOS", "VALOR DOS PRODUTOS R$",
+]
+
+
+def linhas_exportacao(db: Session, f: FiltrosSegem, lote: int = LOTE_EXPORTACAO):
+    """
+    Gera as linhas da planilha em lotes por id (keyset), com os produtos
+    filhos de cada lote numa consulta extra; a memória não cresce com o total.
+    """
+    conds = condicoes_segem(f)
+    ultimo_id = 0
+    while True:
+        itens = (
+            db.query(SegemItem)
+            .options(undefer(SegemItem.descricao))
+            .filter(*conds, SegemItem.id > ultimo_id)
+            .order_by(SegemItem.id)
+            .limit(lote)
+            .all()
+        )
+        if not itens:
+            return
+        ids = [i.id for i in itens]
+        filhos: dict[int, list] = {}
+        for item_id, tombo, valor in (
+            db.query(SegemItemProduto.segem_item_id, SegemItemProduto.num_tombo_gcm, SegemItemProduto.valor_rs)
+            .filter(SegemItemProduto.segem_item_id.in_(ids))
+            .order_by(SegemItemProduto.id)
+        ):
+            filhos.setdefault(item_id, []).append((tombo, valor))
+
+        for i in itens:
+            produtos = filhos.get(i.id, [])
+            yield [
+                i.ano,
+                i.num_tombo_gcm,
+                i.local,
+                i.codigo,
+                i.descricao,
+                i.situacao,
+                i.valor_rs,
+                _data_planilha(i.entrada_no_siga),
+                i.nota_de_empenho,
+                i.valor_nota_empenho,
+                i.num_nota_fiscal,
+                i.nome_empresa,
+                i.classificacao_asi,
+                ", ".join(t for t, _ in produtos if t) or None,
+                sum(v for _, v in produtos if v is not None) if produtos else None,
+            ]
+        ultimo_id = ids[-1]
+        db.expunge_all()
+
+
+def _data_planilha(valor):
+    """'2024-03-15' vira data da planilha; outros textos seguem como estão."""
+    if valor and len(valor) == 10:
+        try:
+            return datetime.strptime(valor, "%Y-%m-%d").date()
+        except ValueError:
+            pass
+    return valor
+
+
+def exportar_xlsx(db: Session, f: FiltrosSegem, destino) -> None:
+    """Grava a planilha em `destino` com openpyxl em modo write_only (linhas não ficam em memória)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("SEGEM")
+    ws.append(CABECALHO_EXPORTACAO)
+    for linha in linhas_exportacao(db, f):
+        ws.append(linha)
+    wb.save(destino)
+
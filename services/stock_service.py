@@ -1,3 +1,4 @@
+from sqlalchemy import insert, select, literal
 from sqlalchemy.orm import Session
 from models import Product, Item, Stock, Movement, Unidade
 from datetime import datetime
@@ -207,3 +208,46 @@ class StockService:
         )
         db.add(movement)
         return movement
+
+    @staticmethod
+    def registrar_entradas_cadastro_itens(
+        db: Session,
+        product: Product,
+        user_id: int,
+        unit_id: int,
+        observacao: str | None = None,
+    ) -> None:
+        """
+        Registra ENTRADA (quantidade 1) para todos os itens do produto recém-cadastrado
+        num único INSERT ... SELECT, sem carregar os itens na sessão.
+        """
+        _validar_unidade_existe(db, unit_id, "destino")
+
+        origem = select(
+            literal(product.id),
+            Item.id,
+            literal(unit_id),
+            literal(unit_id),
+            literal(1),
+            literal("ENTRADA"),
+            literal(observacao or "Entrada automática — cadastro do produto"),
+            literal(user_id),
+            literal(datetime.utcnow()),
+        ).where(Item.product_id == product.id)
+
+        db.execute(
+            insert(Movement).from_select(
+                [
+                    "product_id",
+                    "item_id",
+                    "unit_origem_id",
+                    "unit_destino_id",
+                    "quantidade",
+                    "tipo",
+                    "observacao",
+                    "user_id",
+                    "data",
+                ],
+                origem,
+            )
+        )
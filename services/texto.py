@@ -0,0 +1,10 @@
+"""Normalização de texto para buscas e índices em memória."""
+
+import unicodedata
+
+
+def normalizar(texto: str | None) -> str:
+    """Minúsculas, sem acentos e com espaços simples."""
+    s = unicodedata.normalize("NFD", texto or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.lower().split())
@@ -1,5 +1,7 @@
 /**
  * Formulário de movimentação (página /movements/nova ou modal no estoque).
+ * O esqueleto de produtos vem de /movements/form-data (com ETag) e as
+ * unidades de origem de /movements/unidades-origem/{tipo}, sob demanda.
  */
 window.SIGENMovementForm = (function () {
   function $(prefix, name) {
@@ -8,7 +10,10 @@ window.SIGENMovementForm = (function () {
 
   function init(config) {
     var prefix = config.prefix || "";
-    var productsData = config.productsData || [];
+    var productsUrl = config.productsUrl || "/movements/form-data";
+    var productsData = config.productsData || null;
+    var productsPromise = null;
+    var unidadesSeq = 0;
     var prefillData = config.prefill || {};
     var movimentoData = config.movimento || {};
     var activePrefill = null;
@@ -39,6 +44,28 @@ window.SIGENMovementForm = (function () {
       });
     }
 
+    function carregarProdutos() {
+      if (productsData) return Promise.resolve(productsData);
+      if (!productsPromise) {
+        productsPromise = fetch(productsUrl, {
+          headers: { Accept: "application/json" },
+        })
+          .then(function (res) {
+            if (!res.ok) throw new Error("HTTP " + res.status);
+            return res.json();
+          })
+          .then(function (data) {
+            productsData = (data && data.products) || [];
+            return productsData;
+          })
+          .catch(function () {
+            productsPromise = null;
+            return [];
+          });
+      }
+      return productsPromise;
+    }
+
     function validarUnidadesDistintas() {
       var origem = unitOrigemSelect && unitOrigemSelect.value;
       var destino = unitDestinoSelect && unitDestinoSelect.value;
@@ -91,29 +118,29 @@ window.SIGENMovementForm = (function () {
       renderUnidadesDestino(null, "");
     }
 
-    function popularUnidadesOrigem(typeId) {
+    async function popularUnidadesOrigem(typeId) {
       resetUnidade();
       if (!typeId) return;
 
-      var produtosDoTipo = productsData.filter(function (p) {
-        return String(p.type_id) === String(typeId);
-      });
-      var unitsMap = {};
-      produtosDoTipo.forEach(function (p) {
-        (p.units_options || []).forEach(function (u) {
-          if (u.unit_id && !unitsMap[u.unit_id]) {
-            unitsMap[u.unit_id] = u.unit_name;
-          }
+      // Descarta respostas de um tipo selecionado anteriormente
+      var seq = ++unidadesSeq;
+      var unidades = [];
+      try {
+        var res = await fetch("/movements/unidades-origem/" + typeId, {
+          headers: { Accept: "application/json" },
         });
-      });
-
-      var entries = Object.entries(unitsMap);
-      if (!entries.length) return;
+        if (res.ok) unidades = await res.json();
+      } catch (e) {
+        unidades = [];
+      }
+      if (seq !== unidadesSeq || !Array.isArray(unidades) || !unidades.length) {
+        return;
+      }
 
-      entries.forEach(function (entry) {
+      unidades.forEach(function (u) {
         var optUnit = document.createElement("option");
-        optUnit.value = entry[0];
-        optUnit.text = entry[1];
+        optUnit.value = u.unit_id;
+        optUnit.text = u.unit_name;
         unitOrigemSelect.appendChild(optUnit);
       });
       unitOrigemSelect.disabled = false;
@@ -160,7 +187,7 @@ window.SIGENMovementForm = (function () {
       var itens = await res.json();
       if (!Array.isArray(itens) || !itens.length) {
         if (!controlaSerieAtual) {
-          var prod = productsData.find(function (p) {
+          var prod = (productsData || []).find(function (p) {
             return String(p.type_id) === String(type_id);
           });
           if (prod && productIdHidden) productIdHidden.value = prod.id;
@@ -204,7 +231,7 @@ window.SIGENMovementForm = (function () {
       atualizarQuantidade();
     }
 
-    categorySelect.addEventListener("change", function () {
+    async function aoMudarCategoria() {
       var cat = parseInt(categorySelect.value, 10);
       productSelect.innerHTML = '<option value="">— Selecione —</option>';
       productSelect.disabled = !cat;
@@ -216,7 +243,9 @@ window.SIGENMovementForm = (function () {
       if (!isPrefilling && productIdHidden) productIdHidden.value = "";
       if (!cat) return;
 
-      var filtered = productsData.filter(function (p) {
+      var produtos = await carregarProdutos();
+      if (parseInt(categorySelect.value, 10) !== cat) return;
+      var filtered = produtos.filter(function (p) {
         return p.category_id === cat;
       });
       var grouped = {};
@@ -236,9 +265,11 @@ window.SIGENMovementForm = (function () {
         opt.dataset.controlaPorSerie = p.controla_por_serie;
         productSelect.appendChild(opt);
       });
-    });
+    }
 
-    productSelect.addEventListener("change", function () {
+    categorySelect.addEventListener("change", aoMudarCategoria);
+
+    async function aoMudarTipo() {
       resetItems();
       resetUnidade();
       quantidadeInput.value = "1";
@@ -253,34 +284,21 @@ window.SIGENMovementForm = (function () {
       }
 
       controlaSerieAtual = opt.dataset.controlaPorSerie === "true";
-      popularUnidadesOrigem(opt.value);
+      await popularUnidadesOrigem(opt.value);
 
       if (isPrefilling && activePrefill && activePrefill.unit_id) {
         var uid = String(activePrefill.unit_id);
-        if (!unitOrigemSelect.querySelector('option[value="' + uid + '"]')) {
-          var prodRef = productsData.find(function (x) {
-            return x.id === activePrefill.product_id;
-          });
-          var uo =
-            prodRef && prodRef.units_options
-              ? prodRef.units_options.find(function (u) {
-                  return String(u.unit_id) === uid;
-                })
-              : null;
-          if (uo) {
-            var optUnit = document.createElement("option");
-            optUnit.value = uo.unit_id;
-            optUnit.text = uo.unit_name;
-            unitOrigemSelect.appendChild(optUnit);
-          }
+        if (unitOrigemSelect.querySelector('option[value="' + uid + '"]')) {
+          unitOrigemSelect.disabled = false;
+          unitOrigemSelect.value = uid;
+          await aoMudarUnidadeOrigem();
         }
-        unitOrigemSelect.disabled = false;
-        unitOrigemSelect.value = uid;
-        unitOrigemSelect.dispatchEvent(new Event("change", { bubbles: true }));
       }
-    });
+    }
 
-    unitOrigemSelect.addEventListener("change", async function () {
+    productSelect.addEventListener("change", aoMudarTipo);
+
+    async function aoMudarUnidadeOrigem() {
       atualizarUnidadesDestino();
       resetItems();
       itemIdInput.value = "";
@@ -300,7 +318,9 @@ window.SIGENMovementForm = (function () {
         };
       }
       await carregarItens(typeOpt.value, unitId, ctx || {});
-    });
+    }
+
+    unitOrigemSelect.addEventListener("change", aoMudarUnidadeOrigem);
 
     itensSelect.addEventListener("change", function () {
       var opt = itensSelect.selectedOptions[0];
@@ -343,19 +363,22 @@ window.SIGENMovementForm = (function () {
           productIdHidden.value = p.product_id;
         }
 
-        if (p.category_id) {
-          categorySelect.value = p.category_id;
-          categorySelect.dispatchEvent(new Event("change", { bubbles: true }));
-          await new Promise(function (r) {
-            setTimeout(r, 50);
+        var categoryId = p.category_id;
+        if (!categoryId && p.product_id) {
+          var produtos = await carregarProdutos();
+          var prod = produtos.find(function (x) {
+            return x.id === p.product_id;
           });
+          categoryId = prod ? prod.category_id : null;
+        }
+
+        if (categoryId) {
+          categorySelect.value = categoryId;
+          await aoMudarCategoria();
         }
 
         productSelect.value = p.type_id;
-        productSelect.dispatchEvent(new Event("change", { bubbles: true }));
-        await new Promise(function (r) {
-          setTimeout(r, 400);
-        });
+        await aoMudarTipo();
 
         if (productIdHidden && p.product_id) {
           productIdHidden.value = p.product_id;
@@ -371,15 +394,9 @@ window.SIGENMovementForm = (function () {
       isPrefilling = true;
       try {
         categorySelect.value = m.product.category_id;
-        categorySelect.dispatchEvent(new Event("change"));
-        await new Promise(function (r) {
-          setTimeout(r, 50);
-        });
+        await aoMudarCategoria();
         productSelect.value = m.product.type_id;
-        productSelect.dispatchEvent(new Event("change"));
-        await new Promise(function (r) {
-          setTimeout(r, 100);
-        });
+        await aoMudarTipo();
 
         if (m.unit_origem_id) {
           unitOrigemSelect.disabled = false;
@@ -492,6 +509,7 @@ window.SIGENMovementForm = (function () {
     return {
       reset: resetForm,
       applyPrefill: applyPrefill,
+      produtos: carregarProdutos,
     };
   }
 